@@ -0,0 +1,134 @@
+"""
+Per-turn audio handoff: temp files vs in memory, against local stub backends.
+
+Runs the same voice turn (transcribe the captured audio, synthesize the reply
+sentences) two ways:
+
+- files:  write audio.wav, transcribe the path, synthesize each sentence to
+          output.wav and read it back with soundfile (the old demoapp path)
+- memory: transcribe the WAV bytes, synthesize_array (WAV bytes decoded in
+          place to float32)
+
+The stub backends' own delays are identical for both, so the difference is
+the file I/O and decoding overhead.
+
+It also times the first audio of one sentence against a stub TTS that takes
+time to synthesize: synthesize_array (whole response) vs stream_synthesize
+vs a phrase cache (TTSCache) hit.
+
+Usage:
+    python benchmark_audio.py
+    python benchmark_audio.py --turns 50 --sentences 4
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+import stubs
+from source import wav
+from source.orpheusclient import OrpheusClient
+from source.ttscache import TTSCache
+from source.whisperclient import WhisperClient
+
+REPLY = [
+    "Sure, I can help with that.",
+    "Tomorrow will be mostly sunny with a light breeze from the west.",
+    "Temperatures reach about twenty-four degrees in the afternoon.",
+    "You might want a light jacket in the evening.",
+    "Anything else you would like to know?",
+]
+
+
+def turn_files(whisper, orpheus, captured: bytes, sentences, workdir):
+    audio_file_path = os.path.join(workdir, "audio.wav")
+    with open(audio_file_path, "wb") as file:
+        file.write(captured)
+    whisper.transcribe(file=audio_file_path)
+    for sentence in sentences:
+        output_file = orpheus.synthesize(sentence, os.path.join(workdir, "output.wav"))
+        audio, sample_rate = sf.read(output_file)
+        audio = audio.astype(np.float32)
+
+
+def turn_memory(whisper, orpheus, captured: bytes, sentences, workdir):
+    whisper.transcribe(file=("audio.wav", captured))
+    for sentence in sentences:
+        audio, sample_rate = orpheus.synthesize_array(sentence)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=20, help="Turns per mode")
+    parser.add_argument("--sentences", type=int, default=len(REPLY), help="Reply sentences per turn")
+    parser.add_argument("--speech-seconds", type=float, default=4.0, help="Length of the captured user audio")
+    args = parser.parse_args()
+
+    whisper = WhisperClient(base_url=stubs.start_whisper(delay=0.0))
+    orpheus = OrpheusClient(api_url=stubs.start_orpheus(delay_per_char=0.0), voice="leo")
+    sentences = (REPLY * (args.sentences // len(REPLY) + 1))[:args.sentences]
+    captured = wav.encode(np.zeros(int(48000 * args.speech_seconds), dtype=np.float32), 48000)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, turn in (("files", turn_files), ("memory", turn_memory)):
+            turn(whisper, orpheus, captured, sentences, workdir)  # warm-up
+            times = []
+            for _ in range(args.turns):
+                start = time.perf_counter()
+                turn(whisper, orpheus, captured, sentences, workdir)
+                times.append((time.perf_counter() - start) * 1000)
+            results[name] = times
+
+    # Decoding alone, on one synthesized sentence.
+    content = orpheus.synthesize_bytes(REPLY[1])
+    with tempfile.NamedTemporaryFile(suffix=".wav") as handle:
+        handle.write(content)
+        handle.flush()
+        start = time.perf_counter()
+        for _ in range(200):
+            sf.read(handle.name)[0].astype(np.float32)
+        file_decode = (time.perf_counter() - start) / 200 * 1000
+    start = time.perf_counter()
+    for _ in range(200):
+        wav.decode(content)
+    memory_decode = (time.perf_counter() - start) / 200 * 1000
+
+    # Time to first audio with a TTS backend that needs 2 ms per character.
+    slow = OrpheusClient(api_url=stubs.start_orpheus(delay_per_char=0.002), voice="leo")
+    slow.synthesize_array(REPLY[1])  # warm-up
+    whole, streamed = [], []
+    for _ in range(10):
+        start = time.perf_counter()
+        slow.synthesize_array(REPLY[1])
+        whole.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        for _ in slow.stream_synthesize(REPLY[1]):
+            streamed.append((time.perf_counter() - start) * 1000)
+            break
+    cache = TTSCache()
+    cache.prewarm([REPLY[0]], "leo", slow.synthesize_array)
+    start = time.perf_counter()
+    for _ in range(200):
+        cache.get(REPLY[0], "leo")
+    cached = (time.perf_counter() - start) / 200 * 1000
+
+    print(f"{args.turns} turns, {len(sentences)} sentences each, zero-delay stub backends")
+    print(f"{'mode':<8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, times in results.items():
+        p95 = statistics.quantiles(times, n=20)[-1] if len(times) > 1 else times[0]
+        print(f"{name:<8}{statistics.mean(times):>10.2f}{statistics.median(times):>10.2f}{p95:>10.2f}")
+    saved = statistics.mean(results["files"]) - statistics.mean(results["memory"])
+    print(f"saved per turn: {saved:.2f} ms ({saved / statistics.mean(results['files']) * 100:.0f}%)")
+    print(f"decode one sentence ({len(content) / 1024:.0f} KB): "
+          f"soundfile from disk {file_decode:.3f} ms, in memory {memory_decode:.3f} ms")
+    print(f"first audio of one sentence (2 ms/char TTS): whole response {statistics.median(whole):.1f} ms, "
+          f"streamed {statistics.median(streamed):.1f} ms, cached phrase {cached:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,22 @@ from fastrtc import (
     AlgoOptions,
     ReplyOnPause, AdditionalOutputs,
     audio_to_bytes,
+    get_current_context,
 )
-import re
+import atexit
+import logging
+import threading
+import time
 import numpy as np
-import soundfile as sf
 from langchain.chat_models import init_chat_model
 from source.whisperclient import WhisperClient
 from source.orpheusclient import OrpheusClient
+from source.history import ConversationHistory, SessionHistories
+from source.pipeline import BackendCaps, Reply, Speech, Transcript, VoicePipeline
+from source.ttscache import TTSCache
+from source.tracing import Tracer
+
+logger = logging.getLogger(__name__)
 
 
 # Create the Whisper client.
@@ -27,6 +36,124 @@ llm = init_chat_model(**chat_model_parameters)
 # Create the Orpheus client.
 orpheus_client = OrpheusClient(api_url="http://localhost:5005", voice="leo")
 
+# Short phrases the assistant keeps saying are synthesized once and then played
+# from memory. The fillers are synthesized at startup; set TTS_CACHE_PATH to None
+# to keep the cache in memory only.
+TTS_CACHE_PATH = "tts_cache.npz"
+FILLER_PHRASES = [
+    "Sure.",
+    "Sure!",
+    "Okay.",
+    "Of course.",
+    "Let me check.",
+    "Let me think.",
+    "Good question.",
+    "Hello!",
+    "Hi there!",
+    "You're welcome.",
+    "Anything else?",
+    "Is there anything else I can help you with?",
+]
+tts_cache = TTSCache(max_bytes=64 * 1024 * 1024, path=TTS_CACHE_PATH)
+
+
+def prewarm_tts_cache():
+    tts_cache.prewarm(FILLER_PHRASES, orpheus_client.voice, orpheus_client.synthesize_array)
+    if tts_cache.path is not None:
+        tts_cache.save()
+
+
+# Emotion tags
+emotion_tags = {
+    "<laugh>": "laughter",
+    "<sigh>": "sigh",
+    "<chuckle>": "chuckle",
+    "<cough>": "cough",
+    "<sniffle>": "sniffle",
+    "<groan>": "groan",
+    "<yawn>": "yawn",
+    "<gasp>": "gasp",
+}
+
+
+def sanitize(reply):
+    for tag in emotion_tags:
+        reply = reply.replace(tag, "")
+    return reply.strip()
+
+
+# Write the sysem prompt.
+system_prompt = "You are a helpful assistant. You give short, concise answers. You do not use any emojis."
+system_prompt += " You can use the following tags to indicate emotions: "
+system_prompt += ", ".join(emotion_tags.keys())
+system_prompt += "."
+
+# Voice sessions served at once, and the requests each backend gets at once across
+# all of them. Sessions beyond a backend's cap queue for it instead of overloading it.
+MAX_SESSIONS = 16
+backend_caps = BackendCaps(asr=2, llm=4, tts=4)
+
+# The conversation of each session as the LLM saw it. Prompts only ever grow by
+# appending, so the LLM server's prefix cache skips re-reading the history; past
+# HISTORY_MAX_TOKENS the oldest turns are summarized, down to HISTORY_TARGET_TOKENS.
+HISTORY_MAX_TOKENS = 3000
+HISTORY_TARGET_TOKENS = 1500
+
+
+def new_history():
+    return ConversationHistory(system_prompt, max_tokens=HISTORY_MAX_TOKENS, target_tokens=HISTORY_TARGET_TOKENS)
+
+
+histories = SessionHistories(new_history, max_sessions=4 * MAX_SESSIONS)
+
+
+def history_for(chatbot):
+    """
+    The history of the current WebRTC session, or one rebuilt from the chat window.
+    """
+    try:
+        return histories.get(get_current_context().webrtc_id)
+    except RuntimeError:
+        # No session id: rebuild from the displayed (sanitized) messages, which
+        # works but does not keep the prompt prefix byte-identical.
+        history = new_history()
+        messages = [message if isinstance(message, dict) else {"role": message.role, "content": message.content}
+                    for message in chatbot]
+        for user, assistant in zip(messages[::2], messages[1::2]):
+            history.add_turn(user["content"], assistant["content"])
+        return history
+
+
+# Every turn is traced across ASR, LLM and TTS. After each turn its trace is appended
+# to TRACE_FILE (OpenTelemetry OTLP/JSON lines) and the latency histograms are written
+# to METRICS_FILE (Prometheus text format, e.g. for node_exporter's textfile collector).
+# Set either to None to skip it.
+TRACE_FILE = "traces.jsonl"
+METRICS_FILE = "voice_latency.prom"
+tracer = Tracer(service_name="demoapp")
+
+# One pipeline for all sessions: the clients and TTS workers are shared, each turn
+# gets its own queues.
+pipeline = VoicePipeline(
+    whisper_client,
+    llm,
+    orpheus_client,
+    tts_cache=tts_cache,
+    caps=backend_caps,
+    transcribe_options={"model": "whisper-large-v3-turbo", "response_format": "verbose_json"},
+    tracer=tracer,
+)
+
+
+def export_turn(trace_id):
+    try:
+        if TRACE_FILE is not None:
+            tracer.export_otlp(TRACE_FILE, [trace_id])
+        if METRICS_FILE is not None:
+            tracer.export_prometheus(METRICS_FILE)
+    except OSError as e:
+        logger.warning(f"Could not export the turn trace: {e}")
+
 
 class ChatApplication:
     """
@@ -64,6 +191,7 @@ class ChatApplication:
                 inputs=[audio, chatbot],
                 outputs=[audio],
                 time_limit=3600,
+                concurrency_limit=MAX_SESSIONS,
             )
             audio.on_additional_outputs(
                 lambda x: (x), # 
@@ -84,71 +212,38 @@ class ChatApplication:
         and synthesizes the response using Orpheus.
         """
 
-        # Get the sample rate and audio data.
+        # Get the sample rate and the conversation so far. The turn's trace starts
+        # here, when the pause ended the user's speech.
+        capture_end_ns = time.time_ns()
         sample_rate = audio[0]
-
-        # Transcribe the audio using Whisper.
-        audio_data = audio_to_bytes(audio)
-        audio_file_path = "audio.wav"
-        with open(audio_file_path, "wb") as file:
-            file.write(audio_data)
-        text = whisper_client.transcribe(
-            file=audio_file_path,
-            model="whisper-large-v3-turbo",
-            response_format="verbose_json",
-        ).text  
-
-        # Add the user message to the chatbot.
-        chatbot += [gr.ChatMessage(role="user", content=text)]
-        yield (sample_rate, np.zeros(1, dtype=np.float32)), AdditionalOutputs(chatbot)
-
-        # Emotion tags
-        emotion_tags = {
-            "<laugh>": "laughter",
-            "<sigh>": "sigh",
-            "<chuckle>": "chuckle",
-            "<cough>": "cough",
-            "<sniffle>": "sniffle",
-            "<groan>": "groan",
-            "<yawn>": "yawn",
-            "<gasp>": "gasp",
-        }
-
-        # Write the sysem prompt.
-        system_prompt = "You are a helpful assistant. You give short, concise answers. You do not use any emojis."
-        system_prompt += " You can use the following tags to indicate emotions: "
-        system_prompt += ", ".join(emotion_tags.keys())
-        system_prompt += "."
-
-        # Use the transcribed text to generate a response.
-        llm_messages = [{"role": "system", "content": system_prompt}]
-        for message in chatbot:
-            if isinstance(message, dict):
-                llm_messages.append({"role": message["role"], "content": message["content"]})
-            else:
-                llm_messages.append({"role": message.role, "content": message.content})
-        reply = llm.invoke(llm_messages).content
-
-        # Add the reply to the chatbot.
-        reply_sanitized = reply
-        for tag, _ in emotion_tags.items():
-            reply_sanitized = reply_sanitized.replace(tag, "")
-        reply_sanitized = reply_sanitized.strip()
-        chatbot += [gr.ChatMessage(role="assistant", content=reply_sanitized)]
-        yield (sample_rate, np.zeros(1, dtype=np.float32)), AdditionalOutputs(chatbot)
-
-        # Split reply into sentences. Split on periods, exclamation marks, and question marks.
-        sentences = re.split(r'(?<=[.!?]) +', reply)
-
-        # Synthesize the sentences using Orpheus.
-        for i, sentence in enumerate(sentences):
-            output_file = "output.wav"
-            output_file = orpheus_client.synthesize(sentence, output_file)
-            audio, sample_rate = sf.read(output_file)
-            audio = audio.astype(np.float32)
-            yield (sample_rate, audio), AdditionalOutputs(chatbot)
+        history = history_for(chatbot)
+
+        # Everything from here on is scoped to this turn: concurrent sessions
+        # only share the pooled clients and the backend caps.
+        for event in pipeline.respond(audio_to_bytes(audio), history, capture_end_ns=capture_end_ns):
+            if isinstance(event, Transcript):
+                # Add the user message to the chatbot.
+                chatbot += [gr.ChatMessage(role="user", content=event.text)]
+                yield (sample_rate, np.zeros(1, dtype=np.float32)), AdditionalOutputs(chatbot)
+            elif isinstance(event, Speech):
+                chunk = (event.sample_rate, event.frames)
+                if event.first_of_sentence:
+                    # the transcript follows along once per sentence, not per chunk
+                    view = chatbot + [gr.ChatMessage(role="assistant", content=sanitize(event.spoken))]
+                    yield chunk, AdditionalOutputs(view)
+                else:
+                    yield chunk
+            elif isinstance(event, Reply):
+                # Add the full reply to the chatbot.
+                chatbot += [gr.ChatMessage(role="assistant", content=sanitize(event.text))]
+                yield (sample_rate, np.zeros(1, dtype=np.float32)), AdditionalOutputs(chatbot)
+                export_turn(event.stats.trace_id)
 
 
 # Start the application.
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+threading.Thread(target=prewarm_tts_cache, daemon=True).start()
+if tts_cache.path is not None:
+    atexit.register(tts_cache.save)  # keep what this session learned
 application = ChatApplication()
 application.demo.launch()
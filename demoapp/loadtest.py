@@ -0,0 +1,140 @@
+"""
+Multi-session load test of the voice pipeline against stub backends.
+
+Runs N simulated voice sessions at once, each doing a few turns (speak, get the
+whole spoken reply, pause, speak again), through the same VoicePipeline and
+BackendCaps the app uses. The stub backends (stubs.py) have a fixed capacity
+and queue what is beyond it, like GPU servers do.
+
+For every session count it reports time to first audio and turn time
+percentiles, the mean time a turn spent queued for each backend cap, and
+checks that every session got exactly its own reply audio - no lost or
+foreign chunks. --traces and --metrics export every turn's trace (OTLP/JSON
+lines) and the span latency histograms (Prometheus text).
+
+Usage:
+    python loadtest.py
+    python loadtest.py --sessions 1,8,32 --turns 5 --tts-cap 8 --tts-capacity 8
+    python loadtest.py --traces traces.jsonl --metrics voice_latency.prom
+"""
+import argparse
+import statistics
+import threading
+import time
+
+import numpy as np
+
+import stubs
+from source import wav
+from source.history import ConversationHistory
+from source.orpheusclient import OrpheusClient
+from source.pipeline import BACKENDS, BackendCaps, Reply, Speech, VoicePipeline
+from source.tracing import Tracer
+from source.whisperclient import WhisperClient
+
+REPLY = ("Tomorrow will be mostly sunny with a light breeze from the west. "
+         "Temperatures reach about twenty-four degrees in the afternoon. "
+         "You might want a light jacket in the evening.")
+SYSTEM_PROMPT = "You are a helpful assistant. You give short, concise answers."
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def run_session(pipeline, captured, turns, think, max_tokens, results, errors):
+    history = ConversationHistory(SYSTEM_PROMPT, max_tokens=max_tokens, target_tokens=max_tokens // 2)
+    for _ in range(turns):
+        frames = 0
+        stats = None
+        try:
+            for event in pipeline.respond(captured, history):
+                if isinstance(event, Speech):
+                    frames += len(event.frames)
+                elif isinstance(event, Reply):
+                    stats = event.stats
+        except Exception as e:
+            errors.append(repr(e))
+            continue
+        results.append((stats, frames))
+        time.sleep(think)
+
+
+def run_level(pipeline, captured, sessions, turns, think, max_tokens):
+    results, errors = [], []
+    threads = [threading.Thread(target=run_session,
+                                args=(pipeline, captured, turns, think, max_tokens, results, errors))
+               for _ in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", default="1,4,8,16", help="Comma-separated concurrent session counts")
+    parser.add_argument("--turns", type=int, default=3, help="Turns per session")
+    parser.add_argument("--think", type=float, default=0.2, help="Pause between a session's turns, seconds")
+    parser.add_argument("--asr-cap", type=int, default=2, help="Transcriptions in flight (BackendCaps)")
+    parser.add_argument("--llm-cap", type=int, default=4, help="LLM streams in flight (BackendCaps)")
+    parser.add_argument("--tts-cap", type=int, default=4, help="TTS requests in flight (BackendCaps)")
+    parser.add_argument("--asr-capacity", type=int, default=2, help="Parallel requests of the stub Whisper")
+    parser.add_argument("--llm-capacity", type=int, default=4, help="Parallel streams of the stub LLM")
+    parser.add_argument("--tts-capacity", type=int, default=4, help="Parallel requests of the stub Orpheus")
+    parser.add_argument("--asr-delay", type=float, default=0.1, help="Stub Whisper seconds per request")
+    parser.add_argument("--first-token", type=float, default=0.2, help="Stub LLM seconds to first token")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Stub LLM seconds per token")
+    parser.add_argument("--tts-delay", type=float, default=0.002, help="Stub Orpheus seconds per character")
+    parser.add_argument("--history-tokens", type=int, default=3000,
+                        help="History size that triggers summarization (ConversationHistory max_tokens)")
+    parser.add_argument("--traces", help="Append every turn's trace to this OTLP/JSON lines file")
+    parser.add_argument("--metrics", help="Write the span latency histograms to this Prometheus text file")
+    args = parser.parse_args()
+
+    whisper = WhisperClient(base_url=stubs.start_whisper(args.asr_delay, capacity=args.asr_capacity))
+    orpheus = OrpheusClient(api_url=stubs.start_orpheus(args.tts_delay, capacity=args.tts_capacity), voice="leo")
+    llm = stubs.StubLLM(REPLY, first_token_delay=args.first_token, token_delay=args.token_delay,
+                        capacity=args.llm_capacity)
+    caps = BackendCaps(asr=args.asr_cap, llm=args.llm_cap, tts=args.tts_cap)
+    tracer = Tracer(service_name="loadtest", max_traces=100000)
+    pipeline = VoicePipeline(whisper, llm, orpheus, caps=caps, tracer=tracer)
+    captured = wav.encode(np.zeros(48000 * 3, dtype=np.float32), 48000)
+
+    # One quiet turn first: warms the connections and gives the expected reply length.
+    expected = None
+    for event in pipeline.respond(captured, ConversationHistory(SYSTEM_PROMPT)):
+        if isinstance(event, Speech):
+            expected = (expected or 0) + len(event.frames)
+
+    print(f"caps asr/llm/tts {args.asr_cap}/{args.llm_cap}/{args.tts_cap}, "
+          f"backend capacity {args.asr_capacity}/{args.llm_capacity}/{args.tts_capacity}, "
+          f"{args.turns} turns per session")
+    print(f"{'sessions':>8}{'turns/s':>9}{'ttfa p50':>10}{'ttfa p95':>10}{'ttfa max':>10}"
+          f"{'turn p50':>10}{'turn p95':>10}" + "".join(f"{'q ' + name:>8}" for name in BACKENDS) + "  isolation")
+    for sessions in [int(n) for n in args.sessions.split(",")]:
+        results, errors, elapsed = run_level(pipeline, captured, sessions, args.turns, args.think,
+                                             args.history_tokens)
+        first_audio = [stats.first_audio for stats, _ in results if stats.first_audio is not None]
+        totals = [stats.total for stats, _ in results]
+        waits = {name: statistics.mean(stats.waits.get(name, 0.0) for stats, _ in results) for name in BACKENDS}
+        wrong = sum(frames != expected for _, frames in results)
+        isolation = "ok" if not wrong and not errors else f"{wrong} wrong, {len(errors)} failed"
+        print(f"{sessions:>8}{len(results) / elapsed:>9.2f}"
+              f"{percentile(first_audio, 50):>10.2f}{percentile(first_audio, 95):>10.2f}{max(first_audio):>10.2f}"
+              f"{percentile(totals, 50):>10.2f}{percentile(totals, 95):>10.2f}"
+              + "".join(f"{waits[name]:>8.2f}" for name in BACKENDS) + f"  {isolation}")
+        for error in errors[:3]:
+            print(f"    {error}")
+        if args.traces:
+            tracer.export_otlp(args.traces, [stats.trace_id for stats, _ in results])
+
+    if args.metrics:
+        tracer.export_prometheus(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
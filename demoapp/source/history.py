@@ -0,0 +1,212 @@
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+Message = Dict[str, str]
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation below between a user and a voice assistant in a few sentences. "
+    "Keep names, facts, numbers, decisions and open questions; leave out small talk. "
+    "Write it as notes for the assistant, in the third person."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count without a tokenizer: about four characters per token for English.
+    """
+    return len(text) // 4 + 1
+
+
+@dataclass
+class PromptInfo:
+    """Size of one turn's prompt, and how much of it the previous turn already sent."""
+    tokens: int  # estimated prompt tokens
+    prefix_tokens: int  # estimated tokens identical to the start of the previous prompt + reply
+    messages: int
+
+
+class ConversationHistory:
+    """
+    The conversation of one voice session, as it is sent to the LLM.
+
+    Messages are kept exactly as they went to and came from the model - the raw
+    transcript and the raw reply, not the text shown in the chat window - and
+    are only ever appended. So every prompt starts with the byte-identical
+    messages of the previous prompt plus its reply, and vLLM / SGLang / Ollama
+    prefix caching can skip their prefill.
+
+    Once the history grows beyond `max_tokens`, compact() folds the oldest
+    turns into a running summary (kept in the system message) until it is back
+    under `target_tokens`, keeping the last `keep_turns` turns verbatim. That
+    changes the prefix once, so the gap between the two limits is what makes
+    compactions - and the cache misses they cause - rare.
+    """
+
+    def __init__(
+        self,
+        system_prompt: str,
+        max_tokens: int = 3000,
+        target_tokens: int = 1500,
+        keep_turns: int = 2,
+        count_tokens: Callable[[str], int] = estimate_tokens,
+    ):
+        """
+        Initialize the ConversationHistory.
+
+        Args:
+            system_prompt: The fixed system prompt.
+            max_tokens: History size (system prompt included) that triggers compaction.
+            target_tokens: Size compaction reduces the history to.
+            keep_turns: Most recent user/assistant turns never folded into the summary.
+            count_tokens: Token counter; the default is a character-based estimate.
+        """
+        self.system_prompt = system_prompt
+        self.max_tokens = max_tokens
+        self.target_tokens = target_tokens
+        self.keep_turns = keep_turns
+        self.count_tokens = count_tokens
+        self.summary = ""
+        self.turns: List[List[Message]] = []  # [user, assistant] message pairs
+        self._last_sent: List[Message] = []
+        self._compacting = False
+        self._lock = threading.Lock()
+
+    def _system(self) -> Message:
+        content = self.system_prompt
+        if self.summary:
+            content += "\n\nSummary of the conversation so far:\n" + self.summary
+        return {"role": "system", "content": content}
+
+    def _tokens(self, messages: List[Message]) -> int:
+        return sum(self.count_tokens(message["content"]) + 4 for message in messages)  # + role tokens
+
+    def messages(self, user_text: str) -> List[Message]:
+        """
+        The prompt for the next turn: system message, history, then `user_text`.
+        """
+        with self._lock:
+            messages = [self._system()]
+            for turn in self.turns:
+                messages += turn
+        return messages + [{"role": "user", "content": user_text}]
+
+    def prompt_info(self, messages: List[Message]) -> PromptInfo:
+        """
+        Measure a prompt built by messages() against the previous one sent.
+        """
+        with self._lock:
+            previous = self._last_sent
+            self._last_sent = messages
+        same = 0
+        while same < min(len(previous), len(messages)) and previous[same] == messages[same]:
+            same += 1
+        return PromptInfo(self._tokens(messages), self._tokens(messages[:same]), len(messages))
+
+    def add_turn(self, user_text: str, reply: str) -> None:
+        """
+        Append a finished turn, with the reply exactly as the model produced it.
+        """
+        with self._lock:
+            self.turns.append([{"role": "user", "content": user_text},
+                               {"role": "assistant", "content": reply}])
+            if self._last_sent and self._last_sent[-1]["content"] == user_text:
+                # the reply extends the cached prefix of the prompt it answered
+                self._last_sent = self._last_sent + [self.turns[-1][1]]
+
+    def tokens(self) -> int:
+        with self._lock:
+            messages = [self._system()] + [message for turn in self.turns for message in turn]
+        return self._tokens(messages)
+
+    def needs_compaction(self) -> bool:
+        return self.tokens() > self.max_tokens and len(self.turns) > self.keep_turns
+
+    def compact(self, summarize: Callable[[List[Message]], str]) -> bool:
+        """
+        Fold the oldest turns into the summary if the history is over budget.
+
+        Safe to run on a background thread while turns continue: turns added in
+        the meantime are kept. If `summarize` fails, the oldest turns are dropped
+        anyway, so the history stays bounded.
+
+        Args:
+            summarize: Returns a summary of the given messages (an LLM call).
+
+        Returns:
+            True if the history was compacted.
+        """
+        with self._lock:
+            if self._compacting:
+                return False
+            self._compacting = True
+        try:
+            if not self.needs_compaction():
+                return False
+            with self._lock:
+                summary, turns = self.summary, list(self.turns)
+            before = self.tokens()
+            keep = turns[-self.keep_turns:] if self.keep_turns else []
+            fold = 0
+            while fold < len(turns) - len(keep):
+                fold += 1
+                rest = [message for turn in turns[fold:] for message in turn]
+                if self._tokens(rest) + self.count_tokens(self.system_prompt) + 64 <= self.target_tokens:
+                    break
+            folded = [message for turn in turns[:fold] for message in turn]
+            if summary:
+                folded = [{"role": "system", "content": "Summary so far:\n" + summary}] + folded
+            try:
+                summary = summarize(folded).strip()
+            except Exception as e:
+                logger.warning(f"Summarizing the history failed, dropping {fold} turns instead: {e!r}")
+            with self._lock:
+                self.summary = summary
+                del self.turns[:fold]
+            logger.info(f"Compacted the history: {fold} turns folded into the summary, "
+                        f"~{before} -> ~{self.tokens()} tokens")
+            return True
+        finally:
+            with self._lock:
+                self._compacting = False
+
+
+def summarizer(llm) -> Callable[[List[Message]], str]:
+    """
+    A summarize function for ConversationHistory.compact that calls a LangChain chat model.
+    """
+    def summarize(messages: List[Message]) -> str:
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+        return llm.invoke([{"role": "system", "content": SUMMARY_PROMPT},
+                           {"role": "user", "content": transcript}]).content
+    return summarize
+
+
+class SessionHistories:
+    """
+    One ConversationHistory per voice session, least recently used dropped first.
+    """
+
+    def __init__(self, factory: Callable[[], ConversationHistory], max_sessions: int = 256):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self._histories: "OrderedDict[str, ConversationHistory]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session: str) -> ConversationHistory:
+        with self._lock:
+            history = self._histories.get(session)
+            if history is None:
+                history = self._histories[session] = self.factory()
+                while len(self._histories) > self.max_sessions:
+                    self._histories.popitem(last=False)
+            self._histories.move_to_end(session)
+            return history
+
+    def drop(self, session: str) -> None:
+        with self._lock:
+            self._histories.pop(session, None)
@@ -0,0 +1,278 @@
+import asyncio
+import logging
+import random
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from .tracing import Span, current_span
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth another attempt: the server (or a proxy in front of it) is
+# restarting, overloaded, or dropped the request.
+RETRY_STATUSES = {500, 502, 503, 504}
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.ReadError,
+                httpx.WriteError, httpx.RemoteProtocolError)
+
+LatencyHook = Callable[[str, str, Optional[int], float, int], None]
+
+# Request phases traced as child spans: (name, httpcore event it starts at, event it ends at).
+PHASES = (
+    ("connect", "connect_tcp.started", "connect_tcp.complete"),
+    ("upload", "send_request_headers.started", "send_request_body.complete"),
+    ("server", "send_request_body.complete", "receive_response_headers.complete"),
+    ("download", "receive_response_headers.complete", "receive_response_body.complete"),
+)
+
+
+class _PhaseClock:
+    """
+    httpcore trace extension that notes when each request phase starts and ends.
+    """
+
+    def __init__(self):
+        self.times: Dict[str, int] = {}
+
+    def __call__(self, name: str, info: Dict[str, Any]) -> None:
+        # "http11.send_request_body.complete" -> "send_request_body.complete"
+        self.times.setdefault(name.split(".", 1)[1], time.time_ns())
+
+    async def async_call(self, name: str, info: Dict[str, Any]) -> None:
+        self(name, info)
+
+
+class HttpClient:
+    """
+    Pooled, retrying HTTP core shared by the API clients.
+
+    One keep-alive connection pool per client (sync and async), so a voice turn
+    reuses warm connections instead of opening a new TCP connection per call.
+    Requests that fail with a connection error or a 5xx status are retried with
+    full-jitter exponential backoff. Every attempt is reported to the latency
+    hooks as hook(method, url, status, seconds, attempt); status is None when
+    no response arrived.
+
+    When a tracing span is current, every attempt is also traced as a
+    `<name>.http` child span, with `connect`, `upload`, `server` (waiting for
+    the response headers) and `download` phase spans under it.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        name: str = "http",
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 60.0,
+        connect_timeout: float = 5.0,
+        max_retries: int = 2,
+        backoff: float = 0.2,
+        max_connections: int = 16,
+    ):
+        """
+        Initialize the HttpClient.
+
+        Args:
+            base_url: Base URL every request path is relative to.
+            name: Prefix of the traced span names, e.g. "whisper".
+            headers: Headers sent with every request.
+            timeout: Read/write/pool timeout in seconds.
+            connect_timeout: Connect timeout in seconds.
+            max_retries: Extra attempts after a retryable failure.
+            backoff: Base delay in seconds; attempt k waits uniform(0, backoff * 2**k).
+            max_connections: Size of the keep-alive pool.
+        """
+        self.base_url = base_url.rstrip("/")
+        self.name = name
+        self.headers = headers or {}
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.latency_hooks: List[LatencyHook] = []
+        self._client: Optional[httpx.Client] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+
+    def add_latency_hook(self, hook: LatencyHook) -> None:
+        """
+        Register a callable that receives (method, url, status, seconds, attempt).
+        """
+        self.latency_hooks.append(hook)
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            self._client = httpx.Client(base_url=self.base_url, headers=self.headers,
+                                        timeout=self.timeout, limits=self.limits)
+        return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(base_url=self.base_url, headers=self.headers,
+                                                   timeout=self.timeout, limits=self.limits)
+        return self._async_client
+
+    def _report(self, method: str, path: str, status: Optional[int], seconds: float, attempt: int) -> None:
+        for hook in self.latency_hooks:
+            try:
+                hook(method, f"{self.base_url}{path}", status, seconds, attempt)
+            except Exception as e:
+                logger.warning(f"Latency hook failed: {e}")
+
+    def _trace(self, method: str, path: str, attempt: int, kwargs: Dict[str, Any],
+               is_async: bool = False) -> Tuple[Optional[Span], Optional[_PhaseClock], Dict[str, Any]]:
+        """
+        Start the span of one attempt, if tracing; returns it, its clock and the request kwargs.
+        """
+        parent = current_span()
+        if parent is None:
+            return None, None, kwargs
+        clock = _PhaseClock()
+        span = parent.child(f"{self.name}.http", **{
+            "http.method": method,
+            "http.url": f"{self.base_url}{path}",
+            "backend": self.base_url,
+            "attempt": attempt,
+        })
+        extensions = {**kwargs.get("extensions", {}), "trace": clock.async_call if is_async else clock}
+        return span, clock, {**kwargs, "extensions": extensions}
+
+    def _end_trace(self, span: Optional[Span], clock: Optional[_PhaseClock],
+                   response: Optional[httpx.Response], error: Optional[Exception] = None) -> None:
+        if span is None:
+            return
+        end = time.time_ns()
+        for phase, start_event, end_event in PHASES:
+            start = clock.times.get(start_event)
+            if start is not None:
+                span.record(f"{self.name}.{phase}", start, clock.times.get(end_event, end), backend=self.base_url)
+        if response is not None:
+            span.set("http.status_code", response.status_code)
+        if error is not None:
+            span.set("error", repr(error))
+        span.end(end)
+
+    def _delay(self, attempt: int) -> float:
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def _should_retry(self, attempt: int, response: Optional[httpx.Response]) -> bool:
+        if attempt >= self.max_retries:
+            return False
+        return response is None or response.status_code in RETRY_STATUSES
+
+    def request(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        """
+        Send a request, retrying connection errors and 5xx responses.
+
+        Raises:
+            httpx.HTTPStatusError: The final response had an error status.
+            httpx.HTTPError: The request failed after all retries.
+        """
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            span, clock, attempt_kwargs = self._trace(method, path, attempt, kwargs)
+            try:
+                response = self.client.request(method, path, **attempt_kwargs)
+            except RETRY_ERRORS as e:
+                self._end_trace(span, clock, None, e)
+                self._report(method, path, None, time.perf_counter() - start, attempt)
+                if not self._should_retry(attempt, None):
+                    raise
+                logger.warning(f"{method} {path} failed ({e!r}), retrying")
+            else:
+                self._end_trace(span, clock, response)
+                self._report(method, path, response.status_code, time.perf_counter() - start, attempt)
+                if not self._should_retry(attempt, response):
+                    return response.raise_for_status()
+                logger.warning(f"{method} {path} returned {response.status_code}, retrying")
+            time.sleep(self._delay(attempt))
+            attempt += 1
+
+    async def arequest(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        """
+        Async version of request.
+        """
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            span, clock, attempt_kwargs = self._trace(method, path, attempt, kwargs, is_async=True)
+            try:
+                response = await self.async_client.request(method, path, **attempt_kwargs)
+            except RETRY_ERRORS as e:
+                self._end_trace(span, clock, None, e)
+                self._report(method, path, None, time.perf_counter() - start, attempt)
+                if not self._should_retry(attempt, None):
+                    raise
+                logger.warning(f"{method} {path} failed ({e!r}), retrying")
+            else:
+                self._end_trace(span, clock, response)
+                self._report(method, path, response.status_code, time.perf_counter() - start, attempt)
+                if not self._should_retry(attempt, response):
+                    return response.raise_for_status()
+                logger.warning(f"{method} {path} returned {response.status_code}, retrying")
+            await asyncio.sleep(self._delay(attempt))
+            attempt += 1
+
+    @contextmanager
+    def stream(self, method: str, path: str, **kwargs: Any) -> Iterator[httpx.Response]:
+        """
+        Send a request and hand back the response before its body is read.
+
+        Use as `with http.stream(...) as response: for chunk in response.iter_bytes(): ...`.
+        Attempts are retried like request() until the response headers arrive;
+        once the body is streaming, a failure is raised to the caller. The
+        latency hooks see the time to the response headers.
+
+        Raises:
+            httpx.HTTPStatusError: The final response had an error status.
+            httpx.HTTPError: The request failed after all retries.
+        """
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            span, clock, attempt_kwargs = self._trace(method, path, attempt, kwargs)
+            try:
+                response = self.client.send(self.client.build_request(method, path, **attempt_kwargs), stream=True)
+            except RETRY_ERRORS as e:
+                self._end_trace(span, clock, None, e)
+                self._report(method, path, None, time.perf_counter() - start, attempt)
+                if not self._should_retry(attempt, None):
+                    raise
+                logger.warning(f"{method} {path} failed ({e!r}), retrying")
+            else:
+                self._report(method, path, response.status_code, time.perf_counter() - start, attempt)
+                if not self._should_retry(attempt, response):
+                    error = None
+                    try:
+                        if response.is_error:
+                            response.read()  # so the error body is available to the caller
+                        yield response.raise_for_status()
+                    except Exception as e:
+                        error = e
+                        raise
+                    finally:
+                        response.close()
+                        self._end_trace(span, clock, response, error)  # the span covers the body
+                    return
+                response.close()
+                self._end_trace(span, clock, response)
+                logger.warning(f"{method} {path} returned {response.status_code}, retrying")
+            time.sleep(self._delay(attempt))
+            attempt += 1
+
+    def close(self) -> None:
+        """
+        Close the sync pool. The async pool is closed with aclose.
+        """
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
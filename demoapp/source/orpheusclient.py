@@ -1,22 +1,30 @@
 import os
-import requests
 import tempfile
 import logging
-from typing import Optional, Union, Dict, Any
+from typing import Optional, Union, Dict, Any, Iterator, Tuple
 from pathlib import Path
 
+import httpx
+import numpy as np
+
+from . import wav
+from .httpclient import HttpClient
+
 logger = logging.getLogger(__name__)
 
 class OrpheusClient:
     """Client for the Orpheus Text-to-Speech API."""
     
-    def __init__(self, api_url: str = None, voice: str = "alloy"):
+    def __init__(self, api_url: str = None, voice: str = "alloy", timeout: float = 60.0,
+                 max_retries: int = 2):
         """
         Initialize the OrpheusClient.
         
         Args:
             api_url: Base URL for the Orpheus API. If None, will use environment variable ORPHEUS_API_URL.
             voice: Voice to use for synthesis. Default is "alloy".
+            timeout: Read timeout in seconds for one request.
+            max_retries: Extra attempts on connection errors and 5xx responses.
         """
         self.api_url = api_url or os.environ.get("ORPHEUS_API_URL", "http://localhost:5005")
         self.voice = voice
@@ -28,6 +36,9 @@ class OrpheusClient:
         # Build endpoint URLs after removing trailing slash
         self.speech_endpoint = f"{self.api_url}/v1/audio/speech"
         self.voices_endpoint = f"{self.api_url}/v1/audio/voices"
+
+        # One pooled keep-alive connection for the life of the client.
+        self.http = HttpClient(self.api_url, name="tts", timeout=timeout, max_retries=max_retries)
             
         logger.debug(f"Initialized OrpheusClient with API URL: {self.api_url}")
     
@@ -39,17 +50,162 @@ class OrpheusClient:
             List of available voice names.
         """
         try:
-            response = requests.get(self.voices_endpoint)
-            response.raise_for_status()
-            return response.json().get("voices", [])
-        except requests.RequestException as e:
+            return self.http.request("GET", "/v1/audio/voices").json().get("voices", [])
+        except httpx.HTTPError as e:
             logger.error(f"Error fetching available voices: {e}")
             return []
     
+    def _payload(self, text: str, voice: Optional[str], speed: float) -> Dict[str, Any]:
+        return {
+            "input": text,
+            "model": "orpheus",
+            "voice": voice or self.voice,
+            "response_format": "wav",
+            "speed": speed
+        }
+
+    @staticmethod
+    def _log_error(e: httpx.HTTPError) -> None:
+        logger.error(f"Error synthesizing speech: {e!r}")
+        if isinstance(e, httpx.HTTPStatusError):
+            logger.error(f"API response: {e.response.text}")
+
+    def synthesize_bytes(self, text: str, voice: Optional[str] = None, speed: float = 1.0) -> Optional[bytes]:
+        """
+        Synthesize speech and return the WAV file content in memory.
+        
+        Args:
+            text: The text to synthesize.
+            voice: Voice to use. If None, will use the default voice from initialization.
+            speed: Speech speed factor. Default is 1.0.
+            
+        Returns:
+            The WAV bytes, or None if synthesis failed.
+        """
+        if not text:
+            logger.warning("Empty text provided for synthesis")
+            return None
+            
+        payload = self._payload(text, voice, speed)
+        logger.debug(f"Synthesizing text with voice: {payload['voice']}")
+        try:
+            return self.http.request("POST", "/v1/audio/speech", json=payload).content
+        except httpx.HTTPError as e:
+            self._log_error(e)
+            return None
+
+    async def asynthesize_bytes(self, text: str, voice: Optional[str] = None,
+                                speed: float = 1.0) -> Optional[bytes]:
+        """
+        Async version of synthesize_bytes, on the client's async connection pool.
+        """
+        if not text:
+            logger.warning("Empty text provided for synthesis")
+            return None
+        try:
+            response = await self.http.arequest("POST", "/v1/audio/speech", json=self._payload(text, voice, speed))
+            return response.content
+        except httpx.HTTPError as e:
+            self._log_error(e)
+            return None
+
+    def synthesize_array(self, text: str, voice: Optional[str] = None,
+                         speed: float = 1.0) -> Optional[Tuple[np.ndarray, int]]:
+        """
+        Synthesize speech and decode it straight to float32 samples - no file.
+        
+        The response body is viewed in place (np.frombuffer); integer PCM is
+        scaled to float32 in one pass, float32 WAVs need no copy at all.
+        
+        Args:
+            text: The text to synthesize.
+            voice: Voice to use. If None, will use the default voice from initialization.
+            speed: Speech speed factor. Default is 1.0.
+            
+        Returns:
+            (samples, sample_rate), or None if synthesis failed.
+        """
+        content = self.synthesize_bytes(text, voice=voice, speed=speed)
+        if content is None:
+            return None
+        return wav.decode(content)
+
+    async def asynthesize_array(self, text: str, voice: Optional[str] = None,
+                                speed: float = 1.0) -> Optional[Tuple[np.ndarray, int]]:
+        """
+        Async version of synthesize_array.
+        """
+        content = await self.asynthesize_bytes(text, voice=voice, speed=speed)
+        if content is None:
+            return None
+        return wav.decode(content)
+    
+    def stream_synthesize(self, text: str, voice: Optional[str] = None, speed: float = 1.0,
+                          chunk_bytes: int = 4800) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Synthesize speech and yield the audio while the response is still arriving.
+        
+        The WAV header is parsed as soon as its bytes are in, then every chunk of
+        the body is decoded to float32 frames and yielded, so playback can start
+        long before the server has synthesized the whole text. Trailing bytes of
+        a partial frame are carried over to the next chunk.
+        
+        Args:
+            text: The text to synthesize.
+            voice: Voice to use. If None, will use the default voice from initialization.
+            speed: Speech speed factor. Default is 1.0.
+            chunk_bytes: Read size; 4800 bytes is 100 ms of 24 kHz 16-bit mono.
+            
+        Yields:
+            (sample_rate, frames); frames is 1-D for mono, (frames, channels) otherwise.
+            Nothing is yielded if synthesis failed.
+        """
+        if not text:
+            logger.warning("Empty text provided for synthesis")
+            return
+            
+        payload = self._payload(text, voice, speed)
+        logger.debug(f"Streaming text with voice: {payload['voice']}")
+        buffer = bytearray()
+        header = None
+        remaining = None  # data bytes still expected, if the header says
+        try:
+            with self.http.stream("POST", "/v1/audio/speech", json=payload) as response:
+                for chunk in response.iter_bytes(chunk_bytes):
+                    buffer += chunk
+                    if header is None:
+                        header = wav.parse_header(buffer)
+                        if header is None:
+                            continue
+                        del buffer[:header.data_offset]
+                        remaining = header.data_size
+                    if remaining is not None:
+                        # anything after the data chunk (LIST etc.) is not audio
+                        del buffer[remaining:]
+                    usable = len(buffer) - len(buffer) % header.frame_bytes
+                    if usable == 0:
+                        continue
+                    frames = wav.to_float32(np.frombuffer(bytes(buffer[:usable]), dtype=header.dtype))
+                    del buffer[:usable]
+                    if remaining is not None:
+                        remaining -= usable
+                    if header.channels > 1:
+                        frames = frames.reshape(-1, header.channels)
+                    yield header.sample_rate, frames
+                    if remaining == 0:
+                        break
+        except httpx.HTTPError as e:
+            self._log_error(e)
+        if header is None and buffer:
+            logger.error("Speech stream ended before a complete WAV header")
+    
     def synthesize(self, text: str, output_file: Optional[Union[str, Path]] = None, 
                   voice: Optional[str] = None, speed: float = 1.0) -> Optional[Path]:
         """
-        Synthesize speech from text using the Orpheus API.
+        Synthesize speech from text using the Orpheus API and save it to a file.
+        
+        Prefer synthesize_array / synthesize_bytes when the audio is consumed
+        in-process; this writes to disk.
         
         Args:
             text: The text to synthesize.
@@ -60,13 +216,11 @@ class OrpheusClient:
         Returns:
             Path to the saved audio file, or None if synthesis failed.
         """
-        if not text:
-            logger.warning("Empty text provided for synthesis")
+        voice = voice or self.voice
+        content = self.synthesize_bytes(text, voice=voice, speed=speed)
+        if content is None:
             return None
             
-        voice = voice or self.voice
-        logger.debug(f"Synthesizing text with voice: {voice}")
-        
         # Create temp file if no output path provided
         if output_file is None:
             temp_dir = tempfile.gettempdir()
@@ -74,32 +228,12 @@ class OrpheusClient:
         else:
             output_file = Path(output_file)
             
-        # Prepare the request payload
-        payload = {
-            "input": text,
-            "model": "orpheus",
-            "voice": voice,
-            "response_format": "wav",
-            "speed": speed
-        }
-        
-        try:
-            # Make the API request
-            response = requests.post(self.speech_endpoint, json=payload)
-            response.raise_for_status()
+        # Save the audio content to the output file
+        with open(output_file, "wb") as f:
+            f.write(content)
             
-            # Save the audio content to the output file
-            with open(output_file, "wb") as f:
-                f.write(response.content)
-                
-            logger.info(f"Speech synthesized and saved to: {output_file}")
-            return output_file
-            
-        except requests.RequestException as e:
-            logger.error(f"Error synthesizing speech: {e}")
-            if hasattr(e.response, 'text'):
-                logger.error(f"API response: {e.response.text}")
-            return None
+        logger.info(f"Speech synthesized and saved to: {output_file}")
+        return output_file
 
     def say(self, text: str, voice: Optional[str] = None) -> Optional[Path]:
         """
@@ -0,0 +1,399 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+from . import wav
+from .history import ConversationHistory, summarizer
+from .sentences import SentenceSplitter
+from .tracing import Span, Tracer
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("asr", "llm", "tts")
+
+
+class BackendCaps:
+    """
+    Global caps on the requests in flight to each backend, shared by all sessions.
+
+    A session that finds its backend at the cap waits for a slot, so a burst of
+    users queues here instead of overloading Whisper, the LLM or Orpheus - each
+    backend keeps running at the concurrency it was sized for, and latency stays
+    predictable. Wait times are reported per turn.
+    """
+
+    def __init__(self, asr: int = 2, llm: int = 4, tts: int = 4):
+        """
+        Initialize the BackendCaps.
+
+        Args:
+            asr: Transcriptions in flight at once.
+            llm: LLM replies streaming at once.
+            tts: Sentences being synthesized at once.
+        """
+        self.limits = {"asr": asr, "llm": llm, "tts": tts}
+        self._slots = {name: threading.BoundedSemaphore(limit) for name, limit in self.limits.items()}
+        self._lock = threading.Lock()
+        self._in_flight = {name: 0 for name in BACKENDS}
+
+    @contextmanager
+    def slot(self, backend: str, waits: Optional[Dict[str, float]] = None,
+             span: Optional[Span] = None) -> Iterator[None]:
+        """
+        Hold one slot of `backend` for the duration of the block.
+
+        Args:
+            backend: "asr", "llm" or "tts".
+            waits: If given, the seconds spent waiting are added to waits[backend].
+            span: If given, the wait is traced as a `<backend>.queue` child span.
+        """
+        start, start_ns = time.perf_counter(), time.time_ns()
+        self._slots[backend].acquire()
+        if waits is not None:
+            with self._lock:
+                waits[backend] = waits.get(backend, 0.0) + time.perf_counter() - start
+        if span is not None:
+            span.record(f"{backend}.queue", start_ns, time.time_ns())
+        with self._lock:
+            self._in_flight[backend] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight[backend] -= 1
+            self._slots[backend].release()
+
+    def in_flight(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._in_flight)
+
+
+@dataclass
+class Transcript:
+    """The user's speech as text."""
+    text: str
+
+
+@dataclass
+class Speech:
+    """A piece of reply audio, and the reply sentences spoken so far."""
+    sample_rate: int
+    frames: np.ndarray
+    spoken: str
+    first_of_sentence: bool
+
+
+@dataclass
+class TurnStats:
+    """Timings of one turn, in seconds since the end of the user's speech."""
+    asr: float = 0.0
+    first_token: Optional[float] = None
+    first_sentence: Optional[float] = None
+    first_audio: Optional[float] = None
+    total: float = 0.0
+    sentences: int = 0
+    waits: Dict[str, float] = field(default_factory=dict)  # seconds queued per backend
+    prompt_tokens: int = 0  # estimated
+    prefix_tokens: int = 0  # estimated tokens shared with the previous prompt + reply
+    reported_prompt_tokens: Optional[int] = None  # from the LLM's usage metadata, if it reports it
+    trace_id: Optional[str] = None
+
+
+@dataclass
+class Reply:
+    """The complete reply text, with the turn's timings."""
+    text: str
+    stats: TurnStats
+
+
+Event = Union[Transcript, Speech, Reply]
+
+
+class VoicePipeline:
+    """
+    ASR -> LLM -> TTS for any number of concurrent voice sessions.
+
+    The clients and the TTS worker pool are shared and thread safe; everything
+    that belongs to a turn (its sentence queues, chunk queues and timings) is
+    created per call of respond(), so sessions never see each other's audio.
+    Backend load is bounded by BackendCaps. Each session has at most `prefetch`
+    sentences in TTS at a time, so one long reply cannot take every TTS worker
+    while other sessions wait for their first sentence.
+
+    Every turn is traced (see tracing.py): a `turn` root span from the end of the
+    user's speech, with `asr`, `llm` (and `llm.first_token`), one `tts.sentence`
+    per sentence (and `tts.first_chunk`), `first_audio`, the queueing at the
+    backend caps, and the clients' HTTP phase spans under them.
+    """
+
+    def __init__(
+        self,
+        whisper_client,
+        llm,
+        orpheus_client,
+        tts_cache=None,
+        caps: Optional[BackendCaps] = None,
+        tts_workers: int = 16,
+        prefetch: int = 2,
+        transcribe_options: Optional[Dict[str, Any]] = None,
+        tracer: Optional[Tracer] = None,
+    ):
+        """
+        Initialize the VoicePipeline.
+
+        Args:
+            whisper_client: A WhisperClient.
+            llm: A LangChain chat model (anything with .stream(messages)).
+            orpheus_client: An OrpheusClient.
+            tts_cache: Optional TTSCache for short phrases.
+            caps: Backend concurrency caps; defaults to BackendCaps().
+            tts_workers: Threads in the shared TTS pool.
+            prefetch: Sentences of one session synthesized ahead of playback.
+            transcribe_options: Extra arguments for WhisperClient.transcribe.
+            tracer: Collects the turn traces; defaults to a new Tracer.
+        """
+        self.whisper_client = whisper_client
+        self.llm = llm
+        self.orpheus_client = orpheus_client
+        self.tts_cache = tts_cache
+        self.caps = caps or BackendCaps()
+        self.prefetch = prefetch
+        self.transcribe_options = transcribe_options or {}
+        self.tracer = tracer or Tracer()
+        self.tts_pool = ThreadPoolExecutor(max_workers=tts_workers, thread_name_prefix="tts")
+        self._turns = itertools.count(1)
+
+    def _stream_sentence(self, sentence: str, chunks: queue.Queue, cancelled: threading.Event,
+                         waits: Dict[str, float], span: Span) -> None:
+        """
+        Stream one sentence into `chunks` as (sample_rate, frames) pieces, then None.
+        """
+        voice = self.orpheus_client.voice
+        try:
+            cacheable = self.tts_cache is not None and self.tts_cache.cacheable(sentence)
+            cached = self.tts_cache.get(sentence, voice) if cacheable else None
+            span.set("cached", cached is not None)
+            if cached is not None:
+                audio, sample_rate = cached
+                chunks.put((sample_rate, audio))
+                return
+
+            pieces = []
+            with self.caps.slot("tts", waits, span), span.use():
+                # Decoded in memory as the response arrives: playback starts on the first
+                # 100 ms of audio instead of after the whole sentence is synthesized.
+                for sample_rate, frames in self.orpheus_client.stream_synthesize(sentence):
+                    if cancelled.is_set():
+                        span.set("cancelled", True)
+                        return
+                    if not pieces:
+                        span.record("tts.first_chunk", span.start_ns, time.time_ns())
+                    chunks.put((sample_rate, frames))
+                    pieces.append(frames)
+            span.set("audio.seconds", sum(map(len, pieces)) / sample_rate if pieces else 0.0)
+            if pieces and cacheable:
+                self.tts_cache.put(sentence, voice, 1.0, np.concatenate(pieces), sample_rate)
+        except Exception as e:
+            span.set("error", repr(e))
+            logger.error(f"TTS failed for {sentence!r}: {e!r}")
+        finally:
+            span.end()
+            chunks.put(None)
+
+    def respond(self, audio: Union[bytes, Tuple[int, np.ndarray]], history: ConversationHistory,
+                session: Optional[str] = None, capture_end_ns: Optional[int] = None) -> Iterator[Event]:
+        """
+        Run one turn: transcribe `audio`, stream the reply and synthesize it.
+
+        Yields a Transcript, then Speech pieces in reply order as soon as each is
+        synthesized, then the Reply. Closing the generator (the user interrupted)
+        stops the LLM stream and the turn's TTS.
+
+        Args:
+            audio: The user's speech, as WAV bytes or (sample_rate, samples).
+            history: The session's conversation; the turn is appended to it, and
+                it is compacted in the background once it is over budget.
+            session: Label for the log lines; defaults to a turn number.
+            capture_end_ns: When the user stopped speaking (time.time_ns()); defaults to now.
+        """
+        session = session or f"turn-{next(self._turns)}"
+        turn_start = time.perf_counter()
+        if capture_end_ns is not None:
+            turn_start -= (time.time_ns() - capture_end_ns) / 1e9
+        stats = TurnStats()
+        # Not made current: this generator runs in its consumer's context.
+        turn = self.tracer.start("turn", capture_end_ns, session=session)
+        stats.trace_id = turn.trace_id
+
+        def since_start() -> float:
+            return time.perf_counter() - turn_start
+
+        # Transcribe the audio using Whisper, straight from memory.
+        if isinstance(audio, (bytes, bytearray)):
+            file = ("audio.wav", audio)
+            header = wav.parse_header(audio)
+            if header is not None and header.data_size is not None:
+                turn.set("audio.seconds", header.data_size / header.frame_bytes / header.sample_rate)
+        else:
+            file = audio
+            turn.set("audio.seconds", len(audio[1]) / audio[0])
+        asr = turn.child("asr")
+        try:
+            with self.caps.slot("asr", stats.waits, asr), asr.use():
+                text = self.whisper_client.transcribe(file=file, **self.transcribe_options).text
+        except Exception as e:
+            asr.set("error", repr(e))
+            turn.set("error", repr(e))
+            raise
+        finally:
+            asr.end()
+            if "error" in turn.attributes:
+                turn.end()
+        stats.asr = since_start()
+        try:
+            yield Transcript(text)
+        except BaseException as e:
+            turn.set("cancelled", repr(e))
+            turn.end()
+            raise
+
+        messages = history.messages(text)
+        prompt = history.prompt_info(messages)
+        stats.prompt_tokens, stats.prefix_tokens = prompt.tokens, prompt.prefix_tokens
+
+        # Per-turn queues. The LLM is read on its own thread and every sentence is
+        # handed on the moment it is complete; a dispatcher thread starts TTS for at
+        # most `prefetch` sentences ahead of playback.
+        sentences = queue.Queue()  # sentences in reply order, then None (or an exception)
+        pending = queue.Queue()  # (sentence, chunks) in reply order, then None
+        ahead = threading.Semaphore(self.prefetch)
+        cancelled = threading.Event()
+        reply_parts = []
+        started = []
+
+        def produce():
+            splitter = SentenceSplitter()
+            llm = turn.child("llm", prompt_tokens=prompt.tokens, prefix_tokens=prompt.prefix_tokens,
+                             messages=prompt.messages)
+            try:
+                with self.caps.slot("llm", stats.waits, llm), llm.use():
+                    for chunk in self.llm.stream(messages):
+                        if cancelled.is_set():
+                            llm.set("cancelled", True)
+                            return
+                        if stats.first_token is None:
+                            stats.first_token = since_start()
+                            llm.record("llm.first_token", llm.start_ns, time.time_ns())
+                        reply_parts.append(chunk.content)
+                        usage = getattr(chunk, "usage_metadata", None)
+                        if usage and usage.get("input_tokens"):
+                            stats.reported_prompt_tokens = usage["input_tokens"]
+                        for sentence in splitter.feed(chunk.content):
+                            if stats.first_sentence is None:
+                                stats.first_sentence = since_start()
+                            sentences.put(sentence)
+                for sentence in splitter.flush():
+                    if stats.first_sentence is None:
+                        stats.first_sentence = since_start()
+                    sentences.put(sentence)
+            except Exception as exception:
+                llm.set("error", repr(exception))
+                sentences.put(exception)
+            finally:
+                llm.set("chunks", len(reply_parts))
+                if stats.reported_prompt_tokens is not None:
+                    llm.set("reported_prompt_tokens", stats.reported_prompt_tokens)
+                llm.end()
+                sentences.put(None)
+
+        def dispatch():
+            while (item := sentences.get()) is not None:
+                if isinstance(item, Exception):
+                    pending.put(item)
+                    break
+                ahead.acquire()
+                if cancelled.is_set():
+                    break
+                chunks = queue.Queue()
+                span = turn.child("tts.sentence", index=len(started), chars=len(item))
+                started.append(item)
+                self.tts_pool.submit(self._stream_sentence, item, chunks, cancelled, stats.waits, span)
+                pending.put((item, chunks))
+            pending.put(None)
+
+        threading.Thread(target=produce, name=f"llm-{session}", daemon=True).start()
+        threading.Thread(target=dispatch, name=f"tts-dispatch-{session}", daemon=True).start()
+
+        # Play the sentences in order, each chunk as soon as it arrives.
+        spoken = []
+        try:
+            while (item := pending.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                sentence, chunks = item
+                spoken.append(sentence)
+                first = True
+                while (chunk := chunks.get()) is not None:
+                    if stats.first_audio is None:
+                        stats.first_audio = since_start()
+                        turn.record("first_audio", turn.start_ns, time.time_ns())
+                    yield Speech(chunk[0], chunk[1], " ".join(spoken), first)
+                    first = False
+                ahead.release()
+        except BaseException as e:
+            turn.set("error" if isinstance(e, Exception) else "cancelled", repr(e))
+            raise
+        finally:
+            cancelled.set()
+            ahead.release()  # let a blocked dispatcher see the cancellation
+            turn.set("sentences", len(spoken))
+            turn.end()
+            if reply_parts:
+                # what the model said so far, exactly, so the next prompt extends this one
+                history.add_turn(text, "".join(reply_parts))
+                if history.needs_compaction():
+                    threading.Thread(target=self._compact, args=(history, session), daemon=True).start()
+
+        stats.total = since_start()
+        stats.sentences = len(spoken)
+        prompt_log = f"prompt ~{stats.prompt_tokens} tokens (~{stats.prefix_tokens} reused prefix"
+        if stats.reported_prompt_tokens is not None:
+            prompt_log += f", {stats.reported_prompt_tokens} reported"
+        logger.info(
+            f"[{session}] Turn: asr {stats.asr:.2f}s, "
+            f"first token {_seconds(stats.first_token)}, "
+            f"first sentence {_seconds(stats.first_sentence)}, "
+            f"first audio {_seconds(stats.first_audio)}, "
+            f"total {stats.total:.2f}s, {stats.sentences} sentences, {prompt_log}), "
+            f"queued " + ", ".join(f"{name} {stats.waits.get(name, 0.0):.2f}s" for name in BACKENDS)
+            + (f", tts cache {self.tts_cache.hits} hits / {self.tts_cache.misses} misses"
+               if self.tts_cache is not None else "")
+        )
+        yield Reply("".join(reply_parts), stats)
+
+    def _compact(self, history: ConversationHistory, session: str) -> None:
+        """
+        Fold old turns of `history` into its summary, with the LLM call under the LLM cap.
+        """
+        summarize = summarizer(self.llm)
+
+        def capped(messages):
+            with self.caps.slot("llm"), self.tracer.span("history.summarize", session=session):
+                return summarize(messages)
+
+        try:
+            history.compact(capped)
+        except Exception as e:
+            logger.error(f"[{session}] History compaction failed: {e!r}")
+
+
+def _seconds(value: Optional[float]) -> str:
+    return f"{value:.2f}s" if value is not None else "-"
@@ -0,0 +1,56 @@
+import re
+from typing import List
+
+
+class SentenceSplitter:
+    """
+    Cuts a streamed LLM reply into sentences as soon as each one is complete.
+
+    A sentence ends at ".", "!" or "?" (optionally followed by closing quotes or
+    brackets) once the next whitespace has arrived - until then the buffer could
+    still be "3.5" or "...". Common abbreviations ("Dr.", "e.g.") never end a
+    sentence, and pieces shorter than `min_chars` are merged with the next one.
+    """
+
+    _END = re.compile(r"(?<=[.!?])[\"')\]]*\s+")
+    _ABBREVIATIONS = {"mr.", "mrs.", "ms.", "dr.", "prof.", "st.", "vs.", "etc.", "e.g.", "i.e.", "approx."}
+
+    def __init__(self, min_chars: int = 4):
+        """
+        Initialize the SentenceSplitter.
+
+        Args:
+            min_chars: Minimum length of an emitted sentence.
+        """
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        """
+        Add streamed text and return the sentences it completed (possibly none).
+
+        Args:
+            text: The next chunk of the reply.
+
+        Returns:
+            Completed sentences, in order, stripped.
+        """
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in self._END.finditer(self._buffer):
+            candidate = self._buffer[start:match.end()].strip()
+            if candidate.split()[-1].lower() in self._ABBREVIATIONS:
+                continue
+            if len(candidate) >= self.min_chars:
+                sentences.append(candidate)
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> List[str]:
+        """
+        Return whatever is left once the stream has ended.
+        """
+        rest, self._buffer = self._buffer.strip(), ""
+        return [rest] if rest else []
@@ -0,0 +1,246 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+# Upper bounds in seconds; voice latencies live between ~10 ms and a few seconds.
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional["Span"]:
+    """
+    The span active in this thread (or task), if any.
+    """
+    return _current.get()
+
+
+class Span:
+    """
+    One timed operation of a trace: a name, a start and end, attributes and events.
+
+    Times are wall clock nanoseconds, as in OpenTelemetry.
+    """
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: Optional[str],
+                 start_ns: Optional[int] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.events: List[Tuple[str, int]] = []
+
+    @property
+    def seconds(self) -> Optional[float]:
+        return None if self.end_ns is None else (self.end_ns - self.start_ns) / 1e9
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def event(self, name: str, time_ns: Optional[int] = None) -> None:
+        self.events.append((name, time_ns if time_ns is not None else time.time_ns()))
+
+    def child(self, name: str, start_ns: Optional[int] = None, **attributes: Any) -> "Span":
+        """
+        Start a child span. It is not made current; call end() when it is done.
+        """
+        return Span(self.tracer, name, self.trace_id, self.span_id, start_ns, attributes)
+
+    def record(self, name: str, start_ns: int, end_ns: int, **attributes: Any) -> "Span":
+        """
+        Add a finished child span for an interval that was measured elsewhere.
+        """
+        span = self.child(name, start_ns, **attributes)
+        span.end(end_ns)
+        return span
+
+    def end(self, end_ns: Optional[int] = None) -> None:
+        if self.end_ns is None:
+            self.end_ns = end_ns if end_ns is not None else time.time_ns()
+            self.tracer._finish(self)
+
+    @contextmanager
+    def use(self) -> Iterator["Span"]:
+        """
+        Make this span current for the block, e.g. on a worker thread, without ending it.
+        """
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+
+class Tracer:
+    """
+    In-process span collector with OpenTelemetry JSON and Prometheus export.
+
+    Finished spans are kept per trace for the last `max_traces` traces, and every
+    span duration also goes into a histogram keyed by span name and the span's
+    `backend` attribute, if it has one. No OpenTelemetry SDK is needed: the
+    export is the OTLP/JSON trace format that the OpenTelemetry Collector (and
+    Jaeger, Tempo, ...) read, and the Prometheus text exposition format.
+    """
+
+    def __init__(self, service_name: str = "demoapp", max_traces: int = 256,
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Initialize the Tracer.
+
+        Args:
+            service_name: `service.name` of the exported resource.
+            max_traces: Finished traces kept for export.
+            buckets: Histogram bucket upper bounds in seconds.
+        """
+        self.service_name = service_name
+        self.max_traces = max_traces
+        self.buckets = tuple(sorted(buckets))
+        self._traces: "OrderedDict[str, List[Span]]" = OrderedDict()
+        self._histograms: Dict[Tuple[str, str], List[float]] = {}  # bucket counts, then sum, count
+        self._lock = threading.Lock()
+
+    def start(self, name: str, start_ns: Optional[int] = None, **attributes: Any) -> Span:
+        """
+        Start the root span of a new trace. It is not made current; call end() when done.
+        """
+        return Span(self, name, os.urandom(16).hex(), None, start_ns, attributes)
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[Span] = None, start_ns: Optional[int] = None,
+             **attributes: Any) -> Iterator[Span]:
+        """
+        Time the block as a span and make it current.
+
+        The parent defaults to the current span; without one, a new trace starts.
+        An exception leaves `error` set on the span.
+        """
+        parent = parent or current_span()
+        if parent is not None:
+            span = parent.child(name, start_ns, **attributes)
+        else:
+            span = self.start(name, start_ns, **attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set("error", repr(e))
+            raise
+        finally:
+            _current.reset(token)
+            span.end()
+
+    def _finish(self, span: Span) -> None:
+        backend = str(span.attributes.get("backend", ""))
+        with self._lock:
+            trace = self._traces.get(span.trace_id)
+            if trace is None:
+                trace = self._traces[span.trace_id] = []
+                while len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+            trace.append(span)
+            histogram = self._histograms.get((span.name, backend))
+            if histogram is None:
+                histogram = self._histograms[(span.name, backend)] = [0.0] * (len(self.buckets) + 3)
+            histogram[bisect.bisect_left(self.buckets, span.seconds)] += 1
+            histogram[-2] += span.seconds
+            histogram[-1] += 1
+
+    def trace(self, trace_id: str) -> List[Span]:
+        with self._lock:
+            return list(self._traces.get(trace_id, []))
+
+    def otlp(self, trace_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Finished spans as an OTLP/JSON ExportTraceServiceRequest.
+
+        Args:
+            trace_ids: Traces to export; all kept traces by default.
+        """
+        with self._lock:
+            ids = list(self._traces) if trace_ids is None else trace_ids
+            spans = [span for trace_id in ids for span in self._traces.get(trace_id, [])]
+        return {"resourceSpans": [{
+            "resource": {"attributes": [_attribute("service.name", self.service_name)]},
+            "scopeSpans": [{
+                "scope": {"name": "demoapp.tracing"},
+                "spans": [_otlp_span(span) for span in spans],
+            }],
+        }]}
+
+    def export_otlp(self, path: Union[str, Path], trace_ids: Optional[List[str]] = None) -> None:
+        """
+        Append traces to a JSON lines file, one ExportTraceServiceRequest per line.
+
+        This is the format of the Collector's file exporter, so the Collector's
+        otlpjsonfile receiver can replay it to any tracing backend.
+        """
+        with open(path, "a") as file:
+            file.write(json.dumps(self.otlp(trace_ids)) + "\n")
+
+    def prometheus(self, prefix: str = "voice") -> str:
+        """
+        Span duration histograms in the Prometheus text exposition format.
+        """
+        name = f"{prefix}_span_duration_seconds"
+        lines = [f"# HELP {name} Duration of voice pipeline spans.", f"# TYPE {name} histogram"]
+        with self._lock:
+            histograms = sorted((key, list(values)) for key, values in self._histograms.items())
+        for (span_name, backend), values in histograms:
+            labels = f'span="{span_name}"' + (f',backend="{backend}"' if backend else "")
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{name}_bucket{{{labels},le="{le}"}} {int(cumulative)}')
+            lines.append(f"{name}_sum{{{labels}}} {values[-2]:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {int(values[-1])}")
+        return "\n".join(lines) + "\n"
+
+    def export_prometheus(self, path: Union[str, Path], prefix: str = "voice") -> None:
+        """
+        Write the histograms for node_exporter's textfile collector (atomic replace).
+        """
+        path = Path(path)
+        temp = path.with_name(path.name + ".tmp")
+        temp.write_text(self.prometheus(prefix))
+        temp.replace(path)
+
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}  # int64 is a string in OTLP/JSON
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def _otlp_span(span: Span) -> Dict[str, Any]:
+    result = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": 3 if "http.method" in span.attributes else 1,  # CLIENT for HTTP calls, else INTERNAL
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [_attribute(key, value) for key, value in span.attributes.items()],
+        "events": [{"name": name, "timeUnixNano": str(time_ns)} for name, time_ns in span.events],
+        "status": {"code": 2, "message": span.attributes["error"]} if "error" in span.attributes else {},
+    }
+    if span.parent_id:
+        result["parentSpanId"] = span.parent_id
+    return result
@@ -0,0 +1,181 @@
+import json
+import logging
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[str, str, float]
+
+
+def normalize(text: str) -> str:
+    """
+    Normalize a phrase for lookup: Unicode NFKC, lower case, single spaces.
+
+    Punctuation is kept - "Sure." and "Sure?" are spoken differently.
+    """
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class TTSCache:
+    """
+    LRU cache of synthesized speech, keyed by normalized text, voice and speed.
+
+    Audio is held as read-only float32 arrays, ready to hand to WebRTC. The cache
+    stays under `max_bytes` of sample data by evicting the least recently used
+    phrases. Only phrases up to `max_chars` long are cached: the point is the
+    short replies the assistant keeps repeating, not one-off long sentences,
+    which would only push them out. Thread safe.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_chars: int = 80,
+        path: Optional[Union[str, Path]] = None,
+    ):
+        """
+        Initialize the TTSCache.
+
+        Args:
+            max_bytes: Budget for the cached samples, in bytes.
+            max_chars: Longest phrase (after normalization) that is cached.
+            path: Optional .npz file the cache is loaded from and saved to.
+        """
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars
+        self.path = Path(path) if path else None
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Key, Tuple[np.ndarray, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        if self.path is not None and self.path.exists():
+            self.load()
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key(self, text: str, voice: str, speed: float = 1.0) -> Key:
+        return normalize(text), voice, round(float(speed), 3)
+
+    def cacheable(self, text: str) -> bool:
+        return 0 < len(normalize(text)) <= self.max_chars
+
+    def get(self, text: str, voice: str, speed: float = 1.0) -> Optional[Tuple[np.ndarray, int]]:
+        """
+        Look up a phrase.
+
+        Returns:
+            (samples, sample_rate), or None if it is not cached.
+        """
+        key = self.key(text, voice, speed)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, text: str, voice: str, speed: float, samples: np.ndarray, sample_rate: int) -> bool:
+        """
+        Cache the audio of a phrase, evicting old phrases to stay in budget.
+
+        Returns:
+            True if the phrase was cached; False if it is too long or too big.
+        """
+        if not self.cacheable(text):
+            return False
+        samples = np.array(samples, dtype=np.float32)  # own copy, safe to share
+        samples.setflags(write=False)
+        if samples.nbytes > self.max_bytes:
+            return False
+        key = self.key(text, voice, speed)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[0].nbytes
+            self._entries[key] = (samples, sample_rate)
+            self._bytes += samples.nbytes
+            while self._bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+        return True
+
+    def prewarm(
+        self,
+        phrases: Iterable[str],
+        voice: str,
+        synthesize: Callable[[str], Optional[Tuple[np.ndarray, int]]],
+        speed: float = 1.0,
+    ) -> int:
+        """
+        Synthesize and cache phrases that are not cached yet.
+
+        Args:
+            phrases: The filler phrases to have ready.
+            voice: Voice they are synthesized with.
+            synthesize: Returns (samples, sample_rate) for a phrase, or None on failure.
+            speed: Speech speed they are synthesized at.
+
+        Returns:
+            The number of phrases newly synthesized.
+        """
+        added = 0
+        for phrase in phrases:
+            with self._lock:
+                cached = self.key(phrase, voice, speed) in self._entries
+            if cached:
+                continue
+            synthesized = synthesize(phrase)
+            if synthesized is not None and self.put(phrase, voice, speed, *synthesized):
+                added += 1
+        logger.info(f"TTS cache pre-warmed {added} phrases, {len(self)} cached, {self.nbytes / 1e6:.1f} MB")
+        return added
+
+    def save(self, path: Optional[Union[str, Path]] = None) -> None:
+        """
+        Write the cache to an .npz file (default: the path it was created with).
+        """
+        path = Path(path) if path else self.path
+        if path is None:
+            raise ValueError("No path to save the TTS cache to")
+        with self._lock:
+            entries = list(self._entries.items())
+        index = [{"text": text, "voice": voice, "speed": speed, "sample_rate": sample_rate}
+                 for (text, voice, speed), (_, sample_rate) in entries]
+        arrays = {f"a{i}": samples for i, (_, (samples, _)) in enumerate(entries)}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_name(path.name + ".tmp")
+        with open(temp, "wb") as file:
+            np.savez(file, index=np.array(json.dumps(index)), **arrays)
+        temp.replace(path)
+        logger.info(f"Saved {len(entries)} TTS cache entries to {path}")
+
+    def load(self, path: Optional[Union[str, Path]] = None) -> None:
+        """
+        Add the entries of a saved cache, oldest first, within the byte budget.
+        """
+        path = Path(path) if path else self.path
+        try:
+            with np.load(path) as data:
+                index = json.loads(str(data["index"]))
+                for i, entry in enumerate(index):
+                    self.put(entry["text"], entry["voice"], entry["speed"], data[f"a{i}"], entry["sample_rate"])
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not load TTS cache from {path}: {e}")
+            return
+        logger.info(f"Loaded {len(index)} TTS cache entries from {path}")
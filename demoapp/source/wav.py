@@ -0,0 +1,134 @@
+import io
+import struct
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+@dataclass
+class WavFormat:
+    """
+    The fields of a WAV header that are needed to decode its samples.
+    """
+
+    audio_format: int  # 1 = PCM integer, 3 = IEEE float
+    channels: int
+    sample_rate: int
+    bits_per_sample: int
+    data_offset: int  # where the sample bytes start
+    data_size: Optional[int]  # None when the writer streamed an unknown length
+
+    @property
+    def dtype(self) -> np.dtype:
+        if self.audio_format == 3 and self.bits_per_sample == 32:
+            return np.dtype("<f4")
+        if self.audio_format == 1 and self.bits_per_sample == 16:
+            return np.dtype("<i2")
+        if self.audio_format == 1 and self.bits_per_sample == 32:
+            return np.dtype("<i4")
+        raise ValueError(f"Unsupported WAV encoding: format {self.audio_format}, {self.bits_per_sample} bit")
+
+    @property
+    def frame_bytes(self) -> int:
+        return self.channels * self.bits_per_sample // 8
+
+
+def parse_header(buffer) -> Optional[WavFormat]:
+    """
+    Parse a WAV header from the start of `buffer`.
+
+    Works on a prefix of the file: returns None while the header is still
+    incomplete, so it can be called repeatedly on a growing stream.
+
+    Args:
+        buffer: bytes, bytearray or memoryview holding the start of the file.
+
+    Returns:
+        The WavFormat, or None if more bytes are needed.
+    """
+    view = memoryview(buffer)
+    if len(view) < 12:
+        return None
+    if bytes(view[0:4]) != b"RIFF" or bytes(view[8:12]) != b"WAVE":
+        raise ValueError("Not a RIFF/WAVE stream")
+    offset, fmt = 12, None
+    while True:
+        if len(view) < offset + 8:
+            return None
+        chunk_id = bytes(view[offset:offset + 4])
+        (chunk_size,) = struct.unpack_from("<I", view, offset + 4)
+        body = offset + 8
+        if chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("WAV data chunk before fmt chunk")
+            # streaming writers put 0 or 0xFFFFFFFF here: length unknown
+            size = None if chunk_size in (0, 0xFFFFFFFF) else chunk_size
+            return WavFormat(*fmt, data_offset=body, data_size=size)
+        if len(view) < body + chunk_size:
+            return None
+        if chunk_id == b"fmt ":
+            audio_format, channels, sample_rate = struct.unpack_from("<HHI", view, body)
+            (bits,) = struct.unpack_from("<H", view, body + 14)
+            if audio_format == 0xFFFE and chunk_size >= 26:  # WAVE_FORMAT_EXTENSIBLE
+                (audio_format,) = struct.unpack_from("<H", view, body + 24)
+            fmt = (audio_format, channels, sample_rate, bits)
+        offset = body + chunk_size + (chunk_size & 1)  # chunks are word aligned
+
+
+def to_float32(samples: np.ndarray) -> np.ndarray:
+    """
+    Scale integer PCM samples to float32 in [-1, 1]; float32 input is returned as is.
+    """
+    if samples.dtype == np.float32:
+        return samples
+    scale = np.float32(1.0 / np.iinfo(samples.dtype).max)
+    return np.multiply(samples, scale, dtype=np.float32)
+
+
+def decode(data) -> Tuple[np.ndarray, int]:
+    """
+    Decode WAV bytes to (float32 samples, sample_rate) without a temp file.
+
+    The samples are viewed in place with np.frombuffer - no copy of the byte
+    buffer. Float32 WAVs come back as that view (read-only). Integer PCM is
+    scaled to float32 in a single pass, which is the only copy made.
+
+    Args:
+        data: bytes, bytearray or memoryview of a complete WAV file.
+
+    Returns:
+        (samples, sample_rate); samples is 1-D for mono, (frames, channels) otherwise.
+    """
+    header = parse_header(data)
+    if header is None:
+        raise ValueError("Truncated WAV header")
+    view = memoryview(data)[header.data_offset:]
+    if header.data_size is not None:
+        view = view[:header.data_size]
+    view = view[:len(view) - len(view) % header.frame_bytes]
+    samples = to_float32(np.frombuffer(view, dtype=header.dtype))
+    if header.channels > 1:
+        samples = samples.reshape(-1, header.channels)
+    return samples, header.sample_rate
+
+
+def encode(samples: np.ndarray, sample_rate: int) -> bytes:
+    """
+    Encode samples as a 16-bit PCM WAV in memory.
+
+    Args:
+        samples: float samples in [-1, 1] or int16 samples, 1-D or (frames, channels).
+        sample_rate: Sample rate in Hz.
+    """
+    samples = np.asarray(samples)
+    if samples.dtype != np.int16:
+        samples = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    channels = 1 if samples.ndim == 1 else samples.shape[1]
+    data = samples.astype("<i2", copy=False).tobytes()
+    buffer = io.BytesIO()
+    buffer.write(b"RIFF" + struct.pack("<I", 36 + len(data)) + b"WAVE")
+    buffer.write(b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate,
+                                       sample_rate * channels * 2, channels * 2, 16))
+    buffer.write(b"data" + struct.pack("<I", len(data)) + data)
+    return buffer.getvalue()
@@ -1,88 +1,117 @@
-import requests
-import json
 from typing import Optional, Dict, Any, BinaryIO, Union, Tuple
 import os
 from pathlib import Path
 
+import numpy as np
+
+from . import wav
+from .httpclient import HttpClient
+
+
+class TranscriptionResponse:
+    """
+    Transcription result with attribute access, similar to the Groq client's.
+    """
+
+    def __init__(self, result: Dict[str, Any]):
+        self.text = result.get("text", "")
+        self._result = result
+
+    def __getattr__(self, name):
+        if name in self._result:
+            return self._result[name]
+        raise AttributeError(f"'TranscriptionResponse' has no attribute '{name}'")
+
 
 class WhisperClient:
     """
     Client for interacting with the Whisper API for audio transcription.
     """
-    
-    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None):
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        timeout: float = 60.0,
+        max_retries: int = 2,
+    ):
         """
         Initialize the WhisperClient.
-        
+
         Args:
             base_url: The base URL of the Whisper API. If None, uses environment variable WHISPER_API_URL
                      or defaults to http://localhost:8000
             api_key: The API key for authentication. If None, uses environment variable WHISPER_API_KEY
+            timeout: Read timeout in seconds for one request.
+            max_retries: Extra attempts on connection errors and 5xx responses.
         """
         self.base_url = base_url or os.environ.get("WHISPER_API_URL", "http://localhost:8000")
         self.api_key = api_key or os.environ.get("WHISPER_API_KEY")
-        
+
         # Ensure base_url doesn't end with a slash
         if self.base_url.endswith("/"):
             self.base_url = self.base_url[:-1]
-        
+
+        # One pooled keep-alive connection for the life of the client.
+        self.http = HttpClient(self.base_url, name="asr", headers=self._get_headers(), timeout=timeout,
+                               max_retries=max_retries)
+
     def _get_headers(self) -> Dict[str, str]:
         """Get headers for API requests including authentication if available."""
         headers = {
             "Accept": "application/json",
         }
-        
+
         if self.api_key:
             headers["Authorization"] = f"Bearer {self.api_key}"
-            
+
         return headers
-            
-    def transcribe(
-        self, 
-        file: Union[Tuple[str, bytes], BinaryIO, str, Path],
-        model: str = "whisper-large-v3",
-        response_format: str = "json",
-        language: Optional[str] = None,
-        prompt: Optional[str] = None,
-        temperature: Optional[float] = None,
-    ) -> Any:
-        """
-        Transcribe audio to text using the Whisper API.
-        
-        Args:
-            file: Audio file to transcribe. Can be a tuple of (filename, bytes),
-                 a file-like object, a string path, or a Path object
-            model: The model to use for transcription
-            response_format: The format for the response (json, text, verbose_json, etc.)
-            language: Optional language code to specify the spoken language
-            prompt: Optional prompt to guide the transcription
-            temperature: Optional sampling temperature between 0 and 1
-            
-        Returns:
-            The transcription response object
-        """
-        url = f"{self.base_url}/transcribe"
-        
+
+    def _request_parts(
+        self,
+        file: Union[Tuple[str, bytes], Tuple[int, np.ndarray], bytes, np.ndarray, BinaryIO, str, Path],
+        model: str,
+        response_format: str,
+        language: Optional[str],
+        prompt: Optional[str],
+        temperature: Optional[float],
+        sample_rate: Optional[int],
+    ) -> Dict[str, Any]:
+        """Build the multipart form fields and file for a transcription request."""
         files = {}
         data = {
             "model": model,
             "response_format": response_format,
         }
-        
+
         if language:
             data["language"] = language
         if prompt:
             data["prompt"] = prompt
         if temperature is not None:
-            data["temperature"] = temperature
-            
-        # Handle different file input types
-        if isinstance(file, tuple) and len(file) == 2:
+            data["temperature"] = str(temperature)
+
+        # Handle different file input types. Everything is read into memory first,
+        # so a retried request can send the same body again.
+        if isinstance(file, tuple) and len(file) == 2 and isinstance(file[1], np.ndarray):
+            # (sample_rate, samples) format, as delivered by Gradio / fastrtc
+            samples = file[1]
+            if samples.ndim == 2 and samples.shape[0] < samples.shape[1]:
+                samples = samples.T  # fastrtc is (channels, frames)
+            files["file"] = ("audio.wav", wav.encode(samples, file[0]), "audio/wav")
+        elif isinstance(file, tuple) and len(file) == 2:
             # (filename, bytes) format
-            files["file"] = file[0]
+            files["file"] = file
+        elif isinstance(file, np.ndarray):
+            if sample_rate is None:
+                raise ValueError("sample_rate is required for NumPy audio")
+            files["file"] = ("audio.wav", wav.encode(file, sample_rate), "audio/wav")
+        elif isinstance(file, (bytes, bytearray, memoryview)):
+            # Audio file content already in memory
+            files["file"] = ("audio.wav", bytes(file))
         elif hasattr(file, 'read'):
             # File-like object
-            files["file"] = file
+            files["file"] = (Path(getattr(file, "name", "audio.wav")).name, file.read())
         elif isinstance(file, (str, Path)):
             # File path
             path = Path(file)
@@ -91,26 +120,56 @@ class WhisperClient:
             files["file"] = (path.name, path.read_bytes())
         else:
             raise ValueError("Invalid file format")
-            
-        headers = self._get_headers()
-        # Don't include content-type in headers as requests will set it correctly for multipart/form-data
-        if "Content-Type" in headers:
-            del headers["Content-Type"]
-            
-        response = requests.post(url, headers=headers, data=data, files=files)
-        response.raise_for_status()
-        
-        result = response.json()
-        
-        # Create a response object similar to the Groq client for compatibility
-        class TranscriptionResponse:
-            def __init__(self, result):
-                self.text = result.get("text", "")
-                self._result = result
-                
-            def __getattr__(self, name):
-                if name in self._result:
-                    return self._result[name]
-                raise AttributeError(f"'TranscriptionResponse' has no attribute '{name}'")
-                
-        return TranscriptionResponse(result)
+        return {"data": data, "files": files}
+
+    def transcribe(
+        self,
+        file: Union[Tuple[str, bytes], Tuple[int, np.ndarray], bytes, np.ndarray, BinaryIO, str, Path],
+        model: str = "whisper-large-v3",
+        response_format: str = "json",
+        language: Optional[str] = None,
+        prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        sample_rate: Optional[int] = None,
+    ) -> TranscriptionResponse:
+        """
+        Transcribe audio to text using the Whisper API.
+
+        Args:
+            file: Audio to transcribe. Can be a tuple of (filename, bytes), raw
+                 audio file bytes, a (sample_rate, samples) tuple or a NumPy array
+                 of samples (encoded to WAV in memory), a file-like object, a
+                 string path, or a Path object
+            model: The model to use for transcription
+            response_format: The format for the response (json, text, verbose_json, etc.)
+            language: Optional language code to specify the spoken language
+            prompt: Optional prompt to guide the transcription
+            temperature: Optional sampling temperature between 0 and 1
+            sample_rate: Sample rate of `file` when it is a bare NumPy array
+
+        Returns:
+            The transcription response object
+
+        Raises:
+            httpx.HTTPError: The request failed after all retries.
+        """
+        parts = self._request_parts(file, model, response_format, language, prompt, temperature, sample_rate)
+        response = self.http.request("POST", "/transcribe", **parts)
+        return TranscriptionResponse(response.json())
+
+    async def atranscribe(
+        self,
+        file: Union[Tuple[str, bytes], Tuple[int, np.ndarray], bytes, np.ndarray, BinaryIO, str, Path],
+        model: str = "whisper-large-v3",
+        response_format: str = "json",
+        language: Optional[str] = None,
+        prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        sample_rate: Optional[int] = None,
+    ) -> TranscriptionResponse:
+        """
+        Async version of transcribe, on the client's async connection pool.
+        """
+        parts = self._request_parts(file, model, response_format, language, prompt, temperature, sample_rate)
+        response = await self.http.arequest("POST", "/transcribe", **parts)
+        return TranscriptionResponse(response.json())
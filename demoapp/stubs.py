@@ -0,0 +1,158 @@
+"""
+Local stand-ins for the demo's backends, for benchmarks and load tests.
+
+- Whisper: POST /transcribe -> {"text": ...} after a fixed delay
+- Orpheus: POST /v1/audio/speech -> a 24 kHz 16-bit mono WAV whose length follows
+  the input text (about 60 ms per character). It is streamed the way a streaming
+  TTS server sends it: chunked, header first with an unknown data length, then
+  the audio in 100 ms pieces, the synthesis delay (which scales with the text)
+  spread evenly over them
+
+- LLM: StubLLM, an object with a LangChain-style .stream(messages) that yields a
+  fixed reply token by token, and .invoke(messages) for summaries
+
+All run in-process (the servers on background threads, stdlib HTTP server,
+keep-alive). Each takes a `capacity`: requests beyond it wait for a free slot,
+the way a GPU server with a fixed batch size queues them.
+"""
+import json
+import socket
+import threading
+import time
+from contextlib import nullcontext
+from types import SimpleNamespace
+from typing import Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from source import wav
+
+TTS_SAMPLE_RATE = 24000
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    slots = None  # semaphore when the backend has a capacity
+
+    def _busy(self):
+        return self.slots or nullcontext()
+
+    def setup(self):
+        super().setup()
+        # like uvicorn: without it small replies wait ~40 ms on delayed ACKs
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+
+class _WhisperHandler(_Handler):
+    delay = 0.05
+    text = "What is the weather like tomorrow?"
+
+    def do_POST(self):
+        self._read_body()
+        with self._busy():
+            time.sleep(self.delay)
+        self._send(json.dumps({"text": self.text}).encode(), "application/json")
+
+
+class _OrpheusHandler(_Handler):
+    delay_per_char = 0.002
+    seconds_per_char = 0.06
+
+    def do_POST(self):
+        text = json.loads(self._read_body())["input"]
+        frames = int(TTS_SAMPLE_RATE * self.seconds_per_char * max(1, len(text)))
+        t = np.arange(frames, dtype=np.float32) / TTS_SAMPLE_RATE
+        content = wav.encode(0.2 * np.sin(2 * np.pi * 220 * t), TTS_SAMPLE_RATE)
+        header, data = bytearray(content[:44]), content[44:]
+        header[40:44] = b"\xff\xff\xff\xff"  # length unknown while streaming
+        piece = TTS_SAMPLE_RATE // 10 * 2
+        pieces = [data[i:i + piece] for i in range(0, len(data), piece)]
+
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/wav")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            with self._busy():
+                self._send_chunk(bytes(header))
+                for data in pieces:
+                    time.sleep(self.delay_per_char * len(text) / len(pieces))
+                    self._send_chunk(data)
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # the client stopped listening mid-stream
+
+
+def _start(handler) -> str:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def _slots(capacity: Optional[int]):
+    return threading.BoundedSemaphore(capacity) if capacity else None
+
+
+def start_whisper(delay: float = 0.05, capacity: Optional[int] = None) -> str:
+    """
+    Start a stub Whisper server and return its base URL.
+    """
+    return _start(type("WhisperStub", (_WhisperHandler,), {"delay": delay, "slots": _slots(capacity)}))
+
+
+def start_orpheus(delay_per_char: float = 0.002, capacity: Optional[int] = None) -> str:
+    """
+    Start a stub Orpheus server and return its base URL.
+    """
+    return _start(type("OrpheusStub", (_OrpheusHandler,),
+                       {"delay_per_char": delay_per_char, "slots": _slots(capacity)}))
+
+
+class StubLLM:
+    """
+    Stand-in for a LangChain chat model that streams a fixed reply.
+
+    The first token comes after `first_token_delay` seconds, the rest every
+    `token_delay` seconds; each token is one word with its trailing space.
+    """
+
+    def __init__(self, reply: str, first_token_delay: float = 0.2, token_delay: float = 0.02,
+                 capacity: Optional[int] = None):
+        self.tokens = [word + " " for word in reply.split()]
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.slots = _slots(capacity)
+
+    def stream(self, messages):
+        # the last chunk reports usage like ChatOllama's, with a prompt size of ~4 characters per token
+        prompt_tokens = sum(len(message["content"]) for message in messages) // 4
+        with self.slots or nullcontext():
+            time.sleep(self.first_token_delay)
+            for i, token in enumerate(self.tokens):
+                if i:
+                    time.sleep(self.token_delay)
+                usage = {"input_tokens": prompt_tokens} if i == len(self.tokens) - 1 else None
+                yield SimpleNamespace(content=token, usage_metadata=usage)
+
+    def invoke(self, messages):
+        with self.slots or nullcontext():
+            time.sleep(self.first_token_delay + self.token_delay * len(self.tokens))
+            return SimpleNamespace(content="The user asked about the weather; the assistant answered.")
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Load generator for the OpenAI image API (`POST /v1/images/generations`).
+
+Async (httpx), one pooled keep-alive client. For every concurrency level of the
+sweep it sends `--requests` generations drawn from a weighted size / steps / n mix
+and reports images/s, requests/s, p50/p95/p99 end-to-end latency and
+time-to-first-image (first byte of the first image payload — the b64 field in
+JSON mode, the body in binary mode), plus the server's own queue / inference
+seconds from its response headers. Results go to `benchmarks/` as JSON.
+
+Two arrival modes:
+  closed loop (default)  `concurrency` workers, each sends its next request as soon
+                         as the previous one returns — measures capacity
+  open loop (--rate R)   Poisson arrivals at R req/s, at most `concurrency` in
+                         flight; latency counts from the scheduled arrival, so
+                         client-side waiting is not hidden (no coordinated omission)
+
+Usage:
+    python bench_images.py --stub                                   # CPU stub, no GPU
+    python bench_images.py --url http://localhost:8101 --concurrency 1 2 4
+    python bench_images.py --url http://localhost:8102 --model qwen-image \\
+        --sizes 1024x1024:3 1536x1024:1 --steps 50 --n 1:3 4:1 --rate 0.05
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+try:
+    import httpx
+except ImportError as exc:
+    sys.exit(f"Missing dependency: {exc.name}. Install with: uv pip install httpx")
+
+
+BENCH_DIR = Path(__file__).parent / "benchmarks"
+PROMPTS = [
+    "a photorealistic red panda barista pouring latte art, cozy cafe, warm light",
+    "isometric illustration of a tiny floating island with a lighthouse, pastel colours",
+    "macro photo of dew drops on a spider web at sunrise, shallow depth of field",
+    "a neon-lit cyberpunk street market in the rain, cinematic, 35mm",
+    "watercolor painting of a fox sleeping under an autumn maple tree",
+    "product shot of a matte black mechanical keyboard on a walnut desk",
+]
+
+
+@dataclass
+class Result:
+    ok: bool
+    status: int
+    latency_s: float
+    ttfi_s: float | None
+    images: int
+    size: str
+    steps: int
+    n: int
+    queue_s: float | None = None
+    inference_s: float | None = None
+    error: str | None = None
+
+
+def parse_mix(items: list[str], cast=str) -> list[tuple]:
+    """["1024x1024:3", "768x768"] -> [("1024x1024", 3.0), ("768x768", 1.0)]"""
+    mix = []
+    for item in items:
+        value, _, weight = item.partition(":")
+        mix.append((cast(value), float(weight or 1)))
+    return mix
+
+
+def pick(rng: random.Random, mix: list[tuple]):
+    return rng.choices([v for v, _ in mix], weights=[w for _, w in mix])[0]
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    """Linear-interpolated percentile, q in [0, 100]."""
+    if not values:
+        return None
+    s = sorted(values)
+    k = (len(s) - 1) * q / 100
+    lo = int(k)
+    hi = min(lo + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (k - lo)
+
+
+def _header_float(r: httpx.Response, name: str) -> float | None:
+    try:
+        return float(r.headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+async def generate(client: httpx.AsyncClient, payload: dict, t_start: float) -> Result:
+    """One request, streamed so the first image byte can be timed. `t_start` is
+    when the request was due (open loop) or sent (closed loop)."""
+    binary = payload.get("response_format") == "binary"
+    base = dict(size=payload["size"], steps=payload["num_inference_steps"], n=payload["n"])
+    ttfi = None
+    try:
+        async with client.stream("POST", "/v1/images/generations", json=payload) as r:
+            chunks, tail = [], b""
+            async for chunk in r.aiter_bytes():
+                if ttfi is None and (binary or b'"b64_json"' in tail + chunk):
+                    ttfi = time.perf_counter() - t_start
+                tail = chunk[-16:]
+                chunks.append(chunk)
+            latency = time.perf_counter() - t_start
+            body = b"".join(chunks)
+            if r.status_code != 200:
+                return Result(False, r.status_code, latency, None, 0, **base,
+                              error=body[:200].decode("utf-8", "replace"))
+            if binary:
+                ctype = r.headers.get("content-type", "")
+                images = body.count(b"\r\nContent-Type: image/") if ctype.startswith("multipart/") else 1
+            else:
+                images = len(json.loads(body)["data"])
+            return Result(True, 200, latency, ttfi, images, **base,
+                          queue_s=_header_float(r, "x-queue-seconds"),
+                          inference_s=_header_float(r, "x-inference-seconds"))
+    except (httpx.HTTPError, ValueError, KeyError) as exc:
+        return Result(False, 0, time.perf_counter() - t_start, None, 0, **base, error=repr(exc))
+
+
+def make_payloads(args, rng: random.Random, count: int) -> list[dict]:
+    payloads = []
+    for _ in range(count):
+        p = {
+            "model": args.model,
+            "prompt": rng.choice(PROMPTS),
+            "size": pick(rng, args.size_mix),
+            "num_inference_steps": pick(rng, args.steps_mix),
+            "n": pick(rng, args.n_mix),
+            "response_format": args.response_format,
+        }
+        if args.seeded:
+            p["seed"] = rng.randrange(2**31)  # distinct seeds: no result-cache hits
+        payloads.append(p)
+    return payloads
+
+
+async def run_level(client: httpx.AsyncClient, args, concurrency: int, payloads: list[dict]) -> list[Result]:
+    results: list[Result] = []
+    if args.rate > 0:
+        rng = random.Random(args.seed + concurrency)
+        sem = asyncio.Semaphore(concurrency)
+
+        async def fire(payload, due):
+            async with sem:
+                results.append(await generate(client, payload, due))
+
+        tasks, due = [], time.perf_counter()
+        for payload in payloads:
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(fire(payload, due)))
+            due += rng.expovariate(args.rate)
+        await asyncio.gather(*tasks)
+    else:
+        queue = list(reversed(payloads))
+
+        async def worker():
+            while queue:
+                results.append(await generate(client, queue.pop(), time.perf_counter()))
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results
+
+
+def summarize(results: list[Result], wall: float, concurrency: int) -> dict:
+    ok = [r for r in results if r.ok]
+    images = sum(r.images for r in ok)
+    lat = [r.latency_s for r in ok]
+    ttfi = [r.ttfi_s for r in ok if r.ttfi_s is not None]
+    queue = [r.queue_s for r in ok if r.queue_s is not None]
+    infer = [r.inference_s for r in ok if r.inference_s is not None]
+
+    def pcts(values):
+        return {f"p{q}": percentile(values, q) for q in (50, 95, 99)}
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "ok": len(ok),
+        "errors": len(results) - len(ok),
+        "rejected_429": sum(r.status == 429 for r in results),
+        "images": images,
+        "wall_s": wall,
+        "images_per_s": images / wall if wall > 0 else 0.0,
+        "requests_per_s": len(ok) / wall if wall > 0 else 0.0,
+        "latency_s": {**pcts(lat), "mean": sum(lat) / len(lat) if lat else None},
+        "ttfi_s": pcts(ttfi),
+        "server_queue_s_mean": sum(queue) / len(queue) if queue else None,
+        "server_inference_s_mean": sum(infer) / len(infer) if infer else None,
+    }
+
+
+def _fmt(v: float | None, width: int = 8, prec: int = 2) -> str:
+    return f"{'-':>{width}}" if v is None else f"{v:>{width}.{prec}f}"
+
+
+def start_stub(args) -> str:
+    """Run stub_server.py in-process on a free port; returns its base URL."""
+    import stub_server
+
+    stub_args = stub_server.build_parser().parse_args(
+        ["--port", "0", "--model", args.model, "--ms-per-mpx-step", str(args.stub_ms_per_mpx_step)])
+    server = stub_server.serve(stub_args)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+async def bench(args) -> dict:
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    timeout = httpx.Timeout(args.timeout, connect=10.0)
+    levels = []
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=timeout) as client:
+        try:
+            health = (await client.get("/health")).json()
+        except (httpx.HTTPError, ValueError) as exc:
+            sys.exit(f"{args.url}/health unreachable: {exc}")
+        if args.warmup:
+            print(f"Warmup    : {args.warmup} request(s) (not measured)…", flush=True)
+            rng = random.Random(args.seed - 1)
+            await run_level(client, args, 1, make_payloads(args, rng, args.warmup))
+
+        print()
+        print(f"{'conc':>5}{'ok/req':>9}{'img/s':>8}{'req/s':>8}{'p50':>8}{'p95':>8}{'p99':>8}"
+              f"{'ttfi50':>8}{'ttfi95':>8}{'queue':>8}")
+        print("-" * 82)
+        for conc in args.concurrency:
+            # same request sequence at every level, so levels are comparable
+            payloads = make_payloads(args, random.Random(args.seed), args.requests)
+            t0 = time.perf_counter()
+            results = await run_level(client, args, conc, payloads)
+            summary = summarize(results, time.perf_counter() - t0, conc)
+            lat, ttfi = summary["latency_s"], summary["ttfi_s"]
+            print(f"{conc:>5}{summary['ok']:>5}/{summary['requests']:<3}{summary['images_per_s']:>8.2f}"
+                  f"{summary['requests_per_s']:>8.2f}{_fmt(lat['p50'])}{_fmt(lat['p95'])}{_fmt(lat['p99'])}"
+                  f"{_fmt(ttfi['p50'])}{_fmt(ttfi['p95'])}{_fmt(summary['server_queue_s_mean'])}", flush=True)
+            errors = [r.error for r in results if not r.ok]
+            if errors:
+                print(f"      {len(errors)} failed, e.g. {errors[0]}")
+            if args.per_request:
+                summary["results"] = [asdict(r) for r in results]
+            levels.append(summary)
+        print("-" * 82)
+    return {"health": health, "levels": levels}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8101", help="server base URL (no /v1)")
+    parser.add_argument("--model", default="z-image-turbo")
+    parser.add_argument("--sizes", nargs="+", default=["1024x1024:3", "768x768:1"],
+                        help="size mix, WxH[:weight] (default 1024x1024:3 768x768:1)")
+    parser.add_argument("--steps", nargs="+", default=["9"], help="steps mix, S[:weight]")
+    parser.add_argument("--n", nargs="+", default=["1:3", "2:1"], help="batch-size mix, N[:weight]")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4],
+                        help="levels to sweep (max in-flight requests)")
+    parser.add_argument("--requests", type=int, default=16, help="requests per level")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="open-loop Poisson arrival rate in req/s (0 = closed loop)")
+    parser.add_argument("--response-format", choices=["b64_json", "binary"], default="b64_json")
+    parser.add_argument("--seeded", action="store_true",
+                        help="send a distinct seed per request (deterministic, still no cache hits)")
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured requests before the sweep")
+    parser.add_argument("--seed", type=int, default=0, help="RNG seed for the request mix")
+    parser.add_argument("--timeout", type=float, default=600.0, help="per-request timeout, seconds")
+    parser.add_argument("--per-request", action="store_true", help="include every request in the JSON")
+    parser.add_argument("--json", type=Path, default=None,
+                        help=f"results path (default {BENCH_DIR.name}/<model>-<timestamp>.json)")
+    parser.add_argument("--stub", action="store_true", help="bench an in-process CPU stub server")
+    parser.add_argument("--stub-ms-per-mpx-step", type=float, default=20.0,
+                        help="stub speed (default 20 — fast enough for a smoke run)")
+    args = parser.parse_args()
+
+    args.size_mix = parse_mix(args.sizes)
+    args.steps_mix = parse_mix(args.steps, int)
+    args.n_mix = parse_mix(args.n, int)
+    if args.stub:
+        args.url = start_stub(args)
+
+    mode = f"open loop, {args.rate:g} req/s" if args.rate > 0 else "closed loop"
+    print(f"Endpoint  : {args.url}{' (stub)' if args.stub else ''}")
+    print(f"Model     : {args.model}")
+    print(f"Mix       : sizes {args.sizes}, steps {args.steps}, n {args.n}")
+    print(f"Load      : {mode}, concurrency {args.concurrency}, {args.requests} requests/level, "
+          f"{args.response_format}")
+
+    out = asyncio.run(bench(args))
+
+    best = max(out["levels"], key=lambda lv: lv["images_per_s"])
+    print(f"Peak      : {best['images_per_s']:.2f} images/s at concurrency {best['concurrency']}")
+
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    path = args.json or BENCH_DIR / f"{args.model}{'-stub' if args.stub else ''}-{stamp}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({
+        "endpoint": args.url,
+        "model": args.model,
+        "timestamp": stamp,
+        "stub": args.stub,
+        "config": {
+            "sizes": args.sizes, "steps": args.steps, "n": args.n,
+            "concurrency": args.concurrency, "requests": args.requests,
+            "rate": args.rate, "response_format": args.response_format,
+            "seeded": args.seeded, "seed": args.seed,
+        },
+        **out,
+    }, indent=2))
+    print(f"Wrote {path}")
+    return 0 if all(lv["errors"] == 0 for lv in out["levels"]) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
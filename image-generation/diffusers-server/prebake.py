@@ -0,0 +1,219 @@
+"""One-time "compile" of a diffusers pipeline into a fast, memory-mappable layout.
+
+`from_pretrained` on every boot re-parses the HF checkpoint, resolves shards and
+casts every tensor to TORCH_DTYPE — minutes for the 20B Qwen-Image. This module
+does that work once and writes the result to PREBAKED_DIR:
+
+  manifest.json                 model id, revision, pipeline class, dtype, component index
+  <component>/                  config (nn.Module) or save_pretrained dir (tokenizer,
+                                scheduler, processor, ...)
+  <component>-00000.safetensors already-cast weights, split into shards of at most
+                                PREBAKE_SHARD_GB so the compile step never holds a
+                                whole 40 GB transformer in host RAM
+
+At startup `load()` builds every nn.Module on the meta device, then memory-maps its
+shards straight onto the target device (safetensors `load_file(device=...)`) — one
+thread per component, so the transformer, text encoder and VAE load in parallel.
+Per-component wall times come back alongside the pipeline.
+
+Compile (same env vars as server.py, run once inside the container):
+  PREBAKED_DIR=/prebaked python3 prebake.py
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+
+import torch
+
+MANIFEST = "manifest.json"
+DTYPES = {
+    "bfloat16": torch.bfloat16,
+    "float16": torch.float16,
+    "float32": torch.float32,
+}
+
+
+def _dtype_name(dtype: torch.dtype) -> str:
+    return next(k for k, v in DTYPES.items() if v == dtype)
+
+
+def _import_class(module: str, name: str):
+    return getattr(import_module(module), name)
+
+
+def _shards(state: dict, max_bytes: int) -> list[dict]:
+    """Greedy split of a state dict into shards of at most `max_bytes`."""
+    shards, cur, size = [], {}, 0
+    for k, t in state.items():
+        n = t.numel() * t.element_size()
+        if cur and size + n > max_bytes:
+            shards.append(cur)
+            cur, size = {}, 0
+        cur[k] = t
+        size += n
+    if cur:
+        shards.append(cur)
+    return shards
+
+
+def _dedup(state: dict) -> dict:
+    """Drop tensors that alias an earlier one (tied weights) — safetensors refuses
+    shared storage. `tie_weights()` restores them at load time."""
+    seen, out = set(), {}
+    for k, t in state.items():
+        key = (t.untyped_storage().data_ptr(), t.storage_offset(), tuple(t.shape))
+        if key in seen:
+            continue
+        seen.add(key)
+        out[k] = t
+    return out
+
+
+def resolve_revision(model_id: str) -> str:
+    """MODEL_REVISION, else the commit hash of the cached HF snapshot; "unknown" if neither."""
+    if os.environ.get("MODEL_REVISION"):
+        return os.environ["MODEL_REVISION"]
+    try:
+        from huggingface_hub import snapshot_download
+        return os.path.basename(snapshot_download(model_id, local_files_only=True))
+    except Exception:
+        return "unknown"
+
+
+def compile_pipeline(pipe, out_dir: str, model_id: str, dtype: torch.dtype,
+                     shard_gb: float = 5.0, revision: str = "unknown") -> None:
+    """Write every pipeline component of `pipe` to `out_dir` in the prebaked layout."""
+    from safetensors.torch import save_file
+
+    os.makedirs(out_dir, exist_ok=True)
+    max_bytes = int(shard_gb * 1024**3)
+    index = {}
+    for name, comp in pipe.components.items():
+        if comp is None:
+            index[name] = None
+            continue
+        entry = {"module": type(comp).__module__, "class": type(comp).__name__}
+        comp_dir = os.path.join(out_dir, name)
+        if isinstance(comp, torch.nn.Module):
+            t0 = time.time()
+            if hasattr(comp, "save_config"):  # diffusers ModelMixin
+                comp.save_config(comp_dir)
+                entry["kind"] = "diffusers"
+            else:  # transformers PreTrainedModel
+                comp.config.save_pretrained(comp_dir)
+                entry["kind"] = "transformers"
+            files = []
+            for i, shard in enumerate(_shards(_dedup(comp.state_dict()), max_bytes)):
+                fname = f"{name}-{i:05d}.safetensors"
+                # one shard at a time on the host, already in its loaded dtype
+                save_file({k: t.detach().cpu().contiguous() for k, t in shard.items()},
+                          os.path.join(out_dir, fname))
+                files.append(fname)
+            entry["files"] = files
+            print(f"[prebake] {name}: {len(files)} shard(s) in {time.time() - t0:.1f}s", flush=True)
+        else:
+            comp.save_pretrained(comp_dir)
+            entry["kind"] = "pretrained"
+        index[name] = entry
+
+    manifest = {
+        "model_id": model_id,
+        "revision": revision,
+        "pipeline_class": type(pipe).__name__,
+        "dtype": _dtype_name(dtype),
+        "components": index,
+    }
+    with open(os.path.join(out_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def read_manifest(path: str) -> dict | None:
+    try:
+        with open(os.path.join(path, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_prebaked(path: str, model_id: str, dtype: torch.dtype, revision: str, pipeline_class: str) -> bool:
+    """True when `path` holds a prebake of exactly this model id, revision, pipeline class
+    and dtype. Manifests written before revisions were recorded never match."""
+    m = read_manifest(path) if path else None
+    return (bool(m) and m["model_id"] == model_id and m.get("revision") == revision
+            and m["pipeline_class"] == pipeline_class and m["dtype"] == _dtype_name(dtype))
+
+
+def _load_module(path: str, name: str, entry: dict, device: str) -> torch.nn.Module:
+    from accelerate import init_empty_weights
+    from safetensors.torch import load_file
+
+    cls = _import_class(entry["module"], entry["class"])
+    comp_dir = os.path.join(path, name)
+    # params on meta (no allocation, no random init); buffers stay real so
+    # non-persistent ones (rope tables, position ids) are still computed.
+    with init_empty_weights():
+        if entry["kind"] == "diffusers":
+            model = cls.from_config(cls.load_config(comp_dir))
+        else:
+            model = cls(cls.config_class.from_pretrained(comp_dir))
+    state = {}
+    for fname in entry["files"]:
+        # mmap'd read, copied straight to `device` — no dtype conversion needed
+        state.update(load_file(os.path.join(path, fname), device=device))
+    model.load_state_dict(state, strict=False, assign=True)
+    if hasattr(model, "tie_weights"):
+        model.tie_weights()
+    missing = [k for k, p in model.named_parameters() if p.is_meta]
+    if missing:
+        raise RuntimeError(f"prebaked {name} is missing {len(missing)} tensors (e.g. {missing[0]}) — re-run prebake.py")
+    return model.to(device).eval()
+
+
+def load(path: str, device: str = "cuda"):
+    """Build the pipeline from a prebake. Returns (pipe, {component: seconds})."""
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise FileNotFoundError(f"no {MANIFEST} in {path}")
+    comps = manifest["components"]
+    timings: dict[str, float] = {}
+
+    def _one(name):
+        entry = comps[name]
+        t0 = time.time()
+        if entry is None:
+            obj = None
+        elif entry["kind"] == "pretrained":
+            obj = _import_class(entry["module"], entry["class"]).from_pretrained(os.path.join(path, name))
+        else:
+            obj = _load_module(path, name, entry, device)
+        timings[name] = time.time() - t0
+        return name, obj
+
+    with ThreadPoolExecutor(max_workers=max(1, len(comps))) as pool:
+        components = dict(pool.map(_one, comps))
+    cls = getattr(import_module("diffusers"), manifest["pipeline_class"])
+    t0 = time.time()
+    pipe = cls(**components)
+    timings["_assemble"] = time.time() - t0
+    return pipe, timings
+
+
+if __name__ == "__main__":
+    model_id = os.environ["MODEL_ID"]
+    out_dir = os.environ["PREBAKED_DIR"]
+    dtype = DTYPES[os.environ.get("TORCH_DTYPE", "bfloat16")]
+    kwargs = {"torch_dtype": dtype, "low_cpu_mem_usage": os.environ.get("LOW_CPU_MEM_USAGE", "1") == "1"}
+    if os.environ.get("TRUST_REMOTE_CODE", "0") == "1":
+        kwargs["trust_remote_code"] = True
+    if os.environ.get("DEVICE_MAP", "").strip():
+        kwargs["device_map"] = os.environ["DEVICE_MAP"].strip()
+    cls = getattr(import_module("diffusers"), os.environ["PIPELINE_CLASS"])
+    print(f"[prebake] loading {model_id} as {cls.__name__} ({dtype}) ...", flush=True)
+    t0 = time.time()
+    p = cls.from_pretrained(model_id, **kwargs)
+    print(f"[prebake] loaded in {time.time() - t0:.1f}s, writing {out_dir}", flush=True)
+    compile_pipeline(p, out_dir, model_id, dtype, float(os.environ.get("PREBAKE_SHARD_GB", "5")),
+                     revision=resolve_revision(model_id))
+    print(f"[prebake] done in {time.time() - t0:.1f}s", flush=True)
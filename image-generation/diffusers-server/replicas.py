@@ -0,0 +1,164 @@
+"""Data-parallel replicas: one pipeline per device, requests to the least-loaded one.
+
+Each Replica owns a device string ("cuda:0", "cuda:1", ... or "cpu:N" for a CPU
+stand-in), the pipeline loaded there, its edit pipelines, and its own Scheduler —
+priority classes, per-client fairness and admission stay per GPU. The manager only
+decides *which* GPU: the one whose backlog drains soonest (backlog cost / learned
+throughput, falling back to raw backlog cost until every replica has completed a job).
+
+Deliberately torch-free: the loader is a callback, so the dispatch logic runs on any
+box. `python3 replicas.py` drives two fake CPU devices with a stand-in pipeline.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from scheduler import Scheduler
+
+UTILIZATION_WINDOW_S = 60.0
+
+
+def resolve_devices(spec: str, cuda_count: int) -> list[str]:
+    """DEVICES env -> device list. "cuda" (one replica, today's behaviour), "all"
+    (every visible GPU), or an explicit comma list such as "cuda:0,cuda:2"."""
+    spec = spec.strip() or "cuda"
+    if spec == "all":
+        if cuda_count < 1:
+            raise RuntimeError("DEVICES=all but no CUDA device is visible")
+        return [f"cuda:{i}" for i in range(cuda_count)]
+    return [d.strip() for d in spec.split(",") if d.strip()]
+
+
+class Replica:
+    def __init__(self, index: int, device: str, budget: float):
+        self.index = index
+        self.device = device
+        self.pipe = None
+        self.derived: dict[str, object] = {}  # edit pipelines built over self.pipe
+        self.load_times: dict[str, float] = {}
+        self.bucket_stats: dict[str, dict] = {}
+        self.scheduler = Scheduler(budget)
+        self._lock = threading.Lock()
+        self._busy: deque = deque()  # (start, end) of recent work, for utilization
+        self._busy_since: float | None = None
+
+    @asynccontextmanager
+    async def slot(self, client: str, priority: str, cost: float, gone=None):
+        """This replica's GPU, through its scheduler (see Scheduler.slot)."""
+        async with self.scheduler.slot(client, priority, cost, gone) as ticket:
+            start = time.time()
+            with self._lock:
+                self._busy_since = start
+            try:
+                yield ticket
+            finally:
+                with self._lock:
+                    self._busy_since = None
+                    self._busy.append((start, time.time()))
+
+    def utilization(self, window: float = UTILIZATION_WINDOW_S) -> float:
+        """Fraction of the last `window` seconds this replica spent running a job."""
+        now = time.time()
+        lo = now - window
+        with self._lock:
+            while self._busy and self._busy[0][1] < lo:
+                self._busy.popleft()
+            busy = sum(end - max(start, lo) for start, end in self._busy)
+            if self._busy_since is not None:
+                busy += now - max(self._busy_since, lo)
+        return min(1.0, busy / window)
+
+    def snapshot(self) -> dict:
+        return {
+            "device": self.device,
+            "ready": self.pipe is not None,
+            "utilization": round(self.utilization(), 3),
+            **self.scheduler.snapshot(),
+            "load_s": {k: round(v, 2) for k, v in self.load_times.items()},
+            "buckets": self.bucket_stats,
+        }
+
+
+class ReplicaManager:
+    def __init__(self, devices: list[str], budget: float):
+        if not devices:
+            raise ValueError("at least one device is required")
+        self.replicas = [Replica(i, d, budget) for i, d in enumerate(devices)]
+
+    def load(self, build) -> None:
+        """Call `build(replica)` for every replica in parallel; it must set
+        replica.pipe. The first failure is re-raised."""
+        with ThreadPoolExecutor(max_workers=len(self.replicas)) as pool:
+            list(pool.map(build, self.replicas))
+
+    @property
+    def ready(self) -> bool:
+        return all(r.pipe is not None for r in self.replicas)
+
+    @property
+    def primary(self) -> Replica:
+        return self.replicas[0]
+
+    def pick(self) -> Replica:
+        """Least-loaded replica: soonest-draining backlog, then shortest queue."""
+        loads = [r.scheduler.load() for r in self.replicas]  # locked reads: queues change under us
+        timed = all(rate for _, _, rate in loads)
+        best = min(range(len(loads)), key=lambda i: (
+            loads[i][0] / loads[i][2] if timed else loads[i][0],
+            loads[i][1],
+            i,
+        ))
+        return self.replicas[best]
+
+    def snapshot(self) -> dict:
+        reps = [r.snapshot() for r in self.replicas]
+        waits = [r["estimated_wait_s"] for r in reps if r["estimated_wait_s"] is not None]
+        return {
+            "queue_depth": sum(r["queue_depth"] for r in reps),
+            "backlog_cost": round(sum(r["backlog_cost"] for r in reps), 1),
+            # a new request lands on the least-loaded replica
+            "estimated_wait_s": min(waits) if len(waits) == len(reps) else None,
+            "replicas": reps,
+        }
+
+
+if __name__ == "__main__":
+    # CPU demo: two fake devices, a stand-in "pipeline" that sleeps in proportion
+    # to the job cost, sixteen concurrent mixed-size requests.
+    import asyncio
+    import random
+
+    class _StandIn:
+        def __init__(self, device):
+            self.device = device
+
+        def __call__(self, cost):
+            time.sleep(cost / 100)
+            return self.device
+
+    def _build(rep):
+        time.sleep(0.1)
+        rep.pipe = _StandIn(rep.device)
+
+    mgr = ReplicaManager(["cpu:0", "cpu:1"], budget=1000)
+    mgr.load(_build)
+    served: dict[str, int] = {}
+
+    async def _job(i):
+        await asyncio.sleep(0.02 * i)
+        cost = random.choice([5, 10, 50])
+        rep = mgr.pick()
+        async with rep.slot(f"client{i % 3}", "interactive", cost):
+            dev = await asyncio.to_thread(rep.pipe, cost)  # like the server: only the job takes a thread
+        served[dev] = served.get(dev, 0) + 1
+
+    async def _main():
+        await asyncio.gather(*(_job(i) for i in range(16)))
+
+    asyncio.run(_main())
+    print("served per device:", served)
+    for r in mgr.snapshot()["replicas"]:
+        print(f"  {r['device']}: completed {r['completed']}, utilization {r['utilization']:.2f}, "
+              f"throughput {r['throughput_cost_per_s']} cost/s")
@@ -0,0 +1,141 @@
+"""Content-addressed cache of encoded generation results.
+
+A seeded generation is deterministic for a given model revision, dtype and full
+parameter set, so the encoded images can be served again without touching the GPU.
+Keys are the SHA-256 of the canonical JSON of every input that affects the pixels
+or the bytes (model revision + dtype, prompt, size, steps, guidance, n, seed,
+step-cache threshold, tiled VAE decode or not, output format/compression); values
+are the raw encoded images.
+
+Two tiers, each LRU under its own byte budget:
+  memory  OrderedDict of key -> [bytes, ...]
+  disk    one file per key under RESULT_CACHE_DIR (optional); recency = file mtime,
+          so the LRU order survives restarts. A disk hit is promoted to memory.
+"""
+import hashlib
+import json
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+
+def cache_key(**params) -> str:
+    blob = json.dumps(params, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _pack(blobs: list[bytes]) -> bytes:
+    return struct.pack("<I", len(blobs)) + b"".join(struct.pack("<Q", len(b)) + b for b in blobs)
+
+
+def _unpack(data: bytes) -> list[bytes]:
+    (count,), off, out = struct.unpack_from("<I", data), 4, []
+    for _ in range(count):
+        (size,) = struct.unpack_from("<Q", data, off)
+        off += 8
+        out.append(data[off:off + size])
+        off += size
+    return out
+
+
+class ResultCache:
+    def __init__(self, memory_bytes: int, disk_dir: str = "", disk_bytes: int = 0):
+        self.memory_bytes = memory_bytes
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes if disk_dir else 0
+        self._lock = threading.Lock()
+        self._mem: OrderedDict[str, list[bytes]] = OrderedDict()
+        self._mem_used = 0
+        self._disk: OrderedDict[str, int] = OrderedDict()  # key -> file size, oldest first
+        self._disk_used = 0
+        self.stats = {"hits_memory": 0, "hits_disk": 0, "misses": 0, "stores": 0, "evictions": 0}
+        if self.disk_bytes:
+            os.makedirs(disk_dir, exist_ok=True)
+            entries = []
+            for name in os.listdir(disk_dir):
+                path = os.path.join(disk_dir, name)
+                if name.endswith(".tmp"):
+                    os.unlink(path)  # interrupted write
+                    continue
+                st = os.stat(path)
+                entries.append((st.st_mtime, name, st.st_size))
+            for _, name, size in sorted(entries):
+                self._disk[name] = size
+                self._disk_used += size
+            self._evict_disk()
+
+    @property
+    def enabled(self) -> bool:
+        return self.memory_bytes > 0 or self.disk_bytes > 0
+
+    def get(self, key: str) -> list[bytes] | None:
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                self.stats["hits_memory"] += 1
+                return self._mem[key]
+            if key in self._disk:
+                path = os.path.join(self.disk_dir, key)
+                try:
+                    with open(path, "rb") as f:
+                        blobs = _unpack(f.read())
+                    os.utime(path)
+                except OSError:
+                    self._drop_disk(key)
+                else:
+                    self._disk.move_to_end(key)
+                    self.stats["hits_disk"] += 1
+                    self._put_mem(key, blobs)
+                    return blobs
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, blobs: list[bytes]) -> None:
+        with self._lock:
+            self.stats["stores"] += 1
+            self._put_mem(key, blobs)
+            if self.disk_bytes and key not in self._disk:
+                data = _pack(blobs)
+                if len(data) > self.disk_bytes:
+                    return
+                path = os.path.join(self.disk_dir, key)
+                with open(path + ".tmp", "wb") as f:
+                    f.write(data)
+                os.replace(path + ".tmp", path)
+                self._disk[key] = len(data)
+                self._disk_used += len(data)
+                self._evict_disk()
+
+    def _put_mem(self, key: str, blobs: list[bytes]) -> None:
+        size = sum(len(b) for b in blobs)
+        if key in self._mem or size > self.memory_bytes:
+            return
+        self._mem[key] = blobs
+        self._mem_used += size
+        while self._mem_used > self.memory_bytes:
+            _, old = self._mem.popitem(last=False)
+            self._mem_used -= sum(len(b) for b in old)
+            self.stats["evictions"] += 1
+
+    def _drop_disk(self, key: str) -> None:
+        self._disk_used -= self._disk.pop(key)
+        try:
+            os.unlink(os.path.join(self.disk_dir, key))
+        except OSError:
+            pass
+
+    def _evict_disk(self) -> None:
+        while self._disk_used > self.disk_bytes:
+            self._drop_disk(next(iter(self._disk)))
+            self.stats["evictions"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "memory_entries": len(self._mem),
+                "memory_bytes": self._mem_used,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_used,
+            }
@@ -0,0 +1,187 @@
+"""GPU request scheduler: priority classes, per-client fair queuing, admission control.
+
+One pipeline owns the GPU, so requests run one at a time. Without a scheduler the
+order is whatever uvicorn's threadpool happens to pick, and one n=8 50-step job can
+hold up a queue of quick previews. Here every request becomes a ticket:
+
+  - cost      megapixels x steps x n — the unit of GPU work everything is budgeted in
+  - priority  "interactive" tickets always dispatch before "batch" ones
+  - client    within a priority class, start-time fair queuing across clients: each
+              client's next ticket is tagged max(virtual now, its last finish) and the
+              smallest tag wins, so a client queuing ten jobs can't starve one that
+              queued a single job
+
+Admission: a ticket whose cost would push the backlog (queued + running) past the
+budget is rejected with `Overloaded` (-> HTTP 429 + Retry-After). A single job larger
+than the budget is still admitted when the queue is empty. Throughput (cost units/s)
+is learned from completed jobs and turns the backlog into an estimated wait.
+
+Waiting happens on the event loop: a queued ticket is an asyncio future, not a
+blocked thread, so a long queue cannot use up the threadpool that the job itself
+and the other endpoints run on. A ticket whose client goes away while queued
+is withdrawn.
+"""
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+PRIORITIES = ("interactive", "batch")
+
+
+class Overloaded(Exception):
+    def __init__(self, wait_s: float | None):
+        super().__init__("server busy")
+        self.wait_s = wait_s
+
+
+class ClientGone(Exception):
+    """The client disconnected while its ticket was queued."""
+
+
+class _Ticket:
+    __slots__ = ("client", "priority", "cost", "seq", "enqueued", "wake")
+
+    def __init__(self, client: str, priority: str, cost: float, seq: int, wake):
+        self.client, self.priority, self.cost, self.seq = client, priority, cost, seq
+        self.enqueued = time.time()
+        self.wake = wake  # called (under the lock) when the ticket is dispatched
+
+
+class Scheduler:
+    def __init__(self, budget: float):
+        self.budget = budget
+        self._lock = threading.RLock()
+        self._waiting: dict[str, dict[str, deque]] = {p: {} for p in PRIORITIES}
+        self._finish: dict[str, float] = {}  # client -> virtual finish of its last ticket
+        self._vnow = 0.0
+        self._seq = itertools.count()
+        self._running: _Ticket | None = None
+        self._backlog = 0.0
+        self.rate: float | None = None  # cost units / s, EMA over completed jobs
+        self.completed = 0
+
+    @property
+    def backlog(self) -> float:
+        """Cost queued + running."""
+        with self._lock:
+            return self._backlog
+
+    @property
+    def queue_depth(self) -> int:
+        with self._lock:
+            return sum(len(q) for qs in self._waiting.values() for q in qs.values())
+
+    def load(self) -> tuple[float, int, float | None]:
+        """(backlog, queue depth, rate) read together, for dispatch across replicas."""
+        with self._lock:
+            return self._backlog, self.queue_depth, self.rate
+
+    @staticmethod
+    def cost(width: int, height: int, steps: int, n: int) -> float:
+        return width * height / 1e6 * steps * n
+
+    @asynccontextmanager
+    async def slot(self, client: str, priority: str, cost: float, gone=None, poll: float = 1.0):
+        """Wait until this request owns the GPU; raises Overloaded if not admitted.
+        `gone` is an async callable polled every `poll` seconds while queued; when it
+        returns true the ticket is withdrawn and ClientGone raised."""
+        loop = asyncio.get_running_loop()
+        started = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: started.done() or started.set_result(None))
+
+        ticket = self._admit(client, priority, cost, wake)
+        try:
+            while not started.done():
+                await asyncio.wait({started}, timeout=poll)
+                if not started.done() and gone is not None and await gone():
+                    raise ClientGone()
+        except BaseException:
+            self._withdraw(ticket)
+            raise
+        t0 = time.time()
+        try:
+            yield ticket
+        finally:
+            self._release(ticket, time.time() - t0)
+
+    def _admit(self, client: str, priority: str, cost: float, wake) -> _Ticket:
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority must be one of {PRIORITIES}")
+        with self._lock:
+            if self._backlog > 0 and self._backlog + cost > self.budget:
+                raise Overloaded(self._wait_for(self._backlog))
+            ticket = _Ticket(client, priority, cost, next(self._seq), wake)
+            self._waiting[priority].setdefault(client, deque()).append(ticket)
+            self._backlog += cost
+            self._dispatch()
+            return ticket
+
+    def _withdraw(self, ticket: _Ticket) -> None:
+        """Drop a ticket that will not run: out of its queue, or off the GPU if it was
+        dispatched in the meantime (without counting it as completed)."""
+        with self._lock:
+            if self._running is ticket:
+                self._release(ticket, None)
+                return
+            queues = self._waiting[ticket.priority]
+            queues[ticket.client].remove(ticket)
+            if not queues[ticket.client]:
+                del queues[ticket.client]
+            self._backlog -= ticket.cost
+
+    def _dispatch(self) -> None:
+        if self._running is not None:
+            return
+        for p in PRIORITIES:
+            queues = self._waiting[p]
+            if not queues:
+                continue
+            client = min(queues, key=lambda c: (max(self._vnow, self._finish.get(c, 0.0)), queues[c][0].seq))
+            ticket = queues[client].popleft()
+            if not queues[client]:
+                del queues[client]
+            start = max(self._vnow, self._finish.get(client, 0.0))
+            self._finish[client] = start + ticket.cost
+            if start > self._vnow:
+                # a finish at or behind virtual time counts the same as none, so drop it
+                self._vnow = start
+                for c in [c for c, f in self._finish.items() if f <= start]:
+                    del self._finish[c]
+            self._running = ticket
+            ticket.wake()
+            return
+
+    def _release(self, ticket: _Ticket, dt: float | None) -> None:
+        """Free the GPU after `ticket` ran for `dt` seconds (None: it never ran)."""
+        with self._lock:
+            self._running = None
+            self._backlog -= ticket.cost
+            if dt:
+                r = ticket.cost / dt
+                self.rate = r if self.rate is None else 0.8 * self.rate + 0.2 * r
+            if dt is not None:
+                self.completed += 1
+            self._dispatch()
+
+    def _wait_for(self, backlog: float) -> float | None:
+        return backlog / self.rate if self.rate else None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            depth = {p: sum(len(q) for q in self._waiting[p].values()) for p in PRIORITIES}
+            wait = self._wait_for(self._backlog)
+            return {
+                "queue_depth": sum(depth.values()),
+                "queue_by_priority": depth,
+                "running": self._running is not None,
+                "backlog_cost": round(self._backlog, 1),
+                "budget": self.budget,
+                "estimated_wait_s": round(wait, 1) if wait is not None else None,
+                "throughput_cost_per_s": round(self.rate, 2) if self.rate else None,
+                "completed": self.completed,
+            }
@@ -21,23 +21,64 @@ Env config:
   DEVICE_MAP          accelerate device_map (e.g. "cuda") — streams weights [unset]
                       straight to GPU, avoiding full CPU-RAM materialization
                       (required for big models on low-RAM hosts). When set,
-                      .to("cuda") is skipped.
+                      .to(device) is skipped; each replica maps to its own device.
   ENABLE_CPU_OFFLOAD  "1" to enable model CPU offload (low-VRAM)            [0]
   ATTENTION_BACKEND   optional transformer attention backend (e.g. flash)  [unset]
   TRUST_REMOTE_CODE   "1" to pass trust_remote_code=True to from_pretrained [0]
+  PREBAKED_DIR        dir written by prebake.py; when it holds this MODEL_ID [unset]
+                      + revision + PIPELINE_CLASS + TORCH_DTYPE, components are memory-mapped
+                      straight onto the GPU in parallel instead of from_pretrained
+  RESULT_CACHE_MB     in-memory LRU budget for seeded results (0 = off)     [512]
+  RESULT_CACHE_DIR    optional on-disk tier for the result cache            [unset]
+  RESULT_CACHE_DISK_MB  byte budget of the disk tier                        [4096]
+  MODEL_REVISION      revision baked into result-cache keys                 [HF snapshot]
+  VAE_DECODE_BYTES_PER_PIXEL  predicted VAE-decode activation memory per      [4096]
+                      output pixel; drives per-request auto slicing/tiling
+  VAE_HEADROOM_GB     VRAM kept free when planning the decode               [2]
+  ENCODE_WORKERS      threads for PNG/JPEG/WebP + base64 encoding; encoding [4]
+                      runs outside the GPU slot so it overlaps the next request
+  DEFAULT_STRENGTH    img2img/inpaint strength when caller omits it         [0.6]
+  IMG2IMG_CLASS       diffusers class for /v1/images/edits (built with       [AutoPipeline]
+  INPAINT_CLASS       from_pipe over the loaded components); unset = the
+                      AutoPipelineForImage2Image / ...ForInpainting mapping
+  QUEUE_BUDGET        admission budget in megapixel-steps (W*H/1e6*steps*n) [2000]
+                      queued + running; beyond it requests get 429
+  SIZE_BUCKETS        comma list of WxH (e.g. 1024x1024,1024x1536); when set [unset]
+                      every request snaps to the closest bucket (aspect
+                      first, then area) and each bucket is warmed at startup
+  WARMUP_STEPS        steps per warm-up call                                [2]
+  COMPILE             "1" to torch.compile the transformer + VAE decoder    [0]
+                      (graphs are traced per bucket during warm-up)
+  DEVICES             "cuda" (one replica), "all" (one pipeline per visible [cuda]
+                      GPU) or a list like "cuda:0,cuda:1"; requests go to the
+                      least-loaded replica, each with its own queue
   PORT                listen port                                           [8000]
 """
+import asyncio
 import base64
 import io
+import math
 import os
+import threading
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from importlib import import_module
 from typing import Optional
 
 import torch
 import uvicorn
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response
+from PIL import Image
+from pydantic import BaseModel, ValidationError
+
+import prebake
+from replicas import Replica, ReplicaManager, resolve_devices
+from resultcache import ResultCache, cache_key
+from scheduler import PRIORITIES, ClientGone, Overloaded, Scheduler
 
 MODEL_ID = os.environ["MODEL_ID"]
 PIPELINE_CLASS = os.environ["PIPELINE_CLASS"]
@@ -57,17 +98,147 @@ DEVICE_MAP = os.environ.get("DEVICE_MAP", "").strip()
 ENABLE_CPU_OFFLOAD = os.environ.get("ENABLE_CPU_OFFLOAD", "0") == "1"
 ATTENTION_BACKEND = os.environ.get("ATTENTION_BACKEND", "").strip()
 TRUST_REMOTE_CODE = os.environ.get("TRUST_REMOTE_CODE", "0") == "1"
+PREBAKED_DIR = os.environ.get("PREBAKED_DIR", "").strip()
+DEFAULT_STRENGTH = float(os.environ.get("DEFAULT_STRENGTH", "0.6"))
+IMG2IMG_CLASS = os.environ.get("IMG2IMG_CLASS", "").strip()
+INPAINT_CLASS = os.environ.get("INPAINT_CLASS", "").strip()
+QUEUE_BUDGET = float(os.environ.get("QUEUE_BUDGET", "2000"))
+RESULT_CACHE_MB = int(os.environ.get("RESULT_CACHE_MB", "512"))
+RESULT_CACHE_DIR = os.environ.get("RESULT_CACHE_DIR", "").strip()
+RESULT_CACHE_DISK_MB = int(os.environ.get("RESULT_CACHE_DISK_MB", "4096"))
+SIZE_BUCKETS = [
+    tuple(int(v) for v in b.lower().split("x"))
+    for b in os.environ.get("SIZE_BUCKETS", "").split(",") if b.strip()
+]
+WARMUP_STEPS = int(os.environ.get("WARMUP_STEPS", "2"))
+COMPILE = os.environ.get("COMPILE", "0") == "1"
+VAE_DECODE_BPP = int(os.environ.get("VAE_DECODE_BYTES_PER_PIXEL", "4096"))
+VAE_HEADROOM = float(os.environ.get("VAE_HEADROOM_GB", "2")) * 1024**3
+DEVICES = resolve_devices(os.environ.get("DEVICES", "cuda"), torch.cuda.device_count())
+ENCODE_WORKERS = int(os.environ.get("ENCODE_WORKERS", "4"))
 PORT = int(os.environ.get("PORT", "8000"))
 
-pipe = None  # populated on startup
+
+# commit hash of the cached HF snapshot, so cache keys and prebakes change with the weights
+MODEL_REVISION = prebake.resolve_revision(MODEL_ID)
+
+OUTPUT_FORMATS = {"png": "PNG", "jpeg": "JPEG", "webp": "WEBP"}
+VAE_MODES = ("auto", "full", "sliced", "tiled")
+
+result_cache = ResultCache(RESULT_CACHE_MB * 1024**2, RESULT_CACHE_DIR, RESULT_CACHE_DISK_MB * 1024**2)
 
 
 def _parse_size(size: str) -> tuple[int, int]:
     try:
         w, h = (int(x) for x in size.lower().split("x"))
-        return w, h
     except Exception:
         raise HTTPException(400, f"invalid size {size!r}, expected e.g. '1024x1024'")
+    if w <= 0 or h <= 0:
+        raise HTTPException(400, f"invalid size {size!r}, width and height must be positive")
+    return w, h
+
+
+def _snap(w: int, h: int) -> tuple[int, int]:
+    """Closest configured bucket: same aspect ratio first, then closest area. Every
+    bucket shape is already warm (and compiled with COMPILE=1), so snapping trades a
+    few pixels of requested size for never paying kernel selection / a recompile."""
+    if not SIZE_BUCKETS:
+        return w, h
+    return min(SIZE_BUCKETS, key=lambda b: (round(abs(math.log(b[0] / b[1] * h / w)), 3), abs(b[0] * b[1] - w * h)))
+
+
+# One pipeline per device: each replica serializes its calls with its own scheduler
+# (priority, per-client fairness, admission), and everything after the denoise
+# (image encoding, base64, response assembly) runs outside it on the encoder pool,
+# so request k+1 is already on the GPU while k is encoding.
+replicas = ReplicaManager(DEVICES, QUEUE_BUDGET)
+_encoder = ThreadPoolExecutor(max_workers=ENCODE_WORKERS, thread_name_prefix="encode")
+
+
+def _encode(img, fmt: str, compression: int) -> bytes:
+    buf = io.BytesIO()
+    if fmt == "png":
+        img.save(buf, format="PNG")  # lossless — output_compression does not apply
+    else:
+        img.convert("RGB").save(buf, format=OUTPUT_FORMATS[fmt], quality=compression)
+    return buf.getvalue()
+
+
+def _multipart(blobs: list[bytes], fmt: str) -> Response:
+    """multipart/mixed body, one raw image per part — no base64 inflation."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for i, blob in enumerate(blobs):
+        head = (f"--{boundary}\r\nContent-Type: image/{fmt}\r\n"
+                f'Content-Disposition: attachment; filename="{i}.{fmt}"\r\n\r\n')
+        parts += [head.encode("ascii"), blob, b"\r\n"]
+    parts.append(f"--{boundary}--\r\n".encode("ascii"))
+    return Response(b"".join(parts), media_type=f"multipart/mixed; boundary={boundary}")
+
+
+def _vae_plan(rep: Replica, w: int, h: int, n: int) -> str:
+    """Pick the cheapest VAE decode that fits. The decode at the end of the pipeline
+    is the peak-memory point for big batches: predicted need is n x W x H x
+    VAE_DECODE_BYTES_PER_PIXEL against what torch can still get (free + cached).
+    One image at a time (slicing) if the batch doesn't fit, tiles as well if even a
+    single image doesn't."""
+    if not rep.device.startswith("cuda"):
+        return "full"
+    free, _ = torch.cuda.mem_get_info(rep.device)
+    cached = torch.cuda.memory_reserved(rep.device) - torch.cuda.memory_allocated(rep.device)
+    avail = free + cached - VAE_HEADROOM
+    per_image = w * h * VAE_DECODE_BPP
+    if n * per_image <= avail:
+        return "full"
+    if per_image <= avail or not hasattr(rep.pipe.vae, "enable_tiling"):
+        return "sliced"
+    return "tiled"
+
+
+def _set_vae(rep: Replica, mode: str) -> None:
+    vae = rep.pipe.vae
+    if hasattr(vae, "enable_slicing"):
+        (vae.disable_slicing if mode == "full" else vae.enable_slicing)()
+    if hasattr(vae, "enable_tiling"):
+        (vae.enable_tiling if mode == "tiled" else vae.disable_tiling)()
+
+
+def _denoise(rep: Replica, target, call_kwargs: dict, cache_threshold: Optional[float] = None,
+             vae_mode: str = "full"):
+    """Run `target` (rep's pipeline or one derived from it); the caller holds rep's slot. Returns (images, seconds,
+    peak VRAM bytes). With `cache_threshold`, diffusers' first-block cache (FBCache)
+    is attached for this call only: each step runs the first transformer block and,
+    if its residual moved less than the threshold (relative L1) since the previous
+    step, reuses the cached output of the rest."""
+    _set_vae(rep, vae_mode)
+    if cache_threshold:
+        from diffusers.hooks import FirstBlockCacheConfig
+        rep.pipe.transformer.enable_cache(FirstBlockCacheConfig(threshold=cache_threshold))
+    cuda = rep.device.startswith("cuda")
+    if cuda:
+        torch.cuda.reset_peak_memory_stats(rep.device)
+    try:
+        t0 = time.time()
+        images = target(**call_kwargs).images
+        return images, time.time() - t0, torch.cuda.max_memory_allocated(rep.device) if cuda else 0
+    finally:
+        if cache_threshold:
+            rep.pipe.transformer.disable_cache()
+
+
+def _ssim(a, b) -> float:
+    """Mean SSIM of two PIL images on luma, 7x7 uniform window (skimage defaults)."""
+    def lum(img):
+        t = torch.frombuffer(bytearray(img.convert("L").tobytes()), dtype=torch.uint8)
+        return t.view(1, 1, img.height, img.width).float() / 255.0
+
+    x, y = lum(a), lum(b)
+    pool = lambda t: torch.nn.functional.avg_pool2d(t, 7, stride=1)  # noqa: E731
+    mx, my = pool(x), pool(y)
+    vx, vy, cxy = pool(x * x) - mx * mx, pool(y * y) - my * my, pool(x * y) - mx * my
+    c1, c2 = 0.01**2, 0.03**2
+    s = ((2 * mx * my + c1) * (2 * cxy + c2)) / ((mx * mx + my * my + c1) * (vx + vy + c2))
+    return float(s.mean())
 
 
 app = FastAPI(title="diffusers-openai-image-server")
@@ -75,28 +246,89 @@ app = FastAPI(title="diffusers-openai-image-server")
 
 @app.on_event("startup")
 def _load():
-    global pipe
-    cls = getattr(import_module("diffusers"), PIPELINE_CLASS)
-    print(f"[server] loading {MODEL_ID} as {PIPELINE_CLASS} ({TORCH_DTYPE}) ...", flush=True)
     t0 = time.time()
-    kwargs = {"torch_dtype": TORCH_DTYPE, "low_cpu_mem_usage": LOW_CPU_MEM_USAGE}
-    if TRUST_REMOTE_CODE:
-        kwargs["trust_remote_code"] = True
-    if DEVICE_MAP:
-        # stream weights straight to the GPU; peak CPU RAM ≈ one shard
-        kwargs["device_map"] = DEVICE_MAP
-    pipe = cls.from_pretrained(MODEL_ID, **kwargs)
-    if ENABLE_CPU_OFFLOAD:
-        pipe.enable_model_cpu_offload()
-    elif not DEVICE_MAP:
-        pipe.to("cuda")
+    replicas.load(_build)
+    for rep in replicas.replicas:
+        for name, dt in sorted(rep.load_times.items(), key=lambda kv: -kv[1]):
+            print(f"[server]   {rep.device:<8} {name:<16} {dt:6.1f}s", flush=True)
+    print(f"[server] ready in {time.time() - t0:.1f}s — serving '{SERVED_MODEL_NAME}' "
+          f"on {', '.join(DEVICES)}", flush=True)
+
+
+def _build(rep: Replica):
+    """Load, configure and warm one replica's pipeline on rep.device."""
+    t0 = time.time()
+    if prebake.is_prebaked(PREBAKED_DIR, MODEL_ID, TORCH_DTYPE, MODEL_REVISION, PIPELINE_CLASS):
+        print(f"[server] {rep.device}: loading prebaked {MODEL_ID} from {PREBAKED_DIR} ({TORCH_DTYPE}) ...", flush=True)
+        # offload wants the weights on the host first; otherwise map straight to the GPU
+        pipe, rep.load_times = prebake.load(PREBAKED_DIR, device="cpu" if ENABLE_CPU_OFFLOAD else rep.device)
+        if ENABLE_CPU_OFFLOAD:
+            pipe.enable_model_cpu_offload(device=rep.device)
+    else:
+        if PREBAKED_DIR:
+            found = prebake.read_manifest(PREBAKED_DIR) or {}
+            print(f"[server] WARN {PREBAKED_DIR} has no prebake of {MODEL_ID}@{MODEL_REVISION} as {PIPELINE_CLASS} "
+                  f"({TORCH_DTYPE}) — it holds {found.get('model_id')}@{found.get('revision')} as "
+                  f"{found.get('pipeline_class')} ({found.get('dtype')}); run prebake.py; falling back to "
+                  "from_pretrained", flush=True)
+        cls = getattr(import_module("diffusers"), PIPELINE_CLASS)
+        print(f"[server] {rep.device}: loading {MODEL_ID} as {PIPELINE_CLASS} ({TORCH_DTYPE}) ...", flush=True)
+        kwargs = {"torch_dtype": TORCH_DTYPE, "low_cpu_mem_usage": LOW_CPU_MEM_USAGE}
+        if TRUST_REMOTE_CODE:
+            kwargs["trust_remote_code"] = True
+        if DEVICE_MAP:
+            # stream weights straight to the GPU; peak CPU RAM ≈ one shard
+            kwargs["device_map"] = DEVICE_MAP if len(DEVICES) == 1 else rep.device
+        pipe = cls.from_pretrained(MODEL_ID, **kwargs)
+        rep.load_times = {"from_pretrained": time.time() - t0}
+        t1 = time.time()
+        if ENABLE_CPU_OFFLOAD:
+            pipe.enable_model_cpu_offload(device=rep.device)
+        elif not DEVICE_MAP:
+            pipe.to(rep.device)
+        rep.load_times["to_device"] = time.time() - t1
     if ATTENTION_BACKEND:
         try:
             pipe.transformer.set_attention_backend(ATTENTION_BACKEND)
             print(f"[server] attention backend: {ATTENTION_BACKEND}", flush=True)
         except Exception as e:  # non-fatal: fall back to default attention
             print(f"[server] WARN could not set attention backend: {e}", flush=True)
-    print(f"[server] ready in {time.time() - t0:.1f}s — serving '{SERVED_MODEL_NAME}'", flush=True)
+    if COMPILE:
+        t1 = time.time()
+        torch._dynamo.config.cache_size_limit = max(torch._dynamo.config.cache_size_limit, 4 * len(SIZE_BUCKETS))
+        pipe.transformer.compile()  # in place: from_pipe / cache hooks keep the same module
+        if hasattr(pipe.vae, "decoder"):
+            pipe.vae.decoder.compile()
+        rep.load_times["compile"] = time.time() - t1
+    if SIZE_BUCKETS:
+        t1 = time.time()
+        _warm_buckets(rep, pipe)
+        rep.load_times["warmup"] = time.time() - t1
+    rep.pipe = pipe  # published last: the replica only counts as ready once warm
+
+
+def _warm_buckets(rep: Replica, pipe):
+    """Run every bucket twice at the default guidance (CFG changes the batch shape):
+    the first call pays compilation / kernel autotuning, the second is the warm
+    latency requests will see."""
+    for w, h in SIZE_BUCKETS:
+        kwargs = {"prompt": "warm-up", "height": h, "width": w,
+                  "num_inference_steps": WARMUP_STEPS, GUIDANCE_PARAM: DEFAULT_GUIDANCE}
+        if DEFAULT_NEG_PROMPT:
+            kwargs["negative_prompt"] = DEFAULT_NEG_PROMPT
+        t0 = time.time()
+        pipe(**kwargs)
+        cold = time.time() - t0
+        t0 = time.time()
+        pipe(**kwargs)
+        warm = time.time() - t0
+        rep.bucket_stats[f"{w}x{h}"] = {
+            "cold_s": round(cold, 2),
+            "warm_s": round(warm, 2),
+            "warm_step_ms": round(warm / WARMUP_STEPS * 1000, 1),
+        }
+        print(f"[server] {rep.device} bucket {w}x{h}: cold {cold:.1f}s, warm {warm:.2f}s "
+              f"({warm / WARMUP_STEPS * 1000:.0f} ms/step)", flush=True)
 
 
 class ImageRequest(BaseModel):
@@ -104,26 +336,73 @@ class ImageRequest(BaseModel):
     model: Optional[str] = None
     n: int = 1
     size: Optional[str] = None
-    response_format: str = "b64_json"  # only b64_json is supported (no object storage)
+    response_format: str = "b64_json"  # b64_json, or "binary" (raw bytes / multipart); no URLs
+    output_format: str = "png"  # png | jpeg | webp
+    output_compression: int = 100  # jpeg/webp quality 0-100
     # non-OpenAI extras (accepted as plain body fields):
     negative_prompt: Optional[str] = None
     num_inference_steps: Optional[int] = None
     guidance_scale: Optional[float] = None
     seed: Optional[int] = None
+    cache_threshold: Optional[float] = None  # FBCache step reuse, e.g. 0.05–0.2; off when unset/0
+    cache_compare: bool = False  # also run uncached (same seed) and report speedup + SSIM
+    vae_decode: str = "auto"  # auto | full | sliced | tiled — auto plans from free VRAM
+    priority: str = "interactive"  # interactive | batch — interactive always dispatches first
+    user: Optional[str] = None  # OpenAI's end-user id; fair-queuing key (falls back to client IP)
+
+
+class EditRequest(ImageRequest):
+    strength: Optional[float] = None  # img2img / inpaint denoising strength
 
 
 @app.get("/health")
-def health():
-    return {"status": "ok" if pipe is not None else "loading", "model": SERVED_MODEL_NAME}
+async def health():
+    snap = replicas.snapshot()
+    for r, rep in zip(snap["replicas"], replicas.replicas):
+        if rep.device.startswith("cuda"):
+            r["memory_allocated_gb"] = round(torch.cuda.memory_allocated(rep.device) / 1024**3, 2)
+    return {
+        "status": "ok" if replicas.ready else "loading",
+        "model": SERVED_MODEL_NAME,
+        **snap,
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition: result-cache counters and per-device queue gauges."""
+    c = result_cache.snapshot()
+    lines = [
+        "# TYPE image_result_cache_hits_total counter",
+        f'image_result_cache_hits_total{{tier="memory"}} {c["hits_memory"]}',
+        f'image_result_cache_hits_total{{tier="disk"}} {c["hits_disk"]}',
+        "# TYPE image_result_cache_misses_total counter",
+        f"image_result_cache_misses_total {c['misses']}",
+        "# TYPE image_result_cache_evictions_total counter",
+        f"image_result_cache_evictions_total {c['evictions']}",
+        "# TYPE image_result_cache_bytes gauge",
+        f'image_result_cache_bytes{{tier="memory"}} {c["memory_bytes"]}',
+        f'image_result_cache_bytes{{tier="disk"}} {c["disk_bytes"]}',
+    ]
+    reps = replicas.snapshot()["replicas"]
+    for name, kind, field in [
+        ("image_queue_depth", "gauge", "queue_depth"),
+        ("image_queue_backlog_cost", "gauge", "backlog_cost"),
+        ("image_device_utilization", "gauge", "utilization"),
+        ("image_requests_completed_total", "counter", "completed"),
+    ]:
+        lines.append(f"# TYPE {name} {kind}")
+        lines += [f'{name}{{device="{r["device"]}"}} {r[field]}' for r in reps]
+    return Response("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
 
 
 @app.get("/v1/models")
-def models():
+async def models():
     return {"object": "list", "data": [{"id": SERVED_MODEL_NAME, "object": "model", "owned_by": "local"}]}
 
 
 @app.get("/v1/config")
-def config():
+async def config():
     """Per-model generation defaults, so UIs can adapt sliders to the model."""
     return {
         "model": SERVED_MODEL_NAME,
@@ -131,19 +410,134 @@ def config():
         "default_guidance": DEFAULT_GUIDANCE,
         "guidance_param": GUIDANCE_PARAM,
         "default_size": DEFAULT_SIZE,
+        "step_cache": replicas.ready and hasattr(replicas.primary.pipe.transformer, "enable_cache"),
+        "sizes": [f"{w}x{h}" for w, h in SIZE_BUCKETS],  # empty = any WxH
     }
 
 
-@app.post("/v1/images/generations")
-def generate(req: ImageRequest):
-    if pipe is None:
+def _check(req: ImageRequest) -> str:
+    """Validate the request fields shared by generations and edits; returns output_format."""
+    if not replicas.ready:
         raise HTTPException(503, "model still loading")
-    if req.response_format != "b64_json":
-        raise HTTPException(400, "only response_format='b64_json' is supported")
-    w, h = _parse_size(req.size or DEFAULT_SIZE)
-    steps = req.num_inference_steps if req.num_inference_steps is not None else DEFAULT_STEPS
-    guidance = req.guidance_scale if req.guidance_scale is not None else DEFAULT_GUIDANCE
+    if req.response_format not in ("b64_json", "binary"):
+        raise HTTPException(400, "response_format must be 'b64_json' or 'binary'")
+    fmt = req.output_format.lower()
+    if fmt not in OUTPUT_FORMATS:
+        raise HTTPException(400, f"output_format must be one of {sorted(OUTPUT_FORMATS)}")
+    if not 0 <= req.output_compression <= 100:
+        raise HTTPException(400, "output_compression must be in 0..100")
+    if req.priority not in PRIORITIES:
+        raise HTTPException(400, f"priority must be one of {list(PRIORITIES)}")
+    if req.vae_decode not in VAE_MODES:
+        raise HTTPException(400, f"vae_decode must be one of {list(VAE_MODES)}")
+    if req.cache_threshold is not None and req.cache_threshold < 0:
+        raise HTTPException(400, "cache_threshold must be >= 0")
+    transformer = replicas.primary.pipe.transformer
+    if req.cache_threshold and not hasattr(transformer, "enable_cache"):
+        raise HTTPException(400, f"{type(transformer).__name__} does not support step caching")
+    return fmt
+
+
+def _run(rep: Replica, target, req: ImageRequest, call_kwargs: dict, compare: bool, seed: Optional[int]):
+    """The GPU part of a request, in a worker thread while the caller holds rep's slot:
+    plan the VAE decode, denoise, and with `compare` denoise again without the step
+    cache. Returns (images, seconds, peak VRAM bytes, vae mode, reference, reference seconds)."""
+    vae_mode = req.vae_decode
+    if vae_mode == "auto":
+        prompts = call_kwargs["prompt"]
+        n = call_kwargs["num_images_per_prompt"] * (len(prompts) if isinstance(prompts, list) else 1)
+        vae_mode = _vae_plan(rep, call_kwargs["width"], call_kwargs["height"], n)
+    images, dt, peak = _denoise(rep, target, call_kwargs, req.cache_threshold, vae_mode)
+    reference, ref_dt = None, None
+    if compare:
+        call_kwargs["generator"] = torch.Generator(rep.device).manual_seed(seed)
+        reference, ref_dt, _ = _denoise(rep, target, call_kwargs, vae_mode=vae_mode)
+    return images, dt, peak, vae_mode, reference, ref_dt
+
+
+def _result_key(params: dict, vae_mode: str) -> str:
+    """Result-cache key of `params` decoded with `vae_mode`. Slicing only splits the batch,
+    so full and sliced give the same pixels and share a key; tiling gets its own."""
+    return cache_key(**params, vae_decode="tiled" if vae_mode == "tiled" else "full")
+
+
+async def _serve(kind: str, req: ImageRequest, call_kwargs: dict, request: Request, cost: float,
+                 label: str, extra: Optional[dict] = None, cache_params: Optional[dict] = None):
+    """Pick the least-loaded replica, schedule its `kind` pipeline ("text2img",
+    "img2img", "inpaint") on it, encode the images and build the OpenAI-shaped (or
+    binary) response. `cost` is in scheduler units, `label` goes to the log, `extra`
+    is merged into the JSON body, and with `cache_params` the encoded images are stored
+    in the result cache under those params plus the VAE decode actually used (`_result_key`). Queued
+    requests wait on the event loop; only the pipeline call and the encoding take threads."""
+    fmt = req.output_format.lower()
+    seed = req.seed
+    compare = bool(req.cache_threshold and req.cache_compare)
+    if compare and seed is None:
+        seed = int(torch.randint(0, 2**31 - 1, ()).item())  # comparison needs a shared seed
+    rep = replicas.pick()
+    target = rep.pipe if kind == "text2img" else await run_in_threadpool(_derived_pipe, rep, kind)
+    if seed is not None:
+        # the generator must live on the replica's device
+        call_kwargs["generator"] = torch.Generator(rep.device).manual_seed(seed)
+
+    client = req.user or (request.client.host if request.client else "anonymous")
+    t0 = time.time()
+    try:
+        async with rep.slot(client, req.priority, cost * (2 if compare else 1), request.is_disconnected):
+            queued = time.time() - t0
+            images, dt, peak, vae_mode, reference, ref_dt = await run_in_threadpool(
+                _run, rep, target, req, call_kwargs, compare, seed)
+    except Overloaded as e:
+        headers = {"Retry-After": str(int(e.wait_s) + 1)} if e.wait_s is not None else None
+        raise HTTPException(429, f"queue full (budget {QUEUE_BUDGET:g} Mpx-steps)", headers=headers)
+    except ClientGone:
+        print(f"[server] {label} [{rep.device} {req.priority}/{client}] client left after "
+              f"{time.time() - t0:.1f}s in the queue", flush=True)
+        raise HTTPException(499, "client closed request")
+    step_cache = None
+    if req.cache_threshold:
+        step_cache = {"threshold": req.cache_threshold, "seconds": round(dt, 3)}
+        if compare:
+            ssim = [round(_ssim(a, b), 4) for a, b in zip(images, reference)]
+            step_cache.update(seed=seed, uncached_seconds=round(ref_dt, 3),
+                              speedup=round(ref_dt / dt, 2), ssim=ssim)
+        print(f"[server] step cache {step_cache}", flush=True)
+
+    t1 = time.time()
+    loop = asyncio.get_running_loop()
+    blobs = list(await asyncio.gather(*(loop.run_in_executor(_encoder, _encode, img, fmt, req.output_compression)
+                                        for img in images)))
+    enc_dt = time.time() - t1
+    if cache_params is not None:
+        await run_in_threadpool(result_cache.put, _result_key(cache_params, vae_mode), blobs)
+    peak_gb = round(peak / 1024**3, 2)
+    print(f"[server] {label} [{rep.device} {req.priority}/{client}] queued {queued:.1f}s -> {dt:.1f}s "
+          f"(+{enc_dt:.2f}s {fmt}) vae={vae_mode} peak {peak_gb:.1f} GB", flush=True)
+    headers = {"X-Inference-Seconds": f"{dt:.3f}", "X-Queue-Seconds": f"{queued:.3f}",
+               "X-Peak-VRAM-GB": str(peak_gb), "X-VAE-Decode": vae_mode, "X-Device": rep.device}
+    if step_cache and "speedup" in step_cache:
+        headers["X-Step-Cache-Speedup"] = str(step_cache["speedup"])
+        headers["X-Step-Cache-SSIM"] = ",".join(map(str, step_cache["ssim"]))
+    body = {**(extra or {}), "peak_vram_gb": peak_gb, "vae_decode": vae_mode, "device": rep.device}
+    if step_cache:
+        body["step_cache"] = step_cache
+    return _respond(req, blobs, int(t0), headers, body)
+
+
+def _respond(req: ImageRequest, blobs: list[bytes], created: int, headers: dict, extra: dict):
+    """Encoded images -> OpenAI JSON (base64) or, for response_format=binary, the raw
+    image / multipart body with the metadata moved into headers."""
+    fmt = req.output_format.lower()
+    if req.response_format == "binary":
+        resp = Response(blobs[0], media_type=f"image/{fmt}") if len(blobs) == 1 else _multipart(blobs, fmt)
+        resp.headers["X-Created"] = str(created)
+        resp.headers.update(headers)
+        return resp
+    data = [{"b64_json": base64.b64encode(b).decode("ascii")} for b in blobs]
+    return {"created": created, "output_format": fmt, "data": data, **extra}
 
+
+def _base_kwargs(req: ImageRequest, w: int, h: int, steps: int, guidance: float) -> dict:
     call_kwargs = {
         "prompt": req.prompt,
         "height": h,
@@ -155,20 +549,134 @@ def generate(req: ImageRequest):
     neg = req.negative_prompt if req.negative_prompt is not None else DEFAULT_NEG_PROMPT
     if neg:
         call_kwargs["negative_prompt"] = neg
-    if req.seed is not None:
-        call_kwargs["generator"] = torch.Generator("cuda").manual_seed(req.seed)
+    return call_kwargs
 
-    t0 = time.time()
-    images = pipe(**call_kwargs).images
-    dt = time.time() - t0
-
-    data = []
-    for img in images:
-        buf = io.BytesIO()
-        img.save(buf, format="PNG")
-        data.append({"b64_json": base64.b64encode(buf.getvalue()).decode("ascii")})
-    print(f"[server] {req.n}x {w}x{h} steps={steps} cfg={guidance} -> {dt:.1f}s", flush=True)
-    return {"created": int(t0), "data": data}
+
+@app.post("/v1/images/generations")
+async def generate(req: ImageRequest, request: Request):
+    _check(req)
+    w, h = _snap(*_parse_size(req.size or DEFAULT_SIZE))
+    steps = req.num_inference_steps if req.num_inference_steps is not None else DEFAULT_STEPS
+    guidance = req.guidance_scale if req.guidance_scale is not None else DEFAULT_GUIDANCE
+    call_kwargs = _base_kwargs(req, w, h, steps, guidance)
+    params = None
+    if result_cache.enabled and req.seed is not None and not req.cache_compare:
+        # seeded => deterministic: everything that shapes the pixels or the bytes
+        params = dict(
+            model=MODEL_ID, revision=MODEL_REVISION, dtype=str(TORCH_DTYPE), pipeline=PIPELINE_CLASS,
+            prompt=req.prompt, negative=call_kwargs.get("negative_prompt", ""), width=w, height=h,
+            steps=steps, guidance_param=GUIDANCE_PARAM, guidance=guidance, n=req.n, seed=req.seed,
+            cache_threshold=req.cache_threshold or 0, format=req.output_format.lower(),
+            compression=req.output_compression,
+        )
+        # tiling changes the pixels, so results are keyed by the decode that made them;
+        # auto may have resolved to either, so it takes whichever is cached
+        blobs = None
+        for mode in ("full", "tiled") if req.vae_decode == "auto" else (req.vae_decode,):
+            blobs = await run_in_threadpool(result_cache.get, _result_key(params, mode))  # may read the disk tier
+            if blobs is not None:
+                break
+        if blobs is not None:
+            print(f"[server] {req.n}x {w}x{h} steps={steps} seed={req.seed} -> result cache hit", flush=True)
+            return _respond(req, blobs, int(time.time()), {"X-Result-Cache": "hit"},
+                            {"size": f"{w}x{h}", "cached": True})
+    return await _serve("text2img", req, call_kwargs, request, Scheduler.cost(w, h, steps, req.n),
+                        f"{req.n}x {w}x{h} steps={steps} cfg={guidance}", {"size": f"{w}x{h}"}, cache_params=params)
+
+
+_derived_lock = threading.Lock()
+
+
+def _derived_pipe(rep: Replica, kind: str):
+    """img2img / inpaint pipeline built with `from_pipe`: a new pipeline object over the
+    replica's already-loaded transformer, VAE and text encoder — no second copy in VRAM."""
+    _derived = rep.derived
+    with _derived_lock:
+        if kind not in _derived:
+            diffusers = import_module("diffusers")
+            name = IMG2IMG_CLASS if kind == "img2img" else INPAINT_CLASS
+            if not name:
+                name = "AutoPipelineForImage2Image" if kind == "img2img" else "AutoPipelineForInpainting"
+            try:
+                _derived[kind] = getattr(diffusers, name).from_pipe(rep.pipe)
+            except (AttributeError, ValueError) as e:
+                raise HTTPException(400, f"{PIPELINE_CLASS} has no {kind} variant ({e})")
+            print(f"[server] {kind}: {type(_derived[kind]).__name__} via from_pipe", flush=True)
+        return _derived[kind]
+
+
+def _read_image(upload, mode: str):
+    try:
+        img = Image.open(io.BytesIO(upload.file.read()))
+        img.load()
+    except Exception as e:
+        raise HTTPException(400, f"bad image {upload.filename!r}: {e}")
+    if mode == "L" and "A" in img.getbands():
+        # OpenAI mask convention: transparent = edit here. diffusers: white = repaint.
+        return img.getchannel("A").point(lambda a: 255 - a)
+    return img.convert(mode)
+
+
+def _load_inputs(uploads: list, mask_upload, size: Optional[str]):
+    """Decode the edit inputs and bring them to one size (the requested one, else the
+    first image's), rounded down to a multiple of 16 and snapped to a bucket. Blocking
+    (upload reads, PIL decode, resampling), so edit() runs it in the threadpool.
+    Returns (images, mask or None, w, h)."""
+    images = [_read_image(u, "RGB") for u in uploads]
+    w, h = _parse_size(size) if size else images[0].size
+    if w < 16 or h < 16:
+        raise HTTPException(400, f"edit size {w}x{h} is too small, width and height must be at least 16")
+    w, h = _snap(w - w % 16, h - h % 16)  # VAE (8x) x patchify (2x)
+    # one size for the whole batch, so every input goes through a single VAE encode
+    images = [im if im.size == (w, h) else im.resize((w, h), Image.LANCZOS) for im in images]
+    mask = _read_image(mask_upload, "L").resize((w, h), Image.NEAREST) if mask_upload is not None else None
+    return images, mask, w, h
+
+
+@app.post("/v1/images/edits")
+async def edit(request: Request):
+    """OpenAI-style multipart edit. One or more `image` (or `image[]`) files are each
+    edited with the same prompt; an optional `mask` switches to inpainting. Every
+    other field is an ImageRequest field, plus `strength` (0-1): only the last
+    `strength × steps` denoising steps run, so edits cost less than a generation."""
+    form = await request.form()
+    uploads = form.getlist("image") + form.getlist("image[]")
+    if not uploads:
+        raise HTTPException(400, "at least one 'image' file is required")
+    mask_upload = form.get("mask")
+    if not hasattr(mask_upload, "file"):
+        mask_upload = None  # absent, or sent as an empty text field
+    fields = {k: v for k, v in form.items() if k not in ("image", "image[]", "mask")}
+    try:
+        req = EditRequest(**fields)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    _check(req)
+    strength = req.strength if req.strength is not None else DEFAULT_STRENGTH
+    if not 0 < strength <= 1:
+        raise HTTPException(400, "strength must be in (0, 1]")
+
+    images, mask, w, h = await run_in_threadpool(_load_inputs, uploads, mask_upload, req.size)
+    steps = req.num_inference_steps if req.num_inference_steps is not None else DEFAULT_STEPS
+    guidance = req.guidance_scale if req.guidance_scale is not None else DEFAULT_GUIDANCE
+    effective = min(steps, max(1, int(steps * strength)))
+
+    call_kwargs = _base_kwargs(req, w, h, steps, guidance)
+    call_kwargs["prompt"] = [req.prompt] * len(images)
+    if "negative_prompt" in call_kwargs:
+        call_kwargs["negative_prompt"] = [call_kwargs["negative_prompt"]] * len(images)
+    call_kwargs["image"] = images
+    call_kwargs["strength"] = strength
+    kind = "img2img"
+    if mask is not None:
+        kind = "inpaint"
+        call_kwargs["mask_image"] = mask
+    n = req.n * len(images)
+    return await _serve(
+        kind, req, call_kwargs, request, Scheduler.cost(w, h, effective, n),
+        f"{kind} {n}x {w}x{h} steps={effective}/{steps} strength={strength} cfg={guidance}",
+        {"size": f"{w}x{h}", "effective_steps": effective},
+    )
 
 
 if __name__ == "__main__":
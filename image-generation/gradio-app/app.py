@@ -5,47 +5,155 @@ Talks to one or more diffusers model containers over their OpenAI-compatible
 config-driven via the MODELS_JSON env var, so the dropdown grows as containers
 are added — no code change needed.
 
-  MODELS_JSON  JSON list of {"name": ..., "url": "http://host:port/v1"} entries
+  MODELS_JSON  JSON list of {"name": ..., "url": "http://host:port/v1"} entries;
+               "urls": [...] instead of "url" lists several containers serving
+               the same model (batches are spread across them)
+  SPLIT_N      max images per sub-request (default 0 = one batched call per
+               backend). 1 streams every image into the gallery as it finishes
+               and lets a multi-GPU server (DEVICES=all) spread the batch
+  REQUEST_TIMEOUT  seconds per sub-request (default 600)
+  POLL_INTERVAL    seconds between background health/config polls (default 10)
+
+All HTTP goes through one pooled keep-alive httpx.AsyncClient per backend; a batch
+is fanned out as parallel sub-requests and the gallery fills as each one returns.
+Backend health and `/config` come from a background poller, so page loads and
+model switches never wait on a container that is down.
 """
+import asyncio
 import base64
 import io
 import json
+import math
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import gradio as gr
-import requests
+import httpx
 from PIL import Image
 
 DEFAULT_MODELS = [{"name": "z-image-turbo", "url": "http://z-image-turbo:8101/v1"}]
 MODELS = json.loads(os.environ.get("MODELS_JSON", json.dumps(DEFAULT_MODELS)))
-URL_BY_NAME = {m["name"]: m["url"] for m in MODELS}
+URLS_BY_NAME = {m["name"]: m.get("urls") or [m["url"]] for m in MODELS}
 SIZES = ["512x512", "768x768", "1024x1024", "1024x1536", "1536x1024"]
 MAX_BATCH = int(os.environ.get("MAX_BATCH", "8"))
+SPLIT_N = int(os.environ.get("SPLIT_N", "0"))
+TIMEOUT = float(os.environ.get("REQUEST_TIMEOUT", "600"))
+POLL_INTERVAL = float(os.environ.get("POLL_INTERVAL", "10"))
 
+_clients: dict[str, httpx.AsyncClient] = {}  # backend base URL -> keep-alive pool
 
-def model_defaults(model):
-    """Pull per-model generation defaults so the sliders match the selected model
-    (e.g. Z-Image: 9 steps / CFG 0; Qwen-Image: 50 steps / true-CFG 4)."""
-    base = URL_BY_NAME.get(model)
-    try:
-        c = requests.get(f"{base}/config", timeout=5).json()
-        label = "Guidance (true-CFG)" if c["guidance_param"] == "true_cfg_scale" else "Guidance (CFG)"
-        return (
-            gr.update(value=c["default_steps"]),
-            gr.update(value=c["default_guidance"], label=label),
-            gr.update(value=c["default_size"]),
+
+def _client(base: str) -> httpx.AsyncClient:
+    # created lazily inside Gradio's event loop, then reused for every request
+    if base not in _clients:
+        _clients[base] = httpx.AsyncClient(
+            base_url=base,
+            timeout=httpx.Timeout(TIMEOUT, connect=5.0),
+            limits=httpx.Limits(max_connections=MAX_BATCH, max_keepalive_connections=MAX_BATCH),
         )
-    except requests.exceptions.RequestException:
-        # container for this model may be down (one-at-a-time on the GPU) — leave sliders as-is
+    return _clients[base]
+
+
+# Backend registry, written only by the poller thread: base URL ->
+# {"state": "ok" | "loading" | "offline", "config": last good /config or None, "checked": ts}
+_backends: dict[str, dict] = {b: {"state": "unknown", "config": None, "checked": 0.0}
+                              for urls in URLS_BY_NAME.values() for b in urls}
+
+
+def _probe(client: httpx.Client, base: str) -> None:
+    entry = dict(_backends[base])
+    try:
+        health = client.get(base.removesuffix("/v1") + "/health").json()
+        entry["state"] = "ok" if health.get("status") == "ok" else "loading"
+        if entry["state"] == "ok":
+            entry["config"] = client.get(f"{base}/config").json()
+    except (httpx.HTTPError, ValueError):
+        # one-at-a-time on the GPU: a stopped container is normal — keep its last config
+        entry["state"] = "offline"
+    entry["checked"] = time.time()
+    _backends[base] = entry  # one atomic swap; readers never see a half-updated entry
+
+
+def _poll_forever() -> None:
+    # short timeouts, all backends in parallel: one dead host can't delay the others
+    with httpx.Client(timeout=httpx.Timeout(3.0)) as client, \
+            ThreadPoolExecutor(max_workers=len(_backends)) as pool:
+        while True:
+            list(pool.map(lambda b: _probe(client, b), _backends))
+            time.sleep(POLL_INTERVAL)
+
+
+def model_state(model: str) -> str:
+    """Best state over the model's backends."""
+    states = {_backends[b]["state"] for b in URLS_BY_NAME[model]}
+    return next((s for s in ("ok", "loading", "unknown") if s in states), "offline")
+
+
+def _live(model: str) -> list[str]:
+    """Backends to send to: the healthy ones, or all of them if none is known healthy
+    (the registry may be stale by up to POLL_INTERVAL)."""
+    urls = URLS_BY_NAME[model]
+    return [b for b in urls if _backends[b]["state"] == "ok"] or urls
+
+
+def model_choices() -> list[tuple[str, str]]:
+    marks = {"ok": "", "loading": " · loading", "unknown": "", "offline": " · offline"}
+    return [(name + marks[model_state(name)], name) for name in URLS_BY_NAME]
+
+
+def refresh_models(model):
+    """Timer tick: re-label the dropdown from the registry (no network)."""
+    return gr.update(choices=model_choices(), value=model)
+
+
+def model_defaults(model):
+    """Per-model generation defaults so the sliders match the selected model
+    (e.g. Z-Image: 9 steps / CFG 0; Qwen-Image: 50 steps / true-CFG 4). Served
+    from the poller's cache — instant, even when the container is down."""
+    c = next((_backends[b]["config"] for b in URLS_BY_NAME[model] if _backends[b]["config"]), None)
+    if c is None:
+        # never seen this model up — leave sliders as-is
         return gr.update(), gr.update(), gr.update()
+    label = "Guidance (true-CFG)" if c["guidance_param"] == "true_cfg_scale" else "Guidance (CFG)"
+    return (
+        gr.update(value=c["default_steps"]),
+        gr.update(value=c["default_guidance"], label=label),
+        gr.update(value=c["default_size"]),
+    )
+
+
+def _split(n: int, backends: list[str]) -> list[tuple[str, int, int]]:
+    """n images -> [(backend, first image index, count), ...], round-robin."""
+    per = SPLIT_N or math.ceil(n / len(backends))
+    return [(backends[i // per % len(backends)], i, min(per, n - i)) for i in range(0, n, per)]
+
+
+def _decode_all(body: bytes) -> list[Image.Image]:
+    return [Image.open(io.BytesIO(base64.b64decode(d["b64_json"]))) for d in json.loads(body)["data"]]
 
 
-def generate(model, prompt, negative_prompt, size, batch, steps, guidance, seed):
+async def _generate_on(base: str, payload: dict) -> list[Image.Image]:
+    model = payload["model"]
+    try:
+        r = await _client(base).post("/images/generations", json=payload)
+    except httpx.HTTPError as e:
+        raise gr.Error(f"Could not reach {model} at {base} — is the container up? ({e!r})")
+    if r.status_code != 200:
+        raise gr.Error(f"{model} returned {r.status_code}: {r.text[:300]}")
+    # base64 + PNG decode off the event loop, so other sessions keep streaming
+    return await asyncio.to_thread(_decode_all, r.content)
+
+
+async def generate(model, prompt, negative_prompt, size, batch, steps, guidance, seed):
     if not prompt.strip():
         raise gr.Error("Please enter a prompt.")
-    base = URL_BY_NAME.get(model)
-    if not base:
+    if model not in URLS_BY_NAME:
         raise gr.Error(f"Unknown model: {model}")
+    if model_state(model) == "offline":
+        gr.Warning(f"{model} looked offline at the last health check — trying anyway.")
+    backends = _live(model)
     payload = {
         "model": model,
         "prompt": prompt,
@@ -57,16 +165,21 @@ def generate(model, prompt, negative_prompt, size, batch, steps, guidance, seed)
     }
     if negative_prompt.strip():
         payload["negative_prompt"] = negative_prompt
-    if int(seed) >= 0:
-        payload["seed"] = int(seed)
 
+    tasks = []
+    for base, first, count in _split(int(batch), backends):
+        sub = {**payload, "n": count}
+        if int(seed) >= 0:
+            sub["seed"] = int(seed) + first  # reproducible for a given split
+        tasks.append(asyncio.create_task(_generate_on(base, sub)))
+    images = []
     try:
-        r = requests.post(f"{base}/images/generations", json=payload, timeout=600)
-    except requests.exceptions.RequestException as e:
-        raise gr.Error(f"Could not reach {model} at {base} — is the container up? ({e})")
-    if r.status_code != 200:
-        raise gr.Error(f"{model} returned {r.status_code}: {r.text[:300]}")
-    return [Image.open(io.BytesIO(base64.b64decode(d["b64_json"]))) for d in r.json()["data"]]
+        for done in asyncio.as_completed(tasks):
+            images += await done
+            yield images
+    finally:
+        for t in tasks:  # first error (or a closed tab) cancels the rest
+            t.cancel()
 
 
 with gr.Blocks(title="AI Services — Text to Image") as demo:
@@ -74,7 +187,7 @@ with gr.Blocks(title="AI Services — Text to Image") as demo:
     with gr.Row():
         with gr.Column(scale=2):
             model = gr.Dropdown(
-                choices=list(URL_BY_NAME), value=list(URL_BY_NAME)[0], label="Model"
+                choices=model_choices(), value=list(URLS_BY_NAME)[0], label="Model"
             )
             prompt = gr.Textbox(label="Prompt", lines=3, placeholder="A photorealistic ...")
             negative_prompt = gr.Textbox(label="Negative prompt (optional)", lines=1)
@@ -93,8 +206,9 @@ with gr.Blocks(title="AI Services — Text to Image") as demo:
         "**Tips** — Z-Image-Turbo: keep Steps≈9 and Guidance=0.0 (it's distilled). "
         "Other models may need more steps and Guidance≈3–5. "
         "Batch size generates N images in one parallel pass — larger batches use "
-        "more VRAM. A fixed seed makes the whole batch reproducible (images still "
-        "differ within the batch)."
+        "more VRAM; with several backends (or `SPLIT_N`) the batch is split into "
+        "parallel sub-requests and images appear as each one finishes. A fixed seed "
+        "makes the whole batch reproducible (images still differ within the batch)."
     )
     go.click(
         generate,
@@ -104,6 +218,10 @@ with gr.Blocks(title="AI Services — Text to Image") as demo:
     # adapt sliders to the model's own defaults on switch and on initial load
     model.change(model_defaults, inputs=model, outputs=[steps, guidance, size])
     demo.load(model_defaults, inputs=model, outputs=[steps, guidance, size])
+    # offline / loading markers follow the background poller
+    gr.Timer(POLL_INTERVAL).tick(refresh_models, inputs=model, outputs=model, show_progress="hidden")
+
+threading.Thread(target=_poll_forever, daemon=True, name="backend-poller").start()
 
 if __name__ == "__main__":
     demo.launch(server_name="0.0.0.0", server_port=7860)
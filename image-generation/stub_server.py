@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+CPU stand-in for diffusers-server — same OpenAI image API, no GPU, stdlib only.
+
+Serves `POST /v1/images/generations` (+ `/health`, `/v1/models`, `/v1/config`)
+with the shape and timing behaviour of the real server: jobs run one at a time
+per simulated GPU, each taking `megapixels x steps x n x --ms-per-mpx-step`
+(cost model of scheduler.py), and return solid-colour PNGs as base64 JSON or,
+with `response_format: "binary"`, raw / multipart bodies. Used to exercise
+bench_images.py and the Gradio frontends without a model loaded.
+
+Usage:
+    python stub_server.py                              # :8101, 1 "GPU"
+    python stub_server.py --port 8102 --gpus 2 --ms-per-mpx-step 300
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import struct
+import threading
+import time
+import uuid
+import zlib
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+@lru_cache(maxsize=32)
+def solid_png(width: int, height: int, rgb: tuple[int, int, int] = (128, 96, 160)) -> bytes:
+    """A valid width x height RGB PNG of one colour (compresses to a few KB)."""
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    row = b"\x00" + bytes(rgb) * width
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr)
+            + chunk(b"IDAT", zlib.compress(row * height, 1)) + chunk(b"IEND", b""))
+
+
+class StubState:
+    def __init__(self, args):
+        self.args = args
+        self.gpus = threading.BoundedSemaphore(args.gpus)
+        self.lock = threading.Lock()
+        self.completed = 0
+        self.queued = 0
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like uvicorn
+    state: StubState
+
+    def log_message(self, fmt, *args):  # quiet: the bench is the one printing
+        pass
+
+    def _send(self, code: int, body: bytes, ctype: str = "application/json", headers: dict | None = None):
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, obj, code: int = 200):
+        self._send(code, json.dumps(obj).encode())
+
+    def do_GET(self):
+        a = self.state.args
+        if self.path == "/health":
+            with self.state.lock:
+                self._json({"status": "ok", "model": a.model, "queue_depth": self.state.queued,
+                            "completed": self.state.completed, "stub": True})
+        elif self.path == "/v1/models":
+            self._json({"object": "list", "data": [{"id": a.model, "object": "model", "owned_by": "stub"}]})
+        elif self.path == "/v1/config":
+            self._json({"model": a.model, "default_steps": a.default_steps, "default_guidance": 0.0,
+                        "guidance_param": "guidance_scale", "default_size": "1024x1024",
+                        "step_cache": False, "sizes": []})
+        else:
+            self._json({"detail": "not found"}, 404)
+
+    def do_POST(self):
+        if self.path != "/v1/images/generations":
+            self._json({"detail": "not found"}, 404)
+            return
+        try:
+            req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            w, h = (int(x) for x in req.get("size", "1024x1024").lower().split("x"))
+            n = int(req.get("n", 1))
+            steps = int(req.get("num_inference_steps") or self.state.args.default_steps)
+        except (ValueError, TypeError) as e:
+            self._json({"detail": f"bad request: {e}"}, 400)
+            return
+        if not 1 <= n <= 8:
+            self._json({"detail": "n must be in [1, 8]"}, 400)
+            return
+
+        t0 = time.time()
+        with self.state.lock:
+            self.state.queued += 1
+        with self.state.gpus:
+            queued = time.time() - t0
+            with self.state.lock:
+                self.state.queued -= 1
+            dt = w * h / 1e6 * steps * n * self.state.args.ms_per_mpx_step / 1000
+            time.sleep(dt)
+        with self.state.lock:
+            self.state.completed += 1
+
+        blob = solid_png(w, h)
+        headers = {"X-Inference-Seconds": f"{dt:.3f}", "X-Queue-Seconds": f"{queued:.3f}"}
+        if req.get("response_format") == "binary":
+            if n == 1:
+                self._send(200, blob, "image/png", headers)
+                return
+            boundary = uuid.uuid4().hex
+            parts = []
+            for i in range(n):
+                parts += [(f"--{boundary}\r\nContent-Type: image/png\r\n"
+                           f'Content-Disposition: attachment; filename="{i}.png"\r\n\r\n').encode(),
+                          blob, b"\r\n"]
+            parts.append(f"--{boundary}--\r\n".encode())
+            self._send(200, b"".join(parts), f"multipart/mixed; boundary={boundary}", headers)
+            return
+        b64 = base64.b64encode(blob).decode("ascii")
+        body = {"created": int(t0), "output_format": "png", "size": f"{w}x{h}",
+                "data": [{"b64_json": b64} for _ in range(n)]}
+        self._send(200, json.dumps(body).encode(), headers=headers)
+
+
+def serve(args) -> ThreadingHTTPServer:
+    handler = type("BoundHandler", (Handler,), {"state": StubState(args)})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--model", default="z-image-turbo", help="served model name")
+    parser.add_argument("--gpus", type=int, default=1, help="jobs that may run at once")
+    parser.add_argument("--ms-per-mpx-step", type=float, default=300.0,
+                        help="simulated ms per megapixel-step (Z-Image @1024² ≈ 300)")
+    parser.add_argument("--default-steps", type=int, default=9)
+    return parser
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    server = serve(args)
+    print(f"stub image server on http://{args.host}:{args.port} — model {args.model}, "
+          f"{args.gpus} GPU(s), {args.ms_per_mpx_step:g} ms/Mpx-step")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
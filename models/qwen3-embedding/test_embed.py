@@ -4,15 +4,20 @@ Embedding / reranker throughput benchmark for the Qwen3-Embedding family.
 
 Measures single-request latency, batched throughput (one request, many inputs),
 and concurrent throughput (many parallel requests) against an OpenAI-compatible
-vLLM pooling endpoint.
+vLLM pooling endpoint. Writes a run record to shared/benchmarks/ and the
+result store (see shared/benchstore.py).
 
 Usage:
     python test_embed.py --port 11463 --model qwen3-embedding-0.6b
     python test_embed.py --port 11466 --model qwen3-reranker-0.6b --rerank
 """
 
-import argparse, time, statistics, urllib.request, json
+import argparse, time, statistics, sys, urllib.request, json
 from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "shared"))
+import benchstore
 
 SAMPLE = ("Mixture-of-experts models activate only a subset of parameters per "
           "token, trading memory bandwidth for compute efficiency at scale. ")
@@ -36,6 +41,7 @@ def main():
     ap.add_argument("--concurrency", type=int, default=32, help="parallel single-item requests")
     ap.add_argument("--runs", type=int, default=50)
     ap.add_argument("--doc-len", type=int, default=4, help="repeats of the sample sentence per item (~tokens)")
+    benchstore.add_arguments(ap)
     args = ap.parse_args()
 
     base = f"http://{args.host}:{args.port}"
@@ -77,9 +83,22 @@ def main():
     t = time.perf_counter()
     with ThreadPoolExecutor(max_workers=args.concurrency) as ex:
         list(ex.map(lambda _: one(), range(N)))
-    dt = time.perf_counter() - t
+    dt_conc = time.perf_counter() - t
     print(f"Concurrent ({N} requests @ {args.concurrency} parallel):")
-    print(f"  {dt*1000:6.1f} ms total -> {N/dt:7.1f} {unit}/s")
+    print(f"  {dt_conc*1000:6.1f} ms total -> {N/dt_conc:7.1f} {unit}/s\n")
+
+    scenario = "rerank" if args.rerank else "embed"
+    benchstore.emit(
+        args, "test_embed.py", f"{base}/v1", args.model,
+        [{"scenario": f"{scenario}-single", "level": 1,
+          "metrics": {"items_per_s": 1 / statistics.mean(lat),
+                      "latency_s": {"p50": lat[len(lat)//2], "p99": lat[min(len(lat)-1, int(len(lat)*0.99))],
+                                    "mean": statistics.mean(lat)}}},
+         {"scenario": f"{scenario}-batch", "level": n, "metrics": {"items_per_s": n / dt, "latency_s": dt}},
+         {"scenario": f"{scenario}-concurrent", "level": args.concurrency, "metrics": {"items_per_s": N / dt_conc}}],
+        config={"rerank": args.rerank, "batch": args.batch, "concurrency": args.concurrency,
+                "runs": args.runs, "doc_len": args.doc_len},
+    )
 
 
 if __name__ == "__main__":
@@ -1,27 +1,425 @@
-import urllib.request, json, time, concurrent.futures
-
-URL = "http://localhost:8000/v1/chat/completions"
-
-def req(prompt, mt=512):
-    p = json.dumps({"model":"qwen3.5-35b","messages":[{"role":"user","content":prompt}],"max_tokens":mt,"temperature":0.7}).encode()
-    r = urllib.request.Request(URL, data=p, headers={"Content-Type":"application/json"})
-    s = time.time()
-    d = json.loads(urllib.request.urlopen(r, timeout=180).read())
-    e = time.time() - s
-    u = d.get("usage",{})
-    return {"ct":u.get("completion_tokens",0),"t":e}
-
-print("=== SINGLE REQUEST ===")
-r = req("Explain general relativity covering spacetime curvature and field equations.", 512)
-print(f"Tokens: {r['ct']}, Time: {r['t']:.1f}s, Speed: {r['ct']/r['t']:.1f} tok/s")
-
-ps = ["Explain quantum entanglement.","History of Rome.","How photosynthesis works.","Neural network backpropagation.","Water cycle and climate.","Thermodynamics.","Immune system.","Blockchain.","Nuclear fusion.","Vaccines."]
-for n in [2, 5, 10]:
-    print(f"\n=== {n} CONCURRENT ===")
-    s = time.time()
-    with concurrent.futures.ThreadPoolExecutor(n) as ex:
-        rs = list(ex.map(lambda p: req(p, 256), ps[:n]))
-    w = time.time() - s
-    tc = sum(x["ct"] for x in rs)
-    pr = [x["ct"]/x["t"] for x in rs]
-    print(f"Total: {tc} tok, Wall: {w:.1f}s, Agg: {tc/w:.1f} tok/s, Per-req avg: {sum(pr)/len(pr):.1f} tok/s")
+#!/usr/bin/env python3
+"""
+Load generator for OpenAI-compatible chat servers (`POST /v1/chat/completions`).
+
+Async (httpx), one pooled keep-alive client, every request streamed: hundreds
+of requests can be in flight without a thread each. For every level of the
+sweep it reports requests/s, output tok/s, time to first token (TTFT),
+inter-token latency (ITL — the gap between consecutive streamed chunks, pooled
+over all requests), time per output token (TPOT — a request's decode time /
+(output tokens - 1)) and end-to-end latency percentiles, plus goodput: the
+requests/s that met every SLO (--slo-ttft, --slo-tpot, --slo-e2e). Each sweep
+is written as a run record to `benchmarks/` and added to the result store
+(see benchstore.py).
+
+Two arrival modes:
+  closed loop (default)  `concurrency` workers, each sends its next request as soon
+                         as the previous one finishes — measures capacity
+  open loop (--rate R)   Poisson arrivals at R req/s (several rates sweep), at most
+                         --max-in-flight at once; latency counts from the scheduled
+                         arrival, so client-side waiting is not hidden (no
+                         coordinated omission)
+
+--mock starts mock_openai_server.py on a free port, so the engine itself can be
+checked offline. The client's event-loop lag is reported too: if it grows to
+milliseconds, the client is saturated and the latencies are its, not the server's.
+
+Usage:
+    python bench.py --mock
+    python bench.py --concurrency 1 8 32 128 256
+    python bench.py --base-url http://localhost:11440/v1 --model nemotron-cascade2-30b --rate 1 2 4 8
+    python bench.py --max-tokens 512 --ignore-eos --slo-ttft 1 --slo-tpot 0.05
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+try:
+    import httpx
+except ImportError as exc:
+    sys.exit(f"Missing dependency: {exc.name}. Install with: pip install httpx")
+
+import benchstore
+
+
+DEFAULT_BASE_URL = "http://localhost:11435/v1"
+DEFAULT_MODEL = "qwen3.5-35b"
+# Level fields that are counts or settings, not comparable metrics.
+NOT_METRICS = ("concurrency", "rate", "requests", "ok", "wall_s", "output_tokens", "slo", "slo_met", "results")
+PROMPTS = [
+    "Explain quantum entanglement.",
+    "Summarize the history of Rome.",
+    "How does photosynthesis work?",
+    "Explain neural network backpropagation.",
+    "Describe the water cycle and its role in the climate.",
+    "Explain the laws of thermodynamics.",
+    "How does the immune system fight infections?",
+    "How does a blockchain reach consensus?",
+    "What are the challenges of nuclear fusion?",
+    "How do mRNA vaccines work?",
+]
+
+
+@dataclass
+class Result:
+    ok: bool
+    status: int
+    ttft_s: float | None
+    e2e_s: float
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    itl_s: list[float] = field(default_factory=list)
+    cached_tokens: int | None = None  # prompt tokens served from the prefix cache, if the server says
+    error: str | None = None
+
+    @property
+    def tpot_s(self) -> float | None:
+        if self.ttft_s is None or self.output_tokens < 2:
+            return None
+        return (self.e2e_s - self.ttft_s) / (self.output_tokens - 1)
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    """Linear-interpolated percentile, q in [0, 100]."""
+    if not values:
+        return None
+    s = sorted(values)
+    k = (len(s) - 1) * q / 100
+    lo = int(k)
+    hi = min(lo + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (k - lo)
+
+
+def make_payload(model: str, prompt: str, max_tokens: int, no_think: bool = False,
+                 ignore_eos: bool = False, temperature: float = 0.7) -> dict:
+    payload = {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "stream": True,
+        "stream_options": {"include_usage": True},
+    }
+    if no_think:
+        payload["enable_thinking"] = False
+    if ignore_eos:
+        payload["ignore_eos"] = True  # vLLM / SGLang: always generate max_tokens
+    return payload
+
+
+def make_payloads(args, rng: random.Random, count: int) -> list[dict]:
+    return [make_payload(args.model, rng.choice(PROMPTS), args.max_tokens, args.no_think, args.ignore_eos)
+            for _ in range(count)]
+
+
+async def stream_chat(client: httpx.AsyncClient, payload: dict, t_start: float) -> Result:
+    """
+    One streamed chat completion. `t_start` is when the request was due (open
+    loop) or sent (closed loop). The first token is the first chunk with content
+    or reasoning text; usage comes from the final chunk if the server sends it,
+    otherwise every content chunk counts as one token.
+    """
+    t_first = t_last = None
+    itl: list[float] = []
+    chunks = 0
+    usage = None
+    try:
+        async with client.stream("POST", "/chat/completions", json=payload) as r:
+            if r.status_code != 200:
+                body = await r.aread()
+                return Result(False, r.status_code, None, time.perf_counter() - t_start,
+                              error=body[:200].decode("utf-8", "replace"))
+            async for line in r.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                if chunk.get("usage"):
+                    usage = chunk["usage"]
+                delta = (chunk["choices"][0].get("delta") or {}) if chunk.get("choices") else {}
+                if delta.get("content") or delta.get("reasoning_content") or delta.get("reasoning"):
+                    now = time.perf_counter()
+                    if t_first is None:
+                        t_first = now
+                    else:
+                        itl.append(now - t_last)
+                    t_last = now
+                    chunks += 1
+        e2e = time.perf_counter() - t_start
+    except (httpx.HTTPError, ValueError, KeyError, IndexError) as exc:
+        return Result(False, 0, None, time.perf_counter() - t_start, error=repr(exc))
+    if t_first is None:
+        return Result(False, 200, None, e2e, error="no tokens streamed")
+    usage = usage or {}
+    return Result(True, 200, t_first - t_start, e2e,
+                  prompt_tokens=usage.get("prompt_tokens", 0),
+                  output_tokens=usage.get("completion_tokens") or chunks,
+                  itl_s=itl,
+                  cached_tokens=(usage.get("prompt_tokens_details") or {}).get("cached_tokens"))
+
+
+async def run_level(client: httpx.AsyncClient, payloads: list[dict], concurrency: int = 1,
+                    rate: float = 0.0, seed: int = 0) -> list[Result]:
+    """
+    Send `payloads` closed loop with `concurrency` workers, or open loop with
+    Poisson arrivals at `rate` req/s and at most `concurrency` in flight.
+    """
+    results: list[Result] = []
+    if rate > 0:
+        rng = random.Random(seed)
+        sem = asyncio.Semaphore(concurrency)
+
+        async def fire(payload, due):
+            async with sem:
+                results.append(await stream_chat(client, payload, due))
+
+        tasks, due = [], time.perf_counter()
+        for payload in payloads:
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(fire(payload, due)))
+            due += rng.expovariate(rate)
+        await asyncio.gather(*tasks)
+    else:
+        queue = list(reversed(payloads))
+
+        async def worker():
+            while queue:
+                results.append(await stream_chat(client, queue.pop(), time.perf_counter()))
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results
+
+
+class LoopLag:
+    """Measures how late the event loop wakes up — the client's own saturation."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: list[float] = []
+        self._task: asyncio.Task | None = None
+
+    async def _run(self):
+        while True:
+            t = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(time.perf_counter() - t - self.interval)
+
+    def __enter__(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+
+def summarize(results: list[Result], wall: float, slo: dict | None = None) -> dict:
+    """Throughput, latency percentiles and goodput of one level."""
+    slo = slo or {}
+    ok = [r for r in results if r.ok]
+    ttft = [r.ttft_s for r in ok]
+    tpot = [r.tpot_s for r in ok if r.tpot_s is not None]
+    itl = [gap for r in ok for gap in r.itl_s]
+    e2e = [r.e2e_s for r in ok]
+    out_tokens = sum(r.output_tokens for r in ok)
+
+    def good(r: Result) -> bool:
+        return ((slo.get("ttft_s") is None or r.ttft_s <= slo["ttft_s"])
+                and (slo.get("tpot_s") is None or r.tpot_s is None or r.tpot_s <= slo["tpot_s"])
+                and (slo.get("e2e_s") is None or r.e2e_s <= slo["e2e_s"]))
+
+    def pcts(values):
+        return {**{f"p{q}": percentile(values, q) for q in (50, 90, 99)},
+                "mean": sum(values) / len(values) if values else None}
+
+    met = [r for r in ok if good(r)]
+    per_s = (lambda n: n / wall) if wall > 0 else (lambda n: 0.0)
+    return {
+        "requests": len(results),
+        "ok": len(ok),
+        "errors": len(results) - len(ok),
+        "rejected_429": sum(r.status == 429 for r in results),
+        "wall_s": wall,
+        "requests_per_s": per_s(len(ok)),
+        "output_tokens": out_tokens,
+        "output_tokens_per_s": per_s(out_tokens),
+        "per_stream_tokens_per_s": pcts([(r.output_tokens - 1) / (r.e2e_s - r.ttft_s)
+                                         for r in ok if r.output_tokens > 1 and r.e2e_s > r.ttft_s]),
+        "prompt_tokens_mean": sum(r.prompt_tokens for r in ok) / len(ok) if ok else None,
+        "ttft_s": pcts(ttft),
+        "itl_s": pcts(itl),
+        "tpot_s": pcts(tpot),
+        "e2e_s": pcts(e2e),
+        "slo": slo,
+        "slo_met": len(met),
+        "goodput_requests_per_s": per_s(len(met)),
+        "goodput_tokens_per_s": per_s(sum(r.output_tokens for r in met)),
+    }
+
+
+def _ms(v: float | None, width: int = 8) -> str:
+    return f"{'-':>{width}}" if v is None else f"{v * 1000:>{width}.0f}"
+
+
+def start_mock(args) -> str:
+    """Run mock_openai_server.py in a subprocess on a free port; returns its base URL."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    cmd = [sys.executable, str(Path(__file__).parent / "mock_openai_server.py"), "--port", str(port),
+           "--model", args.model, "--itl", str(args.mock_itl), "--max-batch", str(args.mock_max_batch)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while True:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).raise_for_status()
+            break
+        except httpx.HTTPError:
+            if time.time() > deadline or proc.poll() is not None:
+                proc.kill()
+                sys.exit("mock server did not start")
+            time.sleep(0.1)
+    args.mock_proc = proc
+    return f"http://127.0.0.1:{port}/v1"
+
+
+async def bench(args) -> dict:
+    cap = max(args.concurrency) if not args.rate else args.max_in_flight
+    limits = httpx.Limits(max_connections=cap, max_keepalive_connections=cap)
+    timeout = httpx.Timeout(args.timeout, connect=10.0, pool=None)  # open loop may queue for the pool
+    slo = {"ttft_s": args.slo_ttft, "tpot_s": args.slo_tpot, "e2e_s": args.slo_e2e}
+    levels = []
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout) as client:
+        try:
+            r = await client.get("/models")
+            r.raise_for_status()
+            owned_by = next((m.get("owned_by") for m in r.json().get("data", [])), None)
+        except (httpx.HTTPError, ValueError) as exc:
+            sys.exit(f"{args.base_url}/models unreachable: {exc}")
+        if args.warmup:
+            print(f"Warmup    : {args.warmup} request(s) (not measured)…", flush=True)
+            await run_level(client, make_payloads(args, random.Random(args.seed - 1), args.warmup), 1)
+
+        key = "rate" if args.rate else "conc"
+        print()
+        print(f"{key:>6}{'ok/req':>10}{'req/s':>8}{'tok/s':>8}{'good/s':>8}"
+              f"{'ttft50':>8}{'ttft99':>8}{'itl50':>7}{'itl99':>7}{'tpot50':>8}{'e2e50':>8}{'e2e99':>8}")
+        print("─" * 96)
+        for level in (args.rate or args.concurrency):
+            if args.rate:
+                conc, rate = args.max_in_flight, level
+                count = args.requests or max(16, int(level * 30))
+            else:
+                conc, rate = level, 0.0
+                count = args.requests or max(16, 4 * level)
+            # same request sequence at every level, so levels are comparable
+            payloads = make_payloads(args, random.Random(args.seed), count)
+            with LoopLag() as lag:
+                t0 = time.perf_counter()
+                results = await run_level(client, payloads, conc, rate, args.seed + int(level * 1000))
+                wall = time.perf_counter() - t0
+            summary = {"concurrency": conc, "rate": rate, **summarize(results, wall, slo),
+                       "client_loop_lag_s": {"p99": percentile(lag.samples, 99),
+                                             "max": max(lag.samples, default=None)}}
+            t, i, p, e = summary["ttft_s"], summary["itl_s"], summary["tpot_s"], summary["e2e_s"]
+            print(f"{level:>6g}{summary['ok']:>6}/{summary['requests']:<4}{summary['requests_per_s']:>7.2f}"
+                  f"{summary['output_tokens_per_s']:>8.0f}{summary['goodput_requests_per_s']:>8.2f}"
+                  f"{_ms(t['p50'])}{_ms(t['p99'])}{_ms(i['p50'], 7)}{_ms(i['p99'], 7)}{_ms(p['p50'])}"
+                  f"{e['p50'] or 0:>8.2f}{e['p99'] or 0:>8.2f}", flush=True)
+            errors = [r.error for r in results if not r.ok]
+            if errors:
+                print(f"        {len(errors)} failed, e.g. {errors[0]}")
+            lag = summary["client_loop_lag_s"]["p99"]
+            if lag and lag > 0.02:
+                print(f"        client event loop lag p99 {lag * 1000:.0f} ms — the client is saturated, "
+                      f"latencies are inflated")
+            if args.per_request:
+                summary["results"] = [{**asdict(r), "tpot_s": r.tpot_s} for r in results]
+            levels.append(summary)
+        print("─" * 96)
+        print("  ttft/itl/tpot in ms, e2e in s; good/s = requests/s within the SLO")
+    return {"levels": levels, "owned_by": owned_by}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 5, 10, 32],
+                        help="closed-loop levels to sweep (requests in flight)")
+    parser.add_argument("--rate", type=float, nargs="+", default=None,
+                        help="open loop: Poisson arrival rates to sweep, req/s")
+    parser.add_argument("--max-in-flight", type=int, default=512, help="open-loop in-flight cap")
+    parser.add_argument("--requests", type=int, default=0,
+                        help="requests per level (default: 4 x concurrency, or 30 s worth of arrivals; min 16)")
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--ignore-eos", action="store_true",
+                        help="ask the server to always generate --max-tokens (vLLM / SGLang)")
+    parser.add_argument("--no-think", action="store_true", help="send enable_thinking: false")
+    parser.add_argument("--slo-ttft", type=float, default=2.0, help="goodput SLO: max TTFT, seconds")
+    parser.add_argument("--slo-tpot", type=float, default=0.1, help="goodput SLO: max time per output token, s")
+    parser.add_argument("--slo-e2e", type=float, default=None, help="goodput SLO: max end-to-end latency, s")
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured requests before the sweep")
+    parser.add_argument("--seed", type=int, default=0, help="RNG seed for prompts and arrivals")
+    parser.add_argument("--timeout", type=float, default=600.0, help="per-request timeout, seconds")
+    parser.add_argument("--per-request", action="store_true", help="include every request in the JSON")
+    parser.add_argument("--mock", action="store_true", help="bench a local mock server (no GPU)")
+    parser.add_argument("--mock-itl", type=float, default=0.02, help="mock decode step at batch 1, seconds")
+    parser.add_argument("--mock-max-batch", type=int, default=256, help="mock batch size limit")
+    benchstore.add_arguments(parser)
+    args = parser.parse_args()
+
+    args.mock_proc = None
+    if args.mock:
+        args.base_url = start_mock(args)
+
+    mode = f"open loop, rates {args.rate} req/s, ≤{args.max_in_flight} in flight" if args.rate \
+        else f"closed loop, concurrency {args.concurrency}"
+    slos = ", ".join(f"{name} ≤ {v:g}s" for name, v in
+                     (("ttft", args.slo_ttft), ("tpot", args.slo_tpot), ("e2e", args.slo_e2e)) if v is not None)
+    print(f"Endpoint  : {args.base_url}{' (mock)' if args.mock else ''}")
+    print(f"Model     : {args.model}")
+    print(f"Load      : {mode}, max_tokens {args.max_tokens}{', ignore_eos' if args.ignore_eos else ''}")
+    print(f"SLO       : {slos or 'none'}")
+
+    try:
+        out = asyncio.run(bench(args))
+    finally:
+        if args.mock_proc:
+            args.mock_proc.terminate()
+
+    best = max(out["levels"], key=lambda lv: lv["goodput_requests_per_s"])
+    print(f"Peak      : {best['goodput_requests_per_s']:.2f} req/s goodput at "
+          + (f"{best['rate']:g} req/s offered" if args.rate else f"concurrency {best['concurrency']}"))
+
+    scenario = "open-loop" if args.rate else "closed-loop"
+    benchstore.emit(
+        args, "bench.py", args.base_url, args.model,
+        [{"scenario": scenario, "level": lv["rate"] if args.rate else lv["concurrency"],
+          "metrics": {k: v for k, v in lv.items() if k not in NOT_METRICS}} for lv in out["levels"]],
+        owned_by=out["owned_by"],
+        config={"mode": scenario, "mock": args.mock,
+                "concurrency": args.concurrency, "rate": args.rate, "max_in_flight": args.max_in_flight,
+                "requests": args.requests, "max_tokens": args.max_tokens, "ignore_eos": args.ignore_eos,
+                "no_think": args.no_think, "seed": args.seed,
+                "slo": {"ttft_s": args.slo_ttft, "tpot_s": args.slo_tpot, "e2e_s": args.slo_e2e}},
+        details={"levels": out["levels"]},
+    )
+    return 0 if all(lv["errors"] == 0 for lv in out["levels"]) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
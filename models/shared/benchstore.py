@@ -0,0 +1,652 @@
+#!/usr/bin/env python3
+"""
+Benchmark result schema, store and comparison report.
+
+Every benchmark script (bench.py, test_scenarios.py, test_chat.py,
+qwen3-embedding/test_embed.py) emits one *run record* per invocation — a JSON
+file in `benchmarks/` with the same shape whatever the tool:
+
+    {
+      "schema": "ai-services-bench/1",
+      "run_id": "…", "timestamp": "2026-05-03T10:13:20Z", "tool": "bench.py",
+      "endpoint": "http://localhost:11435/v1", "model": "qwen3.5-35b",
+      "engine": "vllm", "quantization": "fp8",
+      "compose_file": "models/qwen3.5/docker-compose.vllm-35b-fp8-rtx.yml",
+      "host": "…", "gpu": "NVIDIA RTX PRO 6000 …", "git_commit": "…",
+      "config": {… tool arguments …},
+      "results": [{"scenario": "chat", "level": 8,
+                   "metrics": {"output_tokens_per_s": 554.6, "ttft_s.p50": 0.21, …}}],
+      "details": {… tool-specific raw output …}
+    }
+
+`level` is the load level (concurrency, or req/s in open loop). Metric names
+carry their unit (`_s`, `_per_s`) and nested percentiles are flattened with a
+dot (`ttft_s.p50`). Engine and quantization come from --engine / --quantization,
+else from the compose file (image and file name), else from the server's
+`/v1/models` `owned_by`.
+
+Records also go into a SQLite store (`benchmarks/results.sqlite`, one row per
+metric), which the report is generated from. The JSON records are the source
+of truth: the store can always be rebuilt with `ingest`, which also imports
+GuideLLM `benchmarks.csv` sweeps, image-generation/bench_images.py results and
+the qwen3-asr WER files already in the tree.
+
+Usage:
+    python benchstore.py ingest benchmarks/ ../*/benchmarks/ ../../image-generation/benchmarks/
+    python benchstore.py list --model qwen3.6-35b
+    python benchstore.py report -o comparison.html --threshold 5
+    python benchstore.py diff 3f2a9c 8be41d
+    python benchstore.py export results.parquet            # needs pandas + pyarrow
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import html
+import json
+import platform
+import re
+import sqlite3
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+from pathlib import Path
+from typing import Iterable, Iterator
+
+SCHEMA = "ai-services-bench/1"
+BENCH_DIR = Path(__file__).parent / "benchmarks"
+DEFAULT_STORE = BENCH_DIR / "results.sqlite"
+
+# Headline metrics, in report column order; other metrics only show in diffs.
+KEY_METRICS = [
+    "output_tokens_per_s", "tokens_per_s", "per_stream_tokens_per_s.p50", "requests_per_s",
+    "goodput_requests_per_s", "ttft_s.p50", "ttft_s.p99", "itl_s.p50", "itl_s.p99", "tpot_s.p50",
+    "e2e_s.p50", "e2e_s.p99", "prefill_skip_ratio", "ttft_cold_s.p50", "ttft_warm_s.p50", "items_per_s",
+    "images_per_s", "latency_s.p50", "wer", "errors",
+]
+
+ENGINES = [  # (substring of the compose image or file name, engine)
+    ("sglang", "sglang"), ("tensorrt", "tensorrt-llm"), ("trtllm", "tensorrt-llm"),
+    ("vllm", "vllm"), ("llama", "llama.cpp"), ("ollama", "ollama"), ("mlx", "mlx"),
+]
+OWNED_BY = {"vllm": "vllm", "sglang": "sglang", "llamacpp": "llama.cpp", "library": "ollama",
+            "ollama": "ollama", "mock": "mock"}
+QUANT_RE = re.compile(r"(?<![a-z0-9])(nvfp4|mxfp4|fp8|fp16|bf16|awq(?:-int4)?|gptq|int4|int8|"
+                      r"q[2-8](?:_k(?:_[msl])?|_0)?|ud-q[2-8]\w*)(?![a-z0-9])")
+
+
+# ---------------------------------------------------------------------------
+# Records
+# ---------------------------------------------------------------------------
+
+def flatten(metrics: dict, prefix: str = "") -> dict[str, float]:
+    """{"ttft_s": {"p50": 0.2}} -> {"ttft_s.p50": 0.2}; non-numeric values are dropped."""
+    flat = {}
+    for key, value in metrics.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def describe_compose(path: str | Path | None) -> dict:
+    """Engine and quantization of a compose file, from its image and file name."""
+    if not path:
+        return {}
+    path = Path(path)
+    text = path.read_text(errors="replace") if path.exists() else ""
+    images = " ".join(re.findall(r"^\s*image:\s*(\S+)", text, re.M)).lower()
+    name = path.name.lower().removeprefix("docker-compose.")
+    engine = next((e for key, e in ENGINES if key in images), None) \
+        or next((e for key, e in ENGINES if name.startswith(key)), None)
+    weights = " ".join(re.findall(r"[\w.:/-]*\.gguf|-hf\s+\S+", text)).lower()  # llama.cpp model file
+    quant = QUANT_RE.search(name) or QUANT_RE.search(weights)
+    flag = re.search(r"--quantization[\s=]+['\"]?([\w-]+)", text)
+    return {"engine": engine, "quantization": quant.group(1) if quant else flag.group(1) if flag else None}
+
+
+def _gpu() -> str | None:
+    try:
+        out = subprocess.run(["nvidia-smi", "--query-gpu=name", "--format=csv,noheader"],
+                             capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    names = [line.strip() for line in out.stdout.splitlines() if line.strip()]
+    return f"{len(names)}x {names[0]}" if len(names) > 1 else (names[0] if names else None)
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent,
+                             capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def fetch_owned_by(base_url: str) -> str | None:
+    """`owned_by` of the first model the server lists — vLLM, SGLang and llama.cpp name themselves there."""
+    try:
+        with urllib.request.urlopen(f"{base_url.rstrip('/')}/models", timeout=5) as r:
+            return next((m.get("owned_by") for m in json.loads(r.read()).get("data", [])), None)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def make_record(tool: str, endpoint: str, model: str, results: list[dict], *,
+                engine: str | None = None, quantization: str | None = None,
+                compose_file: str | None = None, owned_by: str | None = None,
+                config: dict | None = None, details: dict | None = None, environment: bool = True) -> dict:
+    """
+    Build a run record.
+
+    Args:
+        tool: Script that produced the results, e.g. "bench.py".
+        results: [{"scenario": str, "level": number, "metrics": {name: number or nested dict}}].
+        engine / quantization: Explicit values; otherwise taken from `compose_file`,
+            and the engine from the server's `owned_by`.
+        config: Tool arguments worth keeping.
+        details: Tool-specific raw output, kept in the JSON but not in the store.
+        environment: Record this machine's host name, GPU and git commit (off for imports).
+    """
+    described = describe_compose(compose_file)
+    return {
+        "schema": SCHEMA,
+        "run_id": uuid.uuid4().hex,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "tool": tool,
+        "endpoint": endpoint,
+        "model": model,
+        "engine": engine or described.get("engine") or OWNED_BY.get(owned_by or ""),
+        "quantization": quantization or described.get("quantization"),
+        "compose_file": str(compose_file) if compose_file else None,
+        "host": platform.node() if environment else None,
+        "gpu": _gpu() if environment else None,
+        "git_commit": _git_commit() if environment else None,
+        "config": config or {},
+        "results": [{"scenario": r["scenario"], "level": r.get("level", 1), "metrics": flatten(r["metrics"])}
+                    for r in results],
+        "details": details or {},
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """The run-record options shared by the benchmark scripts."""
+    group = parser.add_argument_group("run record")
+    group.add_argument("--compose-file", help="compose file of the server under test (engine, quantization)")
+    group.add_argument("--engine", help="serving engine, e.g. vllm, sglang, llama.cpp (default: detected)")
+    group.add_argument("--quantization", help="weight quantization, e.g. fp8, nvfp4, q4_k_m (default: detected)")
+    group.add_argument("--record", type=Path, default=None,
+                       help=f"run record path (default {BENCH_DIR.name}/<tool>-<model>-<timestamp>.json)")
+    group.add_argument("--store", type=Path, default=DEFAULT_STORE, help="SQLite store the record is added to")
+    group.add_argument("--no-record", action="store_true", help="do not write a run record")
+
+
+def emit(args, tool: str, endpoint: str, model: str, results: list[dict], **kwargs) -> dict:
+    """
+    Build the run record from the add_arguments() options, write it and add it to the store.
+
+    Without --engine or a compose file, the engine is asked from the server (`owned_by`).
+    """
+    if not (args.engine or describe_compose(args.compose_file).get("engine") or kwargs.get("owned_by")):
+        kwargs["owned_by"] = fetch_owned_by(endpoint)
+    record = make_record(tool, endpoint, model, results, engine=args.engine, quantization=args.quantization,
+                         compose_file=args.compose_file, **kwargs)
+    if args.no_record:
+        return record
+    stamp = record["timestamp"].replace("-", "").replace(":", "").rstrip("Z")
+    path = args.record or BENCH_DIR / f"{Path(tool).stem}-{_slug(model)}-{stamp}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(record, indent=2))
+    with Store(args.store) as store:
+        store.add(record, source=str(path))
+    print(f"Wrote {path} (run {record['run_id'][:8]})")
+    return record
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", text).strip("_") or "model"
+
+
+# ---------------------------------------------------------------------------
+# Importers for results written before the schema
+# ---------------------------------------------------------------------------
+
+def guidellm_key(strategy: dict, step: int) -> tuple[str, float]:
+    """
+    (scenario suffix, level) of a GuideLLM strategy, the same in every run of the
+    same profile: synchronous is level 1 and concurrent its stream count. A
+    sweep's constant rates are derived from the measured throughput, so they
+    are keyed by their step in the sweep (1..n), fixed rates by the rate.
+    """
+    kind = strategy.get("type_")
+    if kind == "synchronous":
+        return "", 1
+    if kind == "concurrent":
+        return "", strategy["streams"]
+    if kind == "throughput":
+        return "/throughput", strategy.get("max_concurrency") or 1
+    if step:
+        return f"/sweep-{kind}", step
+    return f"/{kind}", round(strategy["rate"], 3)
+
+
+def from_guidellm_csv(path: Path) -> dict:
+    """A GuideLLM `benchmarks.csv`: one result per strategy (see guidellm_key), measured concurrency as a metric."""
+    with open(path, newline="") as file:
+        rows = list(csv.reader(file))
+    header = [" / ".join(part for part in parts if part) for parts in zip(*rows[:3])]
+    runs = [dict(zip(header, row)) for row in rows[3:] if row]
+    first = runs[0]
+    backend = json.loads(first.get("Run Info / Backend") or "{}")
+    profile = json.loads(first.get("Run Info / Profile") or "{}")
+    strategies = profile.get("completed_strategies") or []
+    if len(strategies) != len(runs):
+        raise ValueError(f"{len(runs)} benchmarks but {len(strategies)} strategies in the profile")
+    label = path.parent.parent.name  # e.g. guidellm-fp8
+    scenario = path.parent.name
+
+    def num(run, key, scale=1.0):
+        try:
+            return float(run[key]) * scale
+        except (KeyError, ValueError):
+            return None
+
+    results = []
+    steps = 0
+    for run, strategy in zip(runs, strategies):
+        if profile.get("type_") == "sweep" and strategy.get("type_") not in ("synchronous", "throughput"):
+            steps += 1
+        suffix, level = guidellm_key(strategy, steps if profile.get("type_") == "sweep" else 0)
+        metrics = {
+            "requests_per_s": num(run, "Server Throughput / Successful Requests/Sec / Mean"),
+            "output_tokens_per_s": num(run, "Token Throughput / Successful Output Tokens/Sec / Mean"),
+            "ttft_s": {"p50": num(run, "Time to First Token / Successful ms / Median", 1e-3),
+                       "mean": num(run, "Time to First Token / Successful ms / Mean", 1e-3)},
+            "itl_s": {"p50": num(run, "Inter Token Latency / Successful ms / Median", 1e-3)},
+            "tpot_s": {"p50": num(run, "Time per Output Token / Successful ms / Median", 1e-3)},
+            "e2e_s": {"p50": num(run, "Request Latency / Successful Sec / Median"),
+                      "mean": num(run, "Request Latency / Successful Sec / Mean")},
+            "errors": num(run, "Request Counts / Errored"),
+            "concurrency_mean": num(run, "Server Throughput / Successful Concurrency / Mean"),
+            "target_rate": strategy.get("rate"),
+        }
+        results.append({"scenario": scenario + suffix, "level": level, "metrics": metrics})
+    quant = QUANT_RE.search(label.lower())
+    record = make_record("guidellm", backend.get("target", ""), backend.get("model") or path.parts[-5], results,
+                         quantization=quant.group(1) if quant else None, environment=False,
+                         config={"label": label, "strategies": [run.get("Benchmark / Strategy") for run in runs]})
+    record["run_id"] = first.get("Run Info / Run ID") or record["run_id"]
+    start = first.get("Timings / Start Time")
+    if start:
+        record["timestamp"] = start.replace(" ", "T") + "Z"
+    return record
+
+
+def from_bench_images(data: dict) -> dict:
+    """image-generation/bench_images.py output."""
+    results = [{"scenario": "images", "level": level["concurrency"],
+                "metrics": {key: level[key] for key in ("images_per_s", "requests_per_s", "latency_s",
+                                                          "ttfi_s", "errors")}}
+               for level in data["levels"]]
+    record = make_record("bench_images.py", data["endpoint"], data["model"], results,
+                         engine="stub" if data.get("stub") else None, config=data.get("config"), environment=False)
+    record.update(run_id=uuid.uuid5(uuid.NAMESPACE_URL, f"bench_images/{data['model']}/{data['timestamp']}").hex,
+                  timestamp=time.strftime("%Y-%m-%dT%H:%M:%SZ",
+                                          time.strptime(data["timestamp"], "%Y%m%d-%H%M%S")))
+    return record
+
+
+def from_asr_wer(data: dict, path: Path) -> dict:
+    """qwen3-asr WER results (aggregate and per-language word error rate, latency)."""
+    latencies = [r["latency_s"] for r in data.get("results", []) if "latency_s" in r]
+    metrics = {"wer": data["aggregate_wer"], **{f"wer_{lang}": wer for lang, wer in data["by_lang_wer"].items()}}
+    if latencies:
+        metrics["latency_s"] = {"mean": sum(latencies) / len(latencies)}
+    scenario, size = path.stem, data["model"].rsplit("-", 1)[-1]
+    scenario = scenario.removesuffix(f"-{size}")  # fleurs-en5-de5-0.6b -> fleurs-en5-de5
+    record = make_record("asr-wer", data["endpoint"], data["model"],
+                         [{"scenario": scenario, "level": 1, "metrics": metrics}], environment=False)
+    record.update(run_id=uuid.uuid5(uuid.NAMESPACE_URL, f"asr-wer/{path.name}").hex,
+                  timestamp=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(path.stat().st_mtime)))
+    return record
+
+
+def load_records(paths: Iterable[str | Path]) -> Iterator[tuple[dict, Path]]:
+    """Run records from files and directories (searched recursively), converting old formats."""
+    for path in map(Path, paths):
+        files = sorted(path.rglob("*")) if path.is_dir() else [path]
+        for file in files:
+            try:
+                if file.name == "benchmarks.csv":
+                    yield from_guidellm_csv(file), file
+                elif file.suffix == ".json":
+                    data = json.loads(file.read_text())
+                    if not isinstance(data, dict):
+                        continue
+                    if data.get("schema") == SCHEMA:
+                        yield data, file
+                    elif "levels" in data and "sizes" in data.get("config", {}):
+                        yield from_bench_images(data), file
+                    elif "aggregate_wer" in data:
+                        yield from_asr_wer(data, file), file
+            except (OSError, ValueError, KeyError, IndexError, TypeError) as exc:
+                print(f"  skipped {file}: {exc!r}", file=sys.stderr)
+
+
+# ---------------------------------------------------------------------------
+# Store
+# ---------------------------------------------------------------------------
+
+RUN_COLUMNS = ["run_id", "timestamp", "tool", "endpoint", "model", "engine", "quantization", "compose_file",
+               "host", "gpu", "git_commit"]
+
+
+class Store:
+    """SQLite store of run records: a `runs` table and a long `metrics` table."""
+
+    def __init__(self, path: str | Path = DEFAULT_STORE):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(f"""
+            CREATE TABLE IF NOT EXISTS runs ({', '.join(c + ' TEXT' for c in RUN_COLUMNS)},
+                                             config TEXT, source TEXT, PRIMARY KEY (run_id));
+            CREATE TABLE IF NOT EXISTS metrics (run_id TEXT, scenario TEXT, level REAL, metric TEXT, value REAL,
+                                                PRIMARY KEY (run_id, scenario, level, metric));
+        """)
+
+    def __enter__(self) -> "Store":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.db.close()
+
+    def add(self, record: dict, source: str | None = None) -> None:
+        """Insert a run record, replacing a run with the same id."""
+        with self.db:
+            self.db.execute(f"INSERT OR REPLACE INTO runs VALUES ({', '.join('?' * (len(RUN_COLUMNS) + 2))})",
+                            [record.get(c) for c in RUN_COLUMNS] + [json.dumps(record.get("config")), source])
+            self.db.execute("DELETE FROM metrics WHERE run_id = ?", (record["run_id"],))
+            self.db.executemany("INSERT OR REPLACE INTO metrics VALUES (?, ?, ?, ?, ?)", [
+                (record["run_id"], r["scenario"], float(r["level"]), name, value)
+                for r in record["results"] for name, value in r["metrics"].items() if value is not None])
+
+    def runs(self, model: str | None = None, tool: str | None = None) -> list[dict]:
+        """Runs, oldest first, optionally filtered by model / tool (substring match)."""
+        rows = self.db.execute("SELECT * FROM runs WHERE model LIKE ? AND tool LIKE ? ORDER BY timestamp",
+                               (f"%{model or ''}%", f"%{tool or ''}%")).fetchall()
+        return [dict(row) for row in rows]
+
+    def find(self, prefix: str) -> dict:
+        rows = self.db.execute("SELECT * FROM runs WHERE run_id LIKE ?", (prefix + "%",)).fetchall()
+        if len(rows) != 1:
+            raise KeyError(f"{len(rows)} runs match {prefix!r}")
+        return dict(rows[0])
+
+    def metrics(self, run_id: str) -> dict[tuple[str, float], dict[str, float]]:
+        """{(scenario, level): {metric: value}} of one run."""
+        out: dict[tuple[str, float], dict[str, float]] = {}
+        for row in self.db.execute("SELECT scenario, level, metric, value FROM metrics WHERE run_id = ?",
+                                   (run_id,)):
+            out.setdefault((row["scenario"], row["level"]), {})[row["metric"]] = row["value"]
+        return out
+
+    def export_parquet(self, path: str | Path) -> int:
+        """Write runs joined with their metrics to a Parquet file (long format)."""
+        try:
+            import pandas as pd
+        except ImportError as exc:
+            raise ImportError("Parquet export needs pandas and pyarrow: pip install pandas pyarrow") from exc
+        frame = pd.read_sql_query("SELECT r.*, m.scenario, m.level, m.metric, m.value "
+                                  "FROM metrics m JOIN runs r USING (run_id)", self.db)
+        frame.to_parquet(path, index=False)
+        return len(frame)
+
+
+# ---------------------------------------------------------------------------
+# Comparison
+# ---------------------------------------------------------------------------
+
+def direction(metric: str) -> int:
+    """+1 if higher is better, -1 if lower is better, 0 if neither is clear."""
+    name = metric.split(".")[0]
+    if name.endswith(("per_s", "_ratio")):
+        return 1
+    if name.endswith(("_s", "_ms")) or name.startswith("wer") or name in ("errors", "rejected_429"):
+        return -1
+    return 0
+
+
+def _setup_label(run: dict) -> str | None:
+    """`config.label` of a run: the result directory of imports that have no engine or compose file."""
+    config = run.get("config")
+    if isinstance(config, str):
+        config = json.loads(config)
+    return config.get("label") if isinstance(config, dict) else None
+
+
+def config_key(run: dict) -> tuple:
+    """Runs with the same key measure the same setup, so their differences are regressions or gains."""
+    return (run["tool"], run["model"], run["engine"], run["quantization"], run["compose_file"], run["gpu"],
+            _setup_label(run))
+
+
+def compare(base: dict, cand: dict, threshold: float = 0.05) -> list[dict]:
+    """
+    Metric changes between two runs' {(scenario, level): {metric: value}}.
+
+    `verdict` is "regression" or "improvement" when a metric with a known
+    direction moved by more than `threshold` (a fraction), else "".
+    """
+    rows = []
+    for key in sorted(set(base) & set(cand)):
+        for metric in sorted(set(base[key]) & set(cand[key])):
+            b, c = base[key][metric], cand[key][metric]
+            change = (c - b) / abs(b) if b else (0.0 if c == b else float("inf"))
+            verdict = ""
+            if direction(metric) and abs(change) > threshold:
+                verdict = "improvement" if change * direction(metric) > 0 else "regression"
+            rows.append({"scenario": key[0], "level": key[1], "metric": metric, "base": b, "cand": c,
+                         "change": change, "verdict": verdict})
+    return rows
+
+
+def regressions(store: Store, runs: list[dict], threshold: float) -> list[tuple[dict, dict, list[dict]]]:
+    """
+    Each run against the latest earlier run of the same setup that measured
+    some of the same scenarios and levels: (previous, run, changed metrics).
+    """
+    earlier: dict[tuple, list[tuple[dict, dict]]] = {}
+    out = []
+    for run in runs:
+        metrics = store.metrics(run["run_id"])
+        previous = earlier.setdefault(config_key(run), [])
+        base = next(((r, m) for r, m in reversed(previous) if set(m) & set(metrics)), None)
+        if base is not None:
+            out.append((base[0], run, [row for row in compare(base[1], metrics, threshold) if row["verdict"]]))
+        previous.append((run, metrics))
+    return out
+
+
+# ---------------------------------------------------------------------------
+# HTML report
+# ---------------------------------------------------------------------------
+
+CSS = """
+  :root { --bg: #0a0612; --bg-card: #1a1430; --fg: #f0e8ff; --muted: #9890c4;
+          --accent: #f37819; --good: #4caf50; --bad: #f44336; }
+  body { margin: 0; padding: 2rem; background: var(--bg); color: var(--fg); line-height: 1.5;
+         font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", system-ui, sans-serif; }
+  h1 { margin: 0 0 .25rem; color: var(--accent); }
+  h2 { margin-top: 2.5rem; border-bottom: 1px solid rgba(252,165,10,.15); padding-bottom: .3rem; }
+  .meta { color: var(--muted); font-size: .9rem; }
+  table { border-collapse: collapse; margin: 1rem 0; font-size: .85rem; background: var(--bg-card); }
+  th, td { padding: .35rem .7rem; border-bottom: 1px solid rgba(255,255,255,.06); text-align: right; }
+  th { color: var(--muted); font-weight: 600; position: sticky; top: 0; background: var(--bg-card); }
+  td.l, th.l { text-align: left; }
+  .best { color: var(--accent); font-weight: 700; }
+  .regression { color: var(--bad); } .improvement { color: var(--good); }
+"""
+
+
+def _fmt(value: float | None) -> str:
+    if value is None:
+        return "–"
+    if value == 0 or abs(value) >= 100:
+        return f"{value:,.0f}"
+    return f"{value:.3g}" if abs(value) < 1 else f"{value:.1f}"
+
+
+def _label(run: dict) -> str:
+    parts = [run["model"], run["engine"], run["quantization"], Path(run["compose_file"]).name
+             if run["compose_file"] else None, _setup_label(run)]
+    return " · ".join(p for p in parts if p)
+
+
+def render_report(store: Store, runs: list[dict], threshold: float = 0.05, title: str = "Benchmark comparison") -> str:
+    e = html.escape
+    out = [f"<!doctype html>\n<html lang=\"en\">\n<head>\n<meta charset=\"utf-8\" />\n<title>{e(title)}</title>\n"
+           f"<style>{CSS}</style>\n</head>\n<body>\n<h1>{e(title)}</h1>\n"
+           f"<div class=\"meta\">{len(runs)} runs · generated {time.strftime('%Y-%m-%d %H:%M')} "
+           f"by models/shared/benchstore.py · best value per column highlighted</div>"]
+
+    groups: dict[tuple[str, str], list[tuple[dict, float, dict]]] = {}
+    for run in runs:
+        for (scenario, level), metrics in sorted(store.metrics(run["run_id"]).items()):
+            groups.setdefault((run["tool"], scenario), []).append((run, level, metrics))
+
+    for (tool, scenario), rows in sorted(groups.items()):
+        present = {m for _, _, metrics in rows for m in metrics}
+        columns = [m for m in KEY_METRICS if m in present] or sorted(present)[:10]
+        best = {}
+        for m in columns:
+            values = [metrics[m] for _, _, metrics in rows if m in metrics]
+            if direction(m) and len(values) > 1:
+                best[m] = max(values) if direction(m) > 0 else min(values)
+        out.append(f"<h2>{e(scenario)} <span class=\"meta\">{e(tool)}</span></h2>\n<table>\n<tr>"
+                   "<th class=\"l\">setup</th><th class=\"l\">date</th><th>level</th>"
+                   + "".join(f"<th>{e(m)}</th>" for m in columns) + "</tr>")
+        for run, level, metrics in sorted(rows, key=lambda r: (_label(r[0]), r[1], r[0]["timestamp"])):
+            cells = "".join(("<td class=\"best\">" if m in best and metrics.get(m) == best[m] else "<td>")
+                            + f"{_fmt(metrics.get(m))}</td>" for m in columns)
+            out.append(f"<tr><td class=\"l\" title=\"run {e(run['run_id'])}\">{e(_label(run))}</td>"
+                       f"<td class=\"l\">{e((run['timestamp'] or '')[:10])}</td><td>{level:g}</td>{cells}</tr>")
+        out.append("</table>")
+
+    diffs = regressions(store, runs, threshold)
+    out.append(f"<h2>Changes against the previous run of the same setup</h2>\n<div class=\"meta\">"
+               f"Same tool, model, engine, quantization, compose file and GPU; metrics that moved more than "
+               f"{threshold:.0%} in a known direction.</div>")
+    for base, run, changes in diffs:
+        bad = sum(c["verdict"] == "regression" for c in changes)
+        out.append(f"<h3>{e(_label(run))} <span class=\"meta\">{e(run['tool'])} · {e(base['timestamp'][:10])} "
+                   f"→ {e(run['timestamp'][:10])} · {bad} regressions, {len(changes) - bad} improvements</span></h3>")
+        if changes:
+            out.append("<table>\n<tr><th class=\"l\">scenario</th><th>level</th><th class=\"l\">metric</th>"
+                       "<th>before</th><th>after</th><th>change</th></tr>")
+            for c in changes:
+                out.append(f"<tr class=\"{c['verdict']}\"><td class=\"l\">{e(c['scenario'])}</td>"
+                           f"<td>{c['level']:g}</td><td class=\"l\">{e(c['metric'])}</td><td>{_fmt(c['base'])}</td>"
+                           f"<td>{_fmt(c['cand'])}</td><td>{c['change']:+.1%}</td></tr>")
+            out.append("</table>")
+    if not diffs:
+        out.append("<p class=\"meta\">No setup has been run more than once.</p>")
+    out.append("</body>\n</html>\n")
+    return "\n".join(out)
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", type=Path, default=DEFAULT_STORE, help=f"SQLite store (default {DEFAULT_STORE})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("ingest", help="add run records (and older result files) to the store")
+    p.add_argument("paths", nargs="+", type=Path, help="files or directories, searched recursively")
+    p = sub.add_parser("list", help="list stored runs")
+    p.add_argument("--model")
+    p.add_argument("--tool")
+    p = sub.add_parser("report", help="write the HTML comparison and regression report")
+    p.add_argument("-o", "--output", type=Path, default=BENCH_DIR / "comparison.html")
+    p.add_argument("--model")
+    p.add_argument("--tool")
+    p.add_argument("--title", default="Benchmark comparison")
+    p.add_argument("--threshold", type=float, default=5.0, help="change that counts, percent (default 5)")
+    p.add_argument("--fail-on-regression", action="store_true", help="exit 1 if the latest runs regressed")
+    p = sub.add_parser("diff", help="compare two runs metric by metric")
+    p.add_argument("base", help="run id (or unique prefix)")
+    p.add_argument("cand", help="run id (or unique prefix)")
+    p.add_argument("--threshold", type=float, default=5.0, help="change that counts, percent (default 5)")
+    p.add_argument("--all", action="store_true", help="show unchanged metrics too")
+    p = sub.add_parser("export", help="export runs and metrics to Parquet")
+    p.add_argument("output", type=Path)
+    args = parser.parse_args()
+
+    with Store(args.store) as store:
+        if args.command == "ingest":
+            count = 0
+            for record, source in load_records(args.paths):
+                store.add(record, source=str(source))
+                count += 1
+            print(f"Ingested {count} runs into {args.store}")
+
+        elif args.command == "list":
+            print(f"  {'run':<10}{'date':<12}{'tool':<22}{'setup':<60}{'results':>8}")
+            print(f"  {'─' * 110}")
+            for run in store.runs(args.model, args.tool):
+                print(f"  {run['run_id'][:8]:<10}{(run['timestamp'] or '')[:10]:<12}{run['tool']:<22}"
+                      f"{_label(run)[:58]:<60}{len(store.metrics(run['run_id'])):>8}")
+
+        elif args.command == "report":
+            runs = store.runs(args.model, args.tool)
+            args.output.parent.mkdir(parents=True, exist_ok=True)
+            args.output.write_text(render_report(store, runs, args.threshold / 100, args.title))
+            latest = {}
+            for base, run, changes in regressions(store, runs, args.threshold / 100):
+                latest[config_key(run)] = (run, [c for c in changes if c["verdict"] == "regression"])
+            regressed = [(run, bad) for run, bad in latest.values() if bad]
+            print(f"Wrote {args.output} ({len(runs)} runs)")
+            for run, bad in regressed:
+                print(f"  REGRESSION {_label(run)} ({run['tool']}, run {run['run_id'][:8]}): "
+                      + ", ".join(f"{c['scenario']}@{c['level']:g} {c['metric']} {c['change']:+.1%}"
+                                  for c in bad[:5]) + (" …" if len(bad) > 5 else ""))
+            if args.fail_on_regression and regressed:
+                return 1
+
+        elif args.command == "diff":
+            try:
+                base, cand = store.find(args.base), store.find(args.cand)
+            except KeyError as exc:
+                sys.exit(str(exc))
+            rows = compare(store.metrics(base["run_id"]), store.metrics(cand["run_id"]), args.threshold / 100)
+            print(f"Base : {base['run_id'][:8]}  {base['timestamp']}  {_label(base)}")
+            print(f"Cand : {cand['run_id'][:8]}  {cand['timestamp']}  {_label(cand)}")
+            print(f"  {'scenario':<16}{'level':>7}  {'metric':<34}{'base':>10}{'cand':>10}{'change':>9}")
+            print(f"  {'─' * 90}")
+            for r in rows:
+                if r["verdict"] or args.all:
+                    mark = {"regression": "  ✗", "improvement": "  ✓"}.get(r["verdict"], "")
+                    print(f"  {r['scenario']:<16}{r['level']:>7g}  {r['metric']:<34}{_fmt(r['base']):>10}"
+                          f"{_fmt(r['cand']):>10}{r['change']:>+9.1%}{mark}")
+            return 1 if any(r["verdict"] == "regression" for r in rows) else 0
+
+        elif args.command == "export":
+            try:
+                count = store.export_parquet(args.output)
+            except ImportError as exc:
+                sys.exit(str(exc))
+            print(f"Wrote {count} metric rows to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Mock OpenAI chat server — streams fake tokens with the timing of a batching LLM server.
+
+Serves `POST /v1/chat/completions` (streamed SSE and plain JSON, with `usage`),
+`GET /v1/models` and `GET /health`, stdlib only. Used to test bench.py and the
+other scripts in this directory offline, without a GPU or a model.
+
+Timing model (continuous batching, like vLLM / SGLang): one engine loop runs
+decode steps. Every step emits one token to each running sequence and takes
+`--itl` seconds at batch size 1, plus `--itl-growth` of that per extra running
+sequence. New requests join the batch at the next step, up to `--max-batch`
+sequences (the rest queue), and their prefill adds `prompt tokens /
+--prefill-tps` seconds to that step. So TTFT grows with prompt length and
+queueing, and inter-token latency grows with the batch — enough to see a
+saturation knee in a concurrency sweep.
+
+Prefix caching (like vLLM's automatic prefix caching / SGLang's RadixAttention)
+is modelled too: prompts are hashed in chained blocks of BLOCK_CHARS
+characters, an LRU of `--cache-blocks` blocks is kept, and only the blocks after
+the longest cached prefix cost prefill time. `usage.prompt_tokens_details.
+cached_tokens` reports the hit, as vLLM and SGLang do. --no-prefix-cache turns
+it off.
+
+asyncio with one coroutine per connection, so hundreds of open streams cost
+no threads.
+
+Usage:
+    python mock_openai_server.py                          # :11435, model qwen3.5-35b
+    python mock_openai_server.py --port 8000 --itl 0.01 --max-batch 64
+    python bench.py --base-url http://localhost:11435/v1 --concurrency 1 16 64
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import socket
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+
+WORDS = ("the model streams tokens one at a time while the scheduler batches every running "
+         "sequence into a single decode step so throughput grows with concurrency until the "
+         "batch saturates the GPU and each stream slows down").split()
+BLOCK_CHARS = 64  # ~16 tokens, vLLM's default block size
+
+
+def count_tokens(messages: list[dict]) -> int:
+    """Rough prompt size without a tokenizer: about four characters per token, plus role tokens."""
+    return sum(len(str(m.get("content") or "")) // 4 + 4 for m in messages)
+
+
+def prefix_blocks(messages: list[dict]) -> list[int]:
+    """Chained hashes of the prompt's full blocks: block i's hash covers everything before it too."""
+    text = "".join(f"<{m.get('role')}>{m.get('content') or ''}" for m in messages)
+    hashes, h = [], 0
+    for start in range(0, len(text) - BLOCK_CHARS + 1, BLOCK_CHARS):
+        h = hash((h, text[start:start + BLOCK_CHARS]))
+        hashes.append(h)
+    return hashes
+
+
+@dataclass
+class Sequence:
+    prompt_tokens: int
+    max_tokens: int
+    blocks: list[int] = field(default_factory=list)
+    cached_tokens: int = 0
+    tokens: asyncio.Queue = field(default_factory=asyncio.Queue)  # token index per step, None at the end
+    generated: int = 0
+    cancelled: bool = False
+
+
+class Engine:
+    """The decode loop shared by all requests."""
+
+    def __init__(self, args):
+        self.args = args
+        self.waiting: deque[Sequence] = deque()
+        self.running: list[Sequence] = []
+        self.wake = asyncio.Event()
+        self.completed = 0
+        self.cache: OrderedDict[int, None] = OrderedDict()  # block hash LRU
+
+    def prefill_tokens(self, seq: Sequence) -> int:
+        """Look the sequence's prefix up in the cache, cache its blocks; returns the tokens to prefill."""
+        if not self.args.prefix_cache:
+            return seq.prompt_tokens
+        hits = 0
+        while hits < len(seq.blocks) and seq.blocks[hits] in self.cache:
+            hits += 1
+        for h in seq.blocks:
+            self.cache[h] = None
+            self.cache.move_to_end(h)
+        while len(self.cache) > self.args.cache_blocks:
+            self.cache.popitem(last=False)
+        seq.cached_tokens = min(hits * BLOCK_CHARS // 4, seq.prompt_tokens - 1)
+        return seq.prompt_tokens - seq.cached_tokens
+
+    def submit(self, seq: Sequence) -> None:
+        self.waiting.append(seq)
+        self.wake.set()
+
+    async def run(self) -> None:
+        a = self.args
+        while True:
+            if not self.running and not self.waiting:
+                self.wake.clear()
+                await self.wake.wait()
+            prefill = 0
+            while self.waiting and len(self.running) < a.max_batch:
+                seq = self.waiting.popleft()
+                if not seq.cancelled:
+                    self.running.append(seq)
+                    prefill += self.prefill_tokens(seq)
+            step = a.itl * (1 + a.itl_growth * max(len(self.running) - 1, 0)) + prefill / a.prefill_tps
+            await asyncio.sleep(step)
+            still = []
+            for seq in self.running:
+                if seq.cancelled:
+                    continue
+                seq.tokens.put_nowait(seq.generated)
+                seq.generated += 1
+                if seq.generated < seq.max_tokens:
+                    still.append(seq)
+                else:
+                    seq.tokens.put_nowait(None)
+                    self.completed += 1
+            self.running = still
+
+
+class Server:
+    def __init__(self, args):
+        self.args = args
+        self.engine = Engine(args)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # flush every SSE event now
+        try:
+            while True:
+                head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+                method, path, _ = head[0].split(" ", 2)
+                headers = {}
+                for line in head[1:]:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                await self.route(method, path.split("?")[0], body, writer)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter) -> None:
+        a = self.args
+        if method == "GET" and path == "/health":
+            await self.send_json(writer, {"status": "ok", "model": a.model, "running": len(self.engine.running),
+                                          "waiting": len(self.engine.waiting),
+                                          "completed": self.engine.completed, "mock": True})
+        elif method == "GET" and path == "/v1/models":
+            await self.send_json(writer, {"object": "list",
+                                          "data": [{"id": a.model, "object": "model", "owned_by": "mock"}]})
+        elif method == "POST" and path == "/v1/chat/completions":
+            try:
+                req = json.loads(body or b"{}")
+                messages = req["messages"]
+            except (ValueError, KeyError, TypeError) as e:
+                await self.send_json(writer, {"error": {"message": f"bad request: {e!r}"}}, 400)
+                return
+            await self.chat(req, messages, writer)
+        else:
+            await self.send_json(writer, {"error": {"message": "not found"}}, 404)
+
+    async def send_json(self, writer: asyncio.StreamWriter, obj: dict, code: int = 200) -> None:
+        body = json.dumps(obj).encode()
+        writer.write(f"HTTP/1.1 {code} {'OK' if code == 200 else 'Error'}\r\n"
+                     f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+        await writer.drain()
+
+    async def chat(self, req: dict, messages: list[dict], writer: asyncio.StreamWriter) -> None:
+        a = self.args
+        max_tokens = int(req.get("max_tokens") or req.get("max_completion_tokens") or a.output_tokens)
+        n_out = max(1, max_tokens if req.get("ignore_eos") else min(max_tokens, a.output_tokens))
+        seq = Sequence(count_tokens(messages), n_out, prefix_blocks(messages))
+        usage = {"prompt_tokens": seq.prompt_tokens, "completion_tokens": n_out,
+                 "total_tokens": seq.prompt_tokens + n_out}
+        rid, created, model = f"chatcmpl-{uuid.uuid4().hex[:24]}", int(time.time()), req.get("model") or a.model
+        self.engine.submit(seq)
+        try:
+            if not req.get("stream"):
+                text = []
+                while (i := await seq.tokens.get()) is not None:
+                    text.append(WORDS[i % len(WORDS)])
+                usage["prompt_tokens_details"] = {"cached_tokens": seq.cached_tokens}
+                await self.send_json(writer, {
+                    "id": rid, "object": "chat.completion", "created": created, "model": model,
+                    "choices": [{"index": 0, "finish_reason": "length" if n_out == max_tokens else "stop",
+                                 "message": {"role": "assistant", "content": " ".join(text)}}],
+                    "usage": usage,
+                })
+                return
+
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                         b"Cache-Control: no-cache\r\nTransfer-Encoding: chunked\r\n\r\n")
+            prefix = f'{{"id":"{rid}","object":"chat.completion.chunk","created":{created},"model":{json.dumps(model)},'
+
+            def event(payload: str) -> bytes:
+                data = f"data: {payload}\n\n".encode()
+                return f"{len(data):x}\r\n".encode() + data + b"\r\n"
+
+            while (i := await seq.tokens.get()) is not None:
+                content = json.dumps(("" if i == 0 else " ") + WORDS[i % len(WORDS)])
+                role = '"role":"assistant",' if i == 0 else ""
+                writer.write(event(prefix + f'"choices":[{{"index":0,"delta":{{{role}"content":{content}}},'
+                                            f'"finish_reason":null}}]}}'))
+                await writer.drain()
+            finish = "length" if n_out == max_tokens else "stop"
+            usage["prompt_tokens_details"] = {"cached_tokens": seq.cached_tokens}
+            tail = event(prefix + f'"choices":[{{"index":0,"delta":{{}},"finish_reason":"{finish}"}}]}}')
+            if (req.get("stream_options") or {}).get("include_usage"):
+                tail += event(prefix + f'"choices":[],"usage":{json.dumps(usage)}}}')
+            writer.write(tail + event("[DONE]") + b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            seq.cancelled = True  # no-op when finished; frees the batch slot if the client went away
+
+
+async def serve(args) -> asyncio.base_events.Server:
+    server = Server(args)
+    asyncio.create_task(server.engine.run())
+    return await asyncio.start_server(server.handle, args.host, args.port, backlog=1024)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--model", default="qwen3.5-35b", help="served model name")
+    parser.add_argument("--itl", type=float, default=0.02, help="decode step at batch size 1, seconds")
+    parser.add_argument("--itl-growth", type=float, default=0.01,
+                        help="step time added per extra running sequence, as a fraction of --itl")
+    parser.add_argument("--prefill-tps", type=float, default=20000.0, help="prefill speed, prompt tokens/s")
+    parser.add_argument("--max-batch", type=int, default=256, help="sequences decoded at once; the rest queue")
+    parser.add_argument("--output-tokens", type=int, default=128,
+                        help="reply length, unless max_tokens is smaller or ignore_eos is set")
+    parser.add_argument("--cache-blocks", type=int, default=8192,
+                        help=f"prefix cache size in blocks of {BLOCK_CHARS} characters (~16 tokens)")
+    parser.add_argument("--no-prefix-cache", dest="prefix_cache", action="store_false",
+                        help="prefill every prompt in full")
+    return parser
+
+
+async def _main(args) -> None:
+    server = await serve(args)
+    print(f"mock OpenAI server on http://{args.host}:{args.port}/v1 — model {args.model}, "
+          f"{args.itl * 1000:g} ms/step, max batch {args.max_batch}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    try:
+        asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,6 +2,8 @@
 """
 Chat API benchmark — measures time to first token (TTFT) and tokens per second.
 
+Writes a run record to benchmarks/ and the result store (see benchstore.py).
+
 Usage:
     python test_chat.py
     python test_chat.py --base-url http://localhost:11435/v1 --prompt "Explain MoE in one paragraph"
@@ -17,6 +19,8 @@ try:
 except ImportError:
     sys.exit("openai package required: pip install openai")
 
+import benchstore
+
 
 DEFAULT_BASE_URL = "http://localhost:11435/v1"
 DEFAULT_MODEL    = "qwen3.5-35b"
@@ -131,6 +135,7 @@ def main():
                         help="Disable thinking/reasoning (sets enable_thinking=false)")
     parser.add_argument("--warmup",   action="store_true",
                         help="Send a short warmup request before benchmarking")
+    benchstore.add_arguments(parser)
     args = parser.parse_args()
 
     client = OpenAI(base_url=args.base_url, api_key="not-required")
@@ -177,13 +182,29 @@ def main():
     if not results:
         sys.exit(1)
 
+    avg_ttft = sum(r["ttft_s"] for r in results if r["ttft_s"]) / len(results)
+    avg_tps  = sum(r["tokens_per_sec"] for r in results) / len(results)
     if args.runs > 1:
-        avg_ttft = sum(r["ttft_s"] for r in results if r["ttft_s"]) / len(results)
-        avg_tps  = sum(r["tokens_per_sec"] for r in results) / len(results)
         print()
         print(f"Average  TTFT : {avg_ttft * 1000:.0f} ms")
         print(f"Average  tok/s: {avg_tps:.1f}")
 
+    think = [r["think_s"] for r in results if r["think_s"]]
+    print()
+    benchstore.emit(
+        args, "test_chat.py", args.base_url, args.model,
+        [{"scenario": "chat", "level": 1, "metrics": {
+            "tokens_per_s": avg_tps,
+            "ttft_s": avg_ttft,
+            "think_s": sum(think) / len(think) if think else None,
+            "total_s": sum(r["total_s"] for r in results) / len(results),
+            "output_tokens": sum(r["completion_tokens"] for r in results) / len(results),
+        }}],
+        config={"prompt": args.prompt, "runs": args.runs, "max_tokens": args.max_tokens,
+                "no_think": args.no_think},
+        details={"runs": results},
+    )
+
 
 if __name__ == "__main__":
     main()
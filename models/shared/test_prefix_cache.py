@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Prefix-cache benchmark — how much prefill the server skips for prompts that share a prefix.
+
+RAG and agentic requests mostly repeat the same long head (system prompt, tool
+list, retrieved documents) and differ only in the tail. With prefix caching
+(vLLM `--enable-prefix-caching`, SGLang RadixAttention, llama.cpp
+`--cache-reuse`), the shared head is prefilled once and later requests only
+prefill what follows it.
+
+For each scenario (from test_scenarios.py) and each --prefix-fraction, this
+sends --families request families. Every member of a family shares the first
+fraction of the scenario prompt, cut at a line boundary, behind a header that is
+unique to the family. Each member then gets its own variant line before the rest
+of the prompt, so nothing after the shared part can hit the cache. Requests go
+in passes: pass 0 sends every family's first member (cold prefix), each later
+pass one more member of every family (warm prefix). With many families the warm prefixes
+may already be evicted by the time a family comes round again, which is the
+cache size limit showing.
+
+TTFT includes a fixed overhead (queueing, first decode step, network), measured
+as the median TTFT of a tiny prompt. The effective prefill-skip ratio is
+1 - (warm TTFT - overhead) / (cold TTFT - overhead), at the median. It is the
+share of cold prefill time that warm requests avoid. Compare it with the ideal
+ratio, which is the shared share of the prompt: much lower means the cache
+misses or is evicted too soon. Where the server reports
+`usage.prompt_tokens_details.cached_tokens` (vLLM, SGLang), the cached-token
+ratio of warm requests is shown too. Writes a run record to benchmarks/ and the
+result store (see benchstore.py), one result per scenario and fraction, so
+cache settings can be compared per compose file.
+
+Usage:
+    python test_prefix_cache.py
+    python test_prefix_cache.py --prefix-fraction 0.25 0.5 0.9 --families 8 --family-size 4
+    python test_prefix_cache.py --scenario rag --compose-file ../qwen3.5/docker-compose.vllm-35b-fp8-rtx.yml
+    python test_prefix_cache.py --base-url http://localhost:8000/v1   # against mock_openai_server.py --port 8000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import bench
+import benchstore
+import httpx
+from test_scenarios import SCENARIOS
+
+DEFAULT_BASE_URL = "http://localhost:11435/v1"
+DEFAULT_MODEL = "qwen3.5-35b"
+
+
+def split_prompt(prompt: str, fraction: float) -> tuple[str, str]:
+    """The prompt cut at the line boundary nearest to `fraction` of its length."""
+    target = int(len(prompt) * fraction)
+    cuts = [i + 1 for i, c in enumerate(prompt) if c == "\n"] or [target]
+    cut = min(cuts, key=lambda i: abs(i - target))
+    return prompt[:cut], prompt[cut:]
+
+
+def make_families(prompt: str, fraction: float, families: int, size: int) -> tuple[list[list[str]], float]:
+    """
+    `families` lists of `size` prompts that share a prefix within a family only.
+    Returns them with the ideal skip ratio: the shared share of a member's prompt.
+    """
+    shared, tail = split_prompt(prompt, fraction)
+    out = []
+    for _ in range(families):
+        head = f"Session {uuid.uuid4().hex[:12]}.\n\n{shared}"
+        out.append([f"{head}[Variant {uuid.uuid4().hex[:12]}]\n{tail}" for _ in range(size)])
+    ideal = len(head) / len(out[-1][-1])
+    return out, ideal
+
+
+async def run_passes(client: httpx.AsyncClient, args, families: list[list[str]]) -> list[list[bench.Result]]:
+    """Pass k sends member k of every family; one pass finishes before the next starts."""
+    passes = []
+    for k in range(args.family_size):
+        payloads = [bench.make_payload(args.model, family[k], args.max_tokens, no_think=args.no_think,
+                                       temperature=0.0)
+                    for family in families]
+        passes.append(await bench.run_level(client, payloads, args.concurrency))
+    return passes
+
+
+async def overhead(client: httpx.AsyncClient, args) -> float:
+    """Median TTFT of a tiny prompt: what TTFT costs without meaningful prefill."""
+    payloads = [bench.make_payload(args.model, f"Say OK. {uuid.uuid4().hex[:8]}", 1, no_think=args.no_think,
+                                   temperature=0.0)
+                for _ in range(args.overhead_requests)]
+    results = await bench.run_level(client, payloads, 1)
+    ttft = [r.ttft_s for r in results if r.ok]
+    return statistics.median(ttft) if ttft else 0.0
+
+
+def skip_ratio(cold: float | None, warm: float | None, base: float) -> float | None:
+    """Share of the cold prefill time that warm requests skip, clamped to [0, 1]."""
+    if cold is None or warm is None or cold <= base:
+        return None
+    return min(1.0, max(0.0, 1 - (warm - base) / (cold - base)))
+
+
+def cached_ratio(results: list[bench.Result]) -> float | None:
+    """Mean share of prompt tokens the server reports as served from its prefix cache."""
+    reported = [r.cached_tokens / r.prompt_tokens for r in results
+                if r.ok and r.cached_tokens is not None and r.prompt_tokens]
+    return sum(reported) / len(reported) if reported else None
+
+
+async def run(args) -> tuple[float, list[dict]]:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout, connect=10.0, pool=None)
+    rows = []
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout) as client:
+        base = await overhead(client, args)
+        print(f"TTFT overhead (tiny prompt, median): {base * 1000:.0f}ms")
+        print()
+        for name in args.scenario:
+            sc = SCENARIOS[name]
+            print(f"{'─' * 70}")
+            print(f"  {sc['label']}  —  {sc['description']}")
+            print(f"  {args.families} families × {args.family_size} requests, max_tokens={args.max_tokens}")
+            print(f"{'─' * 70}")
+            print(f"  {'shared':>6} {'ideal':>6} {'cold p50':>9} {'warm p50':>9} {'speedup':>8} "
+                  f"{'skip':>6} {'cached':>7}  ok")
+            for fraction in args.prefix_fraction:
+                families, ideal = make_families(sc["prompt"], fraction, args.families, args.family_size)
+                t0 = time.perf_counter()
+                passes = await run_passes(client, args, families)
+                wall = time.perf_counter() - t0
+                cold_results, warm_results = passes[0], [r for p in passes[1:] for r in p]
+                cold = bench.summarize(cold_results, wall)
+                warm = bench.summarize(warm_results, wall)
+                c50, w50 = cold["ttft_s"]["p50"], warm["ttft_s"]["p50"]
+                skip = skip_ratio(c50, w50, base)
+                cached = cached_ratio(warm_results)
+                speedup = c50 / w50 if c50 and w50 else None
+                row = {
+                    "name": name, "label": sc["label"], "fraction": fraction,
+                    "ttft_cold_s": cold["ttft_s"], "ttft_warm_s": warm["ttft_s"],
+                    "ttft_overhead_s": base,
+                    "prefill_skip_ratio": skip, "ideal_skip_ratio": ideal,
+                    "cached_token_ratio": cached, "cold_cached_token_ratio": cached_ratio(cold_results),
+                    "warm_speedup_ratio": speedup,
+                    "prompt_tokens_mean": cold["prompt_tokens_mean"],
+                    "errors": cold["errors"] + warm["errors"],
+                }
+                rows.append(row)
+                ok = cold["ok"] + warm["ok"]
+                print(f"  {fraction:>6.0%} {ideal:>6.0%} {bench._ms(c50, 7)}ms {bench._ms(w50, 7)}ms "
+                      f"{'-' if speedup is None else f'{speedup:.2f}x':>8} "
+                      f"{'-' if skip is None else f'{skip:.0%}':>6} "
+                      f"{'-' if cached is None else f'{cached:.0%}':>7}  {ok}/{cold['requests'] + warm['requests']}",
+                      flush=True)
+                errors = [r.error for p in passes for r in p if not r.ok]
+                if errors:
+                    print(f"        {len(errors)} failed, e.g. {errors[0]}")
+            print()
+    return base, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--scenario", nargs="+", default=["rag", "agentic"], choices=list(SCENARIOS.keys()),
+                        help="Scenarios whose prompts are split (default: rag agentic)")
+    parser.add_argument("--prefix-fraction", type=float, nargs="+", default=[0.25, 0.5, 0.9],
+                        help="Share of the prompt a family shares (default: 0.25 0.5 0.9)")
+    parser.add_argument("--families", type=int, default=4,
+                        help="Families per fraction, each with its own prefix (default: 4)")
+    parser.add_argument("--family-size", type=int, default=4,
+                        help="Requests per family; the first is cold, the rest warm (default: 4)")
+    parser.add_argument("--max-tokens", type=int, default=16,
+                        help="Output tokens per request; only TTFT is measured (default: 16)")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Requests in flight within a pass (default: 1)")
+    parser.add_argument("--overhead-requests", type=int, default=5,
+                        help="Tiny-prompt requests for the TTFT overhead baseline (default: 5)")
+    parser.add_argument("--no-think", action="store_true", default=True,
+                        help="Disable thinking/reasoning (default: true)")
+    parser.add_argument("--think", action="store_true",
+                        help="Enable thinking/reasoning")
+    parser.add_argument("--timeout", type=float, default=600.0,
+                        help="Per-request timeout in seconds (default: 600)")
+    benchstore.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.think:
+        args.no_think = False
+    if args.family_size < 2:
+        parser.error("--family-size must be at least 2: one cold request and at least one warm one")
+
+    print(f"Endpoint  : {args.base_url}")
+    print(f"Model     : {args.model}")
+    print(f"Scenarios : {', '.join(args.scenario)}")
+    print(f"Fractions : {', '.join(f'{f:.0%}' for f in args.prefix_fraction)}")
+    print()
+
+    base, rows = asyncio.run(run(args))
+
+    print(f"{'═' * 70}")
+    print(f"  SUMMARY — {args.model} @ {args.base_url}")
+    print(f"{'═' * 70}")
+    print(f"  {'Scenario':<16} {'Shared':>6} {'Skip':>6} {'Ideal':>6} {'Cached':>7} {'Speedup':>8}")
+    print(f"  {'─' * 66}")
+    for row in rows:
+        skip, cached, speedup = row["prefill_skip_ratio"], row["cached_token_ratio"], row["warm_speedup_ratio"]
+        print(f"  {row['label']:<16} {row['fraction']:>6.0%} {'-' if skip is None else f'{skip:.0%}':>6} "
+              f"{row['ideal_skip_ratio']:>6.0%} {'-' if cached is None else f'{cached:.0%}':>7} "
+              f"{'-' if speedup is None else f'{speedup:.2f}x':>8}")
+    print(f"  {'─' * 66}")
+    print()
+
+    benchstore.emit(
+        args, "test_prefix_cache.py", args.base_url, args.model,
+        [{"scenario": row["name"], "level": row["fraction"],
+          "metrics": {k: v for k, v in row.items() if k not in ("name", "label", "fraction")}}
+         for row in rows],
+        config={"scenarios": args.scenario, "prefix_fractions": args.prefix_fraction,
+                "families": args.families, "family_size": args.family_size, "max_tokens": args.max_tokens,
+                "concurrency": args.concurrency, "no_think": args.no_think},
+        details={"ttft_overhead_s": base},
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,16 @@ Multi-scenario benchmark — measures tok/s across different workload profiles.
 
 Tests chat, RAG, code generation, summarization, and agentic scenarios
 with realistic input/output ratios. Each scenario runs multiple times
-and reports average throughput.
+and reports average throughput. Writes a run record to benchmarks/ and
+the result store (see benchstore.py).
+
+With --concurrency, every scenario instead runs at each level with N streams
+in flight (closed loop, --runs requests per stream, through bench.py's async
+engine). For each level it reports aggregate and per-stream tok/s and TTFT /
+inter-token-latency percentiles. It also reports each scenario's saturation knee:
+the level after which adding streams raises aggregate tok/s by less than
+--knee-gain. Every request gets a unique first line, so prefix caching cannot
+serve one stream's prompt from another's.
 
 Usage:
     python test_scenarios.py
@@ -12,18 +21,25 @@ Usage:
     python test_scenarios.py --runs 5
     python test_scenarios.py --scenario chat codegen
     python test_scenarios.py --no-think
+    python test_scenarios.py --concurrency 1 2 4 8 16 32 --runs 2
 """
 
 import argparse
+import asyncio
 import time
 import sys
 import textwrap
+import uuid
 
 try:
     from openai import OpenAI
 except ImportError:
     sys.exit("openai package required: pip install openai")
 
+import bench
+import benchstore
+import httpx
+
 
 DEFAULT_BASE_URL = "http://localhost:11435/v1"
 DEFAULT_MODEL = "qwen3.5-35b"
@@ -324,6 +340,64 @@ def benchmark_one(client: OpenAI, model: str, prompt: str, max_tokens: int,
     }
 
 
+async def run_concurrent(args) -> list[dict]:
+    """Each scenario at each --concurrency level; returns one summary per (scenario, level)."""
+    cap = max(args.concurrency)
+    limits = httpx.Limits(max_connections=cap, max_keepalive_connections=cap)
+    timeout = httpx.Timeout(args.timeout, connect=10.0, pool=None)
+    rows = []
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout) as client:
+        for name in args.scenario:
+            sc = SCENARIOS[name]
+            print(f"{'─' * 70}")
+            print(f"  {sc['label']}  —  {sc['description']}")
+            print(f"  max_tokens={sc['max_tokens']}, {args.runs} requests per stream")
+            print(f"{'─' * 70}")
+            print(f"  {'conc':>5} {'agg tok/s':>10} {'stream':>7} {'TTFT p50':>9} {'p99':>7} "
+                  f"{'ITL p50':>8} {'p99':>6}  ok")
+            levels = []
+            for conc in args.concurrency:
+                payloads = [bench.make_payload(args.model, f"Request {uuid.uuid4().hex[:12]}.\n\n{sc['prompt']}",
+                                               sc["max_tokens"], no_think=args.no_think)
+                            for _ in range(conc * args.runs)]
+                t0 = time.perf_counter()
+                results = await bench.run_level(client, payloads, conc)
+                summary = bench.summarize(results, time.perf_counter() - t0)
+                t, i = summary["ttft_s"], summary["itl_s"]
+                print(f"  {conc:>5} {summary['output_tokens_per_s']:>10.1f} "
+                      f"{summary['per_stream_tokens_per_s']['p50'] or 0:>7.1f} "
+                      f"{(t['p50'] or 0) * 1000:>7.0f}ms {(t['p99'] or 0) * 1000:>5.0f}ms "
+                      f"{(i['p50'] or 0) * 1000:>6.1f}ms {(i['p99'] or 0) * 1000:>4.0f}ms  "
+                      f"{summary['ok']}/{summary['requests']}", flush=True)
+                errors = [r.error for r in results if not r.ok]
+                if errors:
+                    print(f"        {len(errors)} failed, e.g. {errors[0]}")
+                levels.append({"name": name, "label": sc["label"], "concurrency": conc, **summary})
+            knee = find_knee(levels, args.knee_gain)
+            if knee is None:
+                print(f"  Knee: not reached up to concurrency {levels[-1]['concurrency']}")
+            else:
+                print(f"  Knee: concurrency {knee['concurrency']} — {knee['output_tokens_per_s']:.1f} tok/s "
+                      f"aggregate, {knee['per_stream_tokens_per_s']['p50'] or 0:.1f} tok/s per stream")
+            for level in levels:
+                level["knee"] = level is knee
+            rows += levels
+            print()
+    return rows
+
+
+def find_knee(levels: list[dict], gain: float = 0.1) -> dict | None:
+    """
+    The first level whose next level adds less than `gain` (a fraction) aggregate
+    tok/s — past it, more streams mostly slow every stream down. None if
+    throughput is still climbing at the last level.
+    """
+    for level, following in zip(levels, levels[1:]):
+        if following["output_tokens_per_s"] < level["output_tokens_per_s"] * (1 + gain):
+            return level
+    return None
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Multi-scenario benchmark — tests chat, RAG, code, summarization, and agentic workloads"
@@ -341,6 +415,14 @@ def main():
                         help="Enable thinking/reasoning")
     parser.add_argument("--warmup", action="store_true",
                         help="Send a warmup request before benchmarking")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=None,
+                        help="Run each scenario with this many streams in flight, per level "
+                             "(e.g. 1 2 4 8 16 32); --runs is then requests per stream")
+    parser.add_argument("--knee-gain", type=float, default=0.1,
+                        help="Aggregate tok/s gain below which the next level is past the knee (default: 0.1)")
+    parser.add_argument("--timeout", type=float, default=600.0,
+                        help="Per-request timeout in seconds, concurrent mode (default: 600)")
+    benchstore.add_arguments(parser)
     args = parser.parse_args()
 
     if args.think:
@@ -352,6 +434,8 @@ def main():
     print(f"Model     : {args.model}")
     print(f"Runs/scen : {args.runs}")
     print(f"Scenarios : {', '.join(args.scenario)}")
+    if args.concurrency:
+        print(f"Concurrency: {', '.join(map(str, args.concurrency))} streams in flight")
     print()
 
     if args.warmup:
@@ -365,6 +449,10 @@ def main():
         print(f" done ({time.perf_counter() - t0:.1f}s)")
         print()
 
+    if args.concurrency:
+        main_concurrent(args)
+        return
+
     # Run all scenarios
     summary = []
     for name in args.scenario:
@@ -412,6 +500,7 @@ def main():
                 "avg_in": avg_in,
                 "avg_out": avg_out,
                 "runs": len(runs),
+                "results": runs,
             })
         print()
 
@@ -435,6 +524,51 @@ def main():
         print(f"  {'Overall avg':<16} {'':>7} {'':>8} {'':>8} {overall_tps:>7.1f}")
         print()
 
+        benchstore.emit(
+            args, "test_scenarios.py", args.base_url, args.model,
+            [{"scenario": s["name"], "level": 1, "metrics": {
+                "tokens_per_s": s["avg_tps"],
+                "ttft_s": s["avg_ttft_ms"] / 1000,
+                "prompt_tokens": s["avg_in"],
+                "output_tokens": s["avg_out"],
+            }} for s in summary],
+            config={"runs": args.runs, "scenarios": args.scenario, "no_think": args.no_think},
+            details={s["name"]: s["results"] for s in summary},
+        )
+
+
+def main_concurrent(args):
+    rows = asyncio.run(run_concurrent(args))
+    knees = {name: next((row for row in rows if row["name"] == name and row["knee"]), None)
+             for name in args.scenario}
+    print(f"{'═' * 70}")
+    print(f"  SUMMARY — {args.model} @ {args.base_url}")
+    print(f"{'═' * 70}")
+    print(f"  {'Scenario':<16} {'Knee':>5} {'agg tok/s':>10} {'stream':>7} {'TTFT p99':>9} "
+          f"{'Peak tok/s':>11} {'@':>4}")
+    print(f"  {'─' * 66}")
+    for name, knee in knees.items():
+        peak = max((row for row in rows if row["name"] == name), key=lambda row: row["output_tokens_per_s"])
+        if knee is None:
+            print(f"  {peak['label']:<16} {'-':>5} {'not reached':>28} "
+                  f"{peak['output_tokens_per_s']:>11.1f} {peak['concurrency']:>4}")
+            continue
+        print(f"  {knee['label']:<16} {knee['concurrency']:>5} {knee['output_tokens_per_s']:>10.1f} "
+              f"{knee['per_stream_tokens_per_s']['p50'] or 0:>7.1f} {(knee['ttft_s']['p99'] or 0) * 1000:>7.0f}ms "
+              f"{peak['output_tokens_per_s']:>11.1f} {peak['concurrency']:>4}")
+    print(f"  {'─' * 66}")
+    print()
+
+    benchstore.emit(
+        args, "test_scenarios.py", args.base_url, args.model,
+        [{"scenario": row["name"], "level": row["concurrency"],
+          "metrics": {k: v for k, v in row.items() if k not in bench.NOT_METRICS + ("name", "label", "knee")}}
+         for row in rows],
+        config={"runs": args.runs, "scenarios": args.scenario, "no_think": args.no_think,
+                "concurrency": args.concurrency, "knee_gain": args.knee_gain},
+        details={"knees": {name: knee and knee["concurrency"] for name, knee in knees.items()}},
+    )
+
 
 if __name__ == "__main__":
     main()
@@ -1,10 +1,11 @@
 #!/usr/bin/env python3
 """Simple Gradio test app for the self-hosted image pipeline.
 
-Three tabs, all talking to the local OpenAI-compatible / REST endpoints:
-  - Generate : Z-Image-Turbo text-to-image   (POST /v1/images/generations)
-  - Edit     : Z-Image-Turbo img2img edit     (POST /v1/images/edits)
-  - Upscale  : Real-ESRGAN x2/x4              (POST /upscale)
+Four tabs, all talking to the local OpenAI-compatible / REST endpoints:
+  - Generate           : Z-Image-Turbo text-to-image   (POST /v1/images/generations)
+  - Generate + Upscale : both, pipelined — image k is upscaled while k+1 generates
+  - Edit               : Z-Image-Turbo img2img edit     (POST /v1/images/edits)
+  - Upscale            : Real-ESRGAN x2/x4              (POST /upscale)
 
 It's a thin HTTP client — no GPU, no model code here. Run it anywhere that can
 reach the services. Deps come from the repo-root pyproject's optional group:
@@ -15,21 +16,62 @@ reach the services. Deps come from the repo-root pyproject's optional group:
 
 Override endpoints if not on the same host:
     GEN_URL=http://192.168.0.161:11476  UPSCALE_URL=http://192.168.0.161:11477  python gradio_app.py
+
+GEN_URL may be a comma-separated list of generator instances. Every backend gets
+one pooled keep-alive HTTP client; a Generate batch is split into parallel
+sub-requests of GEN_SPLIT_N images (default 1) spread round-robin over GEN_URL,
+and the gallery fills as each one returns.
 """
 from __future__ import annotations
 
+import asyncio
 import base64
 import io
+import json
 import os
+import time
 
 import gradio as gr
-import requests
+import httpx
 from PIL import Image
 
-GEN_URL = os.environ.get("GEN_URL", "http://localhost:11476").rstrip("/")
+GEN_URLS = [u.strip().rstrip("/") for u in os.environ.get("GEN_URL", "http://localhost:11476").split(",") if u.strip()]
+GEN_URL = GEN_URLS[0]
 UPSCALE_URL = os.environ.get("UPSCALE_URL", "http://localhost:11477").rstrip("/")
 MODEL = os.environ.get("GEN_MODEL", "z-image-turbo")
 TIMEOUT = float(os.environ.get("REQUEST_TIMEOUT", "120"))
+# The server renders n images one after another, so one image per sub-request
+# costs nothing and puts each image on screen as soon as it exists.
+SPLIT_N = max(1, int(os.environ.get("GEN_SPLIT_N", "1")))
+
+_clients: dict[str, httpx.AsyncClient] = {}  # base URL -> keep-alive pool
+
+
+def _client(base: str) -> httpx.AsyncClient:
+    # created lazily inside Gradio's event loop, then reused for every request
+    if base not in _clients:
+        _clients[base] = httpx.AsyncClient(
+            base_url=base,
+            timeout=httpx.Timeout(TIMEOUT, connect=5.0),
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=16),
+        )
+    return _clients[base]
+
+
+async def _post(base: str, path: str, **kwargs) -> httpx.Response:
+    try:
+        resp = await _client(base).post(path, **kwargs)
+    except httpx.HTTPError as e:
+        raise gr.Error(f"Could not reach {base}{path} ({e!r})")
+    if resp.status_code != 200:
+        raise gr.Error(f"{base}{path} returned {resp.status_code}: {resp.text[:300]}")
+    return resp
+
+
+def _png(image: Image.Image) -> bytes:
+    buf = io.BytesIO()
+    image.convert("RGB").save(buf, format="PNG")
+    return buf.getvalue()
 
 
 # A high-converting default for the playground: AC-unit marketing visuals aimed
@@ -43,40 +85,119 @@ DEFAULT_GEN_PROMPT = (
 )
 
 
-def _decode(resp: requests.Response) -> Image.Image:
-    resp.raise_for_status()
-    b64 = resp.json()["data"][0]["b64_json"]
-    return Image.open(io.BytesIO(base64.b64decode(b64)))
+def _decode_all(body: bytes) -> list[Image.Image]:
+    return [Image.open(io.BytesIO(base64.b64decode(d["b64_json"]))) for d in json.loads(body)["data"]]
+
 
+async def _generate_on(base: str, payload: dict) -> list[Image.Image]:
+    resp = await _post(base, "/v1/images/generations", json=payload)
+    # base64 + PNG decode off the event loop
+    return await asyncio.to_thread(_decode_all, resp.content)
 
-def generate(prompt, negative, size, steps, guidance, seed, n):
+
+def _gen_payload(prompt, negative, size, steps, guidance) -> dict:
     if not prompt.strip():
         raise gr.Error("Enter a prompt.")
-    payload = {
+    return {
         "model": MODEL,
         "prompt": prompt,
         "size": size,
         "num_inference_steps": int(steps),
         "guidance_scale": float(guidance),
         "negative_prompt": negative or "",
-        "n": int(n),
     }
-    if int(seed) >= 0:
-        payload["seed"] = int(seed)
-    resp = requests.post(f"{GEN_URL}/v1/images/generations", json=payload, timeout=TIMEOUT)
-    resp.raise_for_status()
-    # n images come back sequentially (no GPU batch speedup) — return them all.
-    return [Image.open(io.BytesIO(base64.b64decode(d["b64_json"]))) for d in resp.json()["data"]]
 
 
-def edit(image, prompt, steps, guidance, seed):
+async def generate(prompt, negative, size, steps, guidance, seed, n):
+    payload = _gen_payload(prompt, negative, size, steps, guidance)
+    tasks = []
+    for k, first in enumerate(range(0, int(n), SPLIT_N)):
+        sub = {**payload, "n": min(SPLIT_N, int(n) - first)}
+        if int(seed) >= 0:
+            sub["seed"] = int(seed) + first  # image i always gets seed + i
+        tasks.append(asyncio.create_task(_generate_on(GEN_URLS[k % len(GEN_URLS)], sub)))
+    images = []
+    try:
+        for done in asyncio.as_completed(tasks):
+            images += await done
+            yield images
+    finally:
+        for t in tasks:  # first error (or a closed tab) cancels the rest
+            t.cancel()
+
+
+def _first_png(body: bytes) -> bytes:
+    return base64.b64decode(json.loads(body)["data"][0]["b64_json"])
+
+
+def _timing_table(rows: dict, n: int, wall: float) -> str:
+    lines = ["| # | generate | upscale | ready at |", "|---|---|---|---|"]
+    for i in sorted(rows):
+        r = rows[i]
+        lines.append(f"| {i + 1} | {r['gen']:.2f}s | {r['up']:.2f}s | {r['ready']:.2f}s |")
+    serial = sum(r["gen"] + r["up"] for r in rows.values())
+    lines.append(f"\n**{len(rows)}/{n}** done in **{wall:.2f}s** wall · generate→upscale back to back "
+                 f"would take {serial:.2f}s · overlap saved {max(0.0, serial - wall):.2f}s")
+    return "\n".join(lines)
+
+
+async def generate_upscale(prompt, negative, size, steps, guidance, seed, n, scale):
+    """Generate n images one at a time and hand each PNG straight to /upscale as
+    soon as it arrives — no PIL decode/re-encode, no browser round trip. The
+    upscale of image k runs while image k+1 is generating; finished images stream
+    into the gallery with per-stage timing."""
+    payload = _gen_payload(prompt, negative, size, steps, guidance)
+    n = int(n)
+    t0 = time.perf_counter()
+    done: asyncio.Queue = asyncio.Queue()  # (index, image, row) or an exception
+    upscales: list[asyncio.Task] = []
+
+    async def upscale_one(i: int, png: bytes, gen_s: float):
+        try:
+            t1 = time.perf_counter()
+            resp = await _post(UPSCALE_URL, "/upscale", files={"file": (f"{i}.png", png, "image/png")},
+                               data={"scale": str(int(scale))})
+            # includes any wait behind the previous image on the upscaler
+            row = {"gen": gen_s, "up": time.perf_counter() - t1, "ready": time.perf_counter() - t0}
+            await done.put((i, Image.open(io.BytesIO(resp.content)), row))
+        except Exception as e:  # noqa: BLE001 — surfaced by the consumer
+            await done.put(e)
+
+    async def produce():
+        try:
+            for i in range(n):
+                sub = {**payload, "n": 1}
+                if int(seed) >= 0:
+                    sub["seed"] = int(seed) + i  # same images as the Generate tab
+                t1 = time.perf_counter()
+                resp = await _post(GEN_URLS[i % len(GEN_URLS)], "/v1/images/generations", json=sub)
+                png = await asyncio.to_thread(_first_png, resp.content)
+                upscales.append(asyncio.create_task(upscale_one(i, png, time.perf_counter() - t1)))
+        except Exception as e:  # noqa: BLE001
+            await done.put(e)
+
+    producer = asyncio.create_task(produce())
+    images: dict[int, Image.Image] = {}
+    rows: dict[int, dict] = {}
+    try:
+        while len(images) < n:
+            item = await done.get()
+            if isinstance(item, Exception):
+                raise item
+            i, img, row = item
+            images[i], rows[i] = img, row
+            yield [images[k] for k in sorted(images)], _timing_table(rows, n, time.perf_counter() - t0)
+    finally:
+        producer.cancel()
+        for t in upscales:
+            t.cancel()
+
+
+async def edit(image, prompt, steps, guidance, seed):
     if image is None:
         raise gr.Error("Upload an image to edit.")
     if not prompt.strip():
         raise gr.Error("Enter an edit instruction.")
-    buf = io.BytesIO()
-    image.convert("RGB").save(buf, format="PNG")
-    buf.seek(0)
     data = {
         "model": MODEL,
         "prompt": prompt,
@@ -85,26 +206,21 @@ def edit(image, prompt, steps, guidance, seed):
     }
     if int(seed) >= 0:
         data["seed"] = str(int(seed))
-    files = {"image": ("input.png", buf, "image/png")}
-    return _decode(requests.post(f"{GEN_URL}/v1/images/edits", data=data, files=files, timeout=TIMEOUT))
+    files = {"image": ("input.png", await asyncio.to_thread(_png, image), "image/png")}
+    resp = await _post(GEN_URL, "/v1/images/edits", data=data, files=files)
+    return (await asyncio.to_thread(_decode_all, resp.content))[0]
 
 
-def upscale(image, scale):
+async def upscale(image, scale):
     if image is None:
         raise gr.Error("Upload an image to upscale.")
-    buf = io.BytesIO()
-    image.convert("RGB").save(buf, format="PNG")
-    buf.seek(0)
-    files = {"file": ("input.png", buf, "image/png")}
-    resp = requests.post(
-        f"{UPSCALE_URL}/upscale", files=files, data={"scale": int(scale)}, timeout=TIMEOUT
-    )
-    resp.raise_for_status()
+    files = {"file": ("input.png", await asyncio.to_thread(_png, image), "image/png")}
+    resp = await _post(UPSCALE_URL, "/upscale", files=files, data={"scale": str(int(scale))})
     return Image.open(io.BytesIO(resp.content))
 
 
 with gr.Blocks(title="ai_services image playground") as demo:
-    gr.Markdown(f"# 🖼️ ai_services image playground\nGenerator: `{MODEL}` @ {GEN_URL} · Upscaler @ {UPSCALE_URL}")
+    gr.Markdown(f"# 🖼️ ai_services image playground\nGenerator: `{MODEL}` @ {', '.join(GEN_URLS)} · Upscaler @ {UPSCALE_URL}")
 
     with gr.Tab("Generate"):
         with gr.Row():
@@ -116,12 +232,32 @@ with gr.Blocks(title="ai_services image playground") as demo:
                     g_steps = gr.Slider(1, 30, value=8, step=1, label="Steps (Turbo ≈ 8)")
                     g_guidance = gr.Slider(0.0, 7.5, value=1.0, step=0.1, label="Guidance (Turbo ≈ 1.0)")
                 with gr.Row():
-                    g_n = gr.Slider(1, 8, value=4, step=1, label="Number of images (n, sequential ~3s each)")
+                    g_n = gr.Slider(1, 8, value=4, step=1, label="Number of images (n, parallel sub-requests)")
                     g_seed = gr.Number(value=-1, label="Seed (-1 = random)", precision=0)
                 g_btn = gr.Button("Generate", variant="primary")
             g_out = gr.Gallery(label="Results", type="pil", columns=2, height="auto")
         g_btn.click(generate, [g_prompt, g_negative, g_size, g_steps, g_guidance, g_seed, g_n], g_out)
 
+    with gr.Tab("Generate + Upscale"):
+        with gr.Row():
+            with gr.Column():
+                p_prompt = gr.Textbox(label="Prompt", lines=4, value=DEFAULT_GEN_PROMPT)
+                p_negative = gr.Textbox(label="Negative prompt", value="blurry, low quality, distorted, text, watermark")
+                p_size = gr.Dropdown(["512x512", "768x768", "1024x1024", "1280x1280"], value="1024x1024", label="Size")
+                with gr.Row():
+                    p_steps = gr.Slider(1, 30, value=8, step=1, label="Steps (Turbo ≈ 8)")
+                    p_guidance = gr.Slider(0.0, 7.5, value=1.0, step=0.1, label="Guidance (Turbo ≈ 1.0)")
+                with gr.Row():
+                    p_n = gr.Slider(1, 8, value=4, step=1, label="Number of images")
+                    p_seed = gr.Number(value=-1, label="Seed (-1 = random)", precision=0)
+                p_scale = gr.Radio([2, 4], value=2, label="Upscale")
+                p_btn = gr.Button("Generate + Upscale", variant="primary")
+            with gr.Column():
+                p_out = gr.Gallery(label="Upscaled results", type="pil", columns=2, height="auto")
+                p_timing = gr.Markdown()
+        p_btn.click(generate_upscale, [p_prompt, p_negative, p_size, p_steps, p_guidance, p_seed, p_n, p_scale],
+                    [p_out, p_timing])
+
     with gr.Tab("Edit (img2img)"):
         with gr.Row():
             with gr.Column():